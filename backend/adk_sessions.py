@@ -0,0 +1,97 @@
+"""Persistent ADK session storage for the agent stages.
+
+By default the planner and deep agents keep their sessions in a SQLite file in
+the job workspace (adk_sessions.db) through ADK's DatabaseSessionService,
+instead of an InMemorySessionService with a random session id. Sessions are
+keyed by workspace (the job's course) and stage, so:
+
+- agent state (`course_plan`, `deep_content`) and the conversation survive the
+  stage process and can be read by later stages with load_state();
+- a resumed run (PIPELINE_RESUME=1, set by the pipeline) continues the stage's
+  existing session, while a fresh run starts the session over. The stages use
+  what the session kept: the planner skips the steps whose results are already
+  in its state, and the deep loop appends to the weeks its earlier run wrote
+  instead of starting its file over. ADK itself restarts a resumed LoopAgent at
+  its first iteration.
+
+ADK_SESSION_STORE=memory restores the old in-memory behaviour.
+"""
+import asyncio
+import inspect
+import os
+from pathlib import Path
+from typing import Dict, Optional
+
+from workspace import default_workspace
+
+ADK_SESSION_STORE = os.getenv("ADK_SESSION_STORE", "sqlite").lower()
+SESSIONS_DB = "adk_sessions.db"
+APP_NAME = "AI Copilot for Instructors"
+USER_ID = "user-local"
+
+
+async def _maybe_await(value):
+    return await value if inspect.isawaitable(value) else value
+
+
+def sessions_db_path(workspace: Optional[Path] = None) -> Path:
+    return Path(workspace or default_workspace()) / SESSIONS_DB
+
+
+def session_id_for(stage: str, workspace: Optional[Path] = None) -> str:
+    """Stable session id for a stage of the workspace's job."""
+    return f"{stage}-{Path(workspace or default_workspace()).resolve().name}"
+
+
+def resuming() -> bool:
+    return os.environ.get("PIPELINE_RESUME") == "1"
+
+
+def get_session_service(workspace: Optional[Path] = None):
+    """SQLite-backed session service for the workspace (or in-memory when configured / unavailable)."""
+    from google.adk.sessions import InMemorySessionService
+
+    if ADK_SESSION_STORE == "memory":
+        return InMemorySessionService()
+    try:
+        from google.adk.sessions import DatabaseSessionService
+
+        return DatabaseSessionService(db_url=f"sqlite:///{sessions_db_path(workspace)}")
+    except Exception as e:
+        print(f"⚠️ SQLite session store unavailable, using in-memory sessions: {e}")
+        return InMemorySessionService()
+
+
+async def open_session(service, stage: str, workspace: Optional[Path] = None, resume: Optional[bool] = None):
+    """Return (session_id, resumed) for the stage's session, continuing it only when resuming."""
+    session_id = session_id_for(stage, workspace)
+    resume = resuming() if resume is None else resume
+    existing = await _maybe_await(service.get_session(app_name=APP_NAME, user_id=USER_ID, session_id=session_id))
+    if existing is not None and resume:
+        print(f"⏩ Resuming ADK session {session_id} ({len(getattr(existing, 'events', None) or [])} events)")
+        return session_id, True
+    if existing is not None:
+        await _maybe_await(service.delete_session(app_name=APP_NAME, user_id=USER_ID, session_id=session_id))
+    await _maybe_await(service.create_session(app_name=APP_NAME, user_id=USER_ID, session_id=session_id))
+    return session_id, False
+
+
+async def get_state(service, session_id: str) -> Dict:
+    session = await _maybe_await(service.get_session(app_name=APP_NAME, user_id=USER_ID, session_id=session_id))
+    return dict(getattr(session, "state", None) or {})
+
+
+async def load_state_async(stage: str, workspace: Optional[Path] = None) -> Dict:
+    """State an earlier stage's agent left in the workspace's session store, or {} if none."""
+    if ADK_SESSION_STORE == "memory" or not sessions_db_path(workspace).exists():
+        return {}
+    try:
+        return await get_state(get_session_service(workspace), session_id_for(stage, workspace))
+    except Exception as e:
+        print(f"⚠️ Could not read the {stage} session state: {e}")
+        return {}
+
+
+def load_state(stage: str, workspace: Optional[Path] = None) -> Dict:
+    """load_state_async() for sync code; must be called outside a running event loop."""
+    return asyncio.run(load_state_async(stage, workspace))
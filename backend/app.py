@@ -1,17 +1,26 @@
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException
+from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse
 import os
 import json
 import shutil
-import subprocess
 import asyncio
-import platform
 from pathlib import Path
 from typing import Optional, List, Dict
 import logging
 from datetime import datetime
 
+from checkpoint import load_checkpoint
+from jobs import JobManager
+from model_routes import model_routes
+from pdf_text import curriculum_index, summary as pdf_summary
+from progress import read_events
+from telemetry import all_task_stats, read_calls, summarize, task_stats
+from workspace import (
+    create_workspace, get_workspace, list_workspaces, io_dir, config_path,
+    curriculum_path, load_config, save_config,
+)
+
 # Set environment variables for proper encoding
 os.environ['PYTHONIOENCODING'] = 'utf-8'
 
@@ -40,12 +49,27 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Ensure directories exist
-UPLOAD_DIR = Path("Inputs and Outputs")
-UPLOAD_DIR.mkdir(exist_ok=True)
-# Also ensure known category subdirectories exist to avoid downstream issues
-for sub in ["course material", "quizzes", "ppts", "flashcards"]:
-    (UPLOAD_DIR / sub).mkdir(exist_ok=True)
+# Generation runs on a bounded background pool so the event loop stays free
+job_manager = JobManager()
+
+def _workspace_or_404(workspace_id: str) -> Path:
+    workspace = get_workspace(workspace_id)
+    if not workspace:
+        raise HTTPException(status_code=404, detail="Workspace not found")
+    return workspace
+
+def _latest_workspace(workspace_id: Optional[str] = None) -> Optional[Path]:
+    """The requested workspace, else the most recently used one (for clients that don't send an id)."""
+    if workspace_id:
+        return _workspace_or_404(workspace_id)
+    workspaces = list_workspaces()
+    return workspaces[0] if workspaces else None
+
+def _workspaces_for(workspace_id: Optional[str] = None) -> List[Path]:
+    """The requested workspace, or every workspace (newest first) when none is given."""
+    if workspace_id:
+        return [_workspace_or_404(workspace_id)]
+    return list_workspaces()
 
 @app.get("/")
 async def root():
@@ -63,25 +87,30 @@ async def upload_curriculum(
     teaching_style: str = Form(...)
 ):
     """
-    Upload curriculum PDF and create user configuration
+    Upload curriculum PDF and create user configuration in a fresh workspace.
+    The returned workspace_id identifies this course in all later calls.
     """
     try:
         # Validate file type
         if not file.filename.lower().endswith('.pdf'):
             raise HTTPException(status_code=400, detail="Only PDF files are allowed")
         
-        # Save the uploaded PDF file
-        pdf_file_path = UPLOAD_DIR / "curriculum.pdf"
-        
-        # Remove existing curriculum file if it exists
-        if pdf_file_path.exists():
-            pdf_file_path.unlink()
+        # Every upload gets its own workspace so concurrent users never share files
+        workspace = create_workspace()
+        pdf_file_path = curriculum_path(workspace)
         
         # Save the new file
         with open(pdf_file_path, "wb") as buffer:
             shutil.copyfileobj(file.file, buffer)
         
         logger.info(f"PDF file saved: {pdf_file_path}")
+
+        # Extract the text and page/section index once now; repeat uploads of the same PDF hit the cache
+        try:
+            pdf_index = await asyncio.to_thread(curriculum_index, workspace)
+        except Exception as e:
+            logger.warning(f"Curriculum text extraction failed: {e}")
+            pdf_index = None
         
         # Create user configuration JSON
         user_config = {
@@ -96,9 +125,7 @@ async def upload_curriculum(
         }
         
         # Save user config
-        config_file_path = Path("user_config.json")
-        with open(config_file_path, 'w', encoding='utf-8') as f:
-            json.dump(user_config, f, indent=2)
+        config_file_path = save_config(user_config, workspace)
         
         logger.info(f"User config saved: {config_file_path}")
         
@@ -107,209 +134,213 @@ async def upload_curriculum(
             content={
                 "message": "File uploaded and configuration saved successfully",
                 "file_name": file.filename,
-                "config": user_config
+                "workspace_id": workspace.name,
+                "config": user_config,
+                "curriculum_pages": pdf_index["page_count"] if pdf_index else None,
             }
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in upload_curriculum: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
 @app.post("/generate-content/")
-async def generate_content():
+async def generate_content(workspace_id: Optional[str] = None, resume: bool = False):
     """
-    Run the shell script directly to generate course content
+    Queue a course generation job for a workspace and return its ID immediately.
+    Without workspace_id the most recent upload is used. With resume=true the
+    stages completed in the workspace's last run are kept.
+    Poll /jobs/{job_id} for stage progress and the generated files.
     """
+    workspace = _latest_workspace(workspace_id)
+
+    # Check if user config exists
+    if not workspace or not config_path(workspace).exists():
+        raise HTTPException(status_code=400, detail="No user configuration found. Please upload curriculum first.")
+
+    # Check if curriculum PDF exists
+    if not curriculum_path(workspace).exists():
+        raise HTTPException(status_code=400, detail="No curriculum PDF found. Please upload curriculum first.")
+
     try:
-        # Check if user config exists
-        config_file_path = Path("user_config.json")
-        if not config_file_path.exists():
-            raise HTTPException(status_code=400, detail="No user configuration found. Please upload curriculum first.")
-        
-        # Check if curriculum PDF exists
-        pdf_file_path = UPLOAD_DIR / "curriculum.pdf"
-        if not pdf_file_path.exists():
-            raise HTTPException(status_code=400, detail="No curriculum PDF found. Please upload curriculum first.")
-        
-        # Remove any previous completion marker to signal new run
-        try:
-            marker = UPLOAD_DIR / "generation_complete.json"
-            if marker.exists():
-                marker.unlink()
-        except Exception as e:
-            logger.warning(f"Failed clearing generation_complete.json: {e}")
-
-        # Resolve backend directory and select script per platform
-        backend_dir = Path(__file__).resolve().parent
-        if platform.system() == "Windows":
-            script_to_run = backend_dir / "start.bat"
-            script_type = "batch"
-        else:  # Linux/Unix (Render)
-            script_to_run = backend_dir / "start.sh"
-            script_type = "shell"
-        
-        if not script_to_run.exists():
-            raise HTTPException(
-                status_code=400, 
-                detail=f"{script_to_run.name} script not found in backend directory. Platform: {platform.system()}"
-            )
-        
-        logger.info(f"Starting AI Copilot for Instructors using {script_to_run} script...")
-        
-        # Set environment variables to prevent port conflicts
-        env = os.environ.copy()
-        env.update({
-            'NO_SERVER': '1',
-            'DISABLE_SERVICES': '1',
-            'PYTHONUNBUFFERED': '1'
-        })
-        # Ensure child processes do not inherit the web service PORT
-        if 'PORT' in env:
-            logger.info("Removing PORT from child environment to avoid port conflicts during generation")
-            env.pop('PORT', None)
-        
-        # Check for required environment variables
-        if not env.get('GEMINI_API_KEY') and not env.get('GOOGLE_API_KEY'):
-            logger.warning("GEMINI_API_KEY not found in environment variables")
-        
-        # Execute the script directly
-        try:
-            logger.info(f"Executing {script_type} script: {script_to_run}")
-            
-            if script_type == "batch":
-                # On Windows, run the batch file directly with proper sequential execution
-                result = subprocess.run(
-                    [str(script_to_run)],
-                    cwd=backend_dir,
-                    text=True,
-                    encoding='utf-8',
-                    errors='replace',
-                    shell=True,  # Use shell for batch files
-                    env=env,
-                    timeout=3600  # 1 hour timeout
-                )
-            else:
-                # For shell scripts on Linux/Render - use bash directly. Do not capture output to avoid large-memory buffers.
-                result = subprocess.run(
-                    ["bash", str(script_to_run)],
-                    cwd=backend_dir,
-                    text=True,
-                    encoding='utf-8',
-                    errors='replace',
-                    timeout=3600,  # 1 hour timeout for Render
-                    env=env
-                )
-            
-            logger.info(f"Script execution completed with return code: {result.returncode}")
-            
-            # Output already streamed to logs; avoid logging full buffers here
-            
-            # Check for generated content (regardless of return code, some scripts may have warnings but still generate files)
-            generated_files = []
-            output_dir = UPLOAD_DIR
-
-            # Look for files directly under root
-            if output_dir.exists():
-                for file_path in output_dir.glob("*"):
-                    if file_path.is_file() and file_path.suffix in ['.txt', '.docx', '.pdf', '.pptx']:
-                        generated_files.append({
-                            "name": file_path.name,
-                            "path": str(file_path),
-                            "size": file_path.stat().st_size
-                        })
-
-            # Also scan known subdirectories used by generators
-            for sub in ["course material", "quizzes", "ppts", "flashcards"]:
-                subdir = output_dir / sub
-                if not subdir.exists():
-                    continue
-                for file_path in subdir.glob("*"):
-                    if file_path.is_file() and file_path.suffix in ['.txt', '.docx', '.pdf', '.pptx']:
-                        generated_files.append({
-                            "name": file_path.name,
-                            "path": str(file_path),
-                            "size": file_path.stat().st_size
-                        })
-            
-            # Consider success if return code is 0 OR files were generated
-            success = result.returncode == 0 or len(generated_files) > 0
-            
-            if success:
-                # Write completion marker
-                try:
-                    marker = UPLOAD_DIR / "generation_complete.json"
-                    with open(marker, "w", encoding="utf-8") as f:
-                        json.dump({
-                            "completed": True,
-                            "completed_at": datetime.now().isoformat()
-                        }, f)
-                except Exception as e:
-                    logger.warning(f"Failed to write generation_complete.json: {e}")
-                return JSONResponse(
-                    status_code=200,
-                    content={
-                        "message": "Script execution completed successfully!",
-                        "generated_files": generated_files,
-                        "total_files": len(generated_files),
-                        "process_completed": True,
-                        "return_code": result.returncode
-                    }
-                )
-            else:
-                return JSONResponse(
-                    status_code=500,
-                    content={
-                        "message": f"Script execution failed (return code: {result.returncode})",
-                        "generated_files": generated_files,
-                        "total_files": len(generated_files),
-                        "process_completed": False,
-                        "return_code": result.returncode
-                    }
-                )
-            
-        except Exception as e:
-            logger.error(f"Script execution error: {str(e)}")
-            raise HTTPException(status_code=500, detail=f"Script execution failed: {str(e)}")
-        
+        job = job_manager.submit(workspace, resume=resume)
+    except ValueError as e:
+        # The workspace is still generating; follow that job instead
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         logger.error(f"Error in generate_content: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+    return JSONResponse(
+        status_code=202,
+        content={
+            "message": "Generation job queued" + (" (resuming from checkpoint)" if resume else ""),
+            "job_id": job["job_id"],
+            "workspace_id": job["workspace_id"],
+            "status": job["status"],
+            "status_url": f"/jobs/{job['job_id']}"
+        }
+    )
+
+@app.get("/jobs")
+async def list_jobs():
+    """List generation jobs, newest first."""
+    jobs = job_manager.list_jobs()
+    return {"jobs": jobs, "total": len(jobs)}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Return status, per-stage results and generated files for a job."""
+    job = job_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/jobs/{job_id}/telemetry")
+async def job_telemetry(job_id: str, calls: bool = False):
+    """LLM call totals per stage and per stage/task/model for a job; calls=true adds every call record."""
+    job = job_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    workspace = _workspace_or_404(job["workspace_id"])
+    summary = summarize(workspace)
+    if calls:
+        summary["records"] = read_calls(workspace)
+    return summary
+
+def _sse_event(end: int, event: Dict) -> str:
+    return f"id: {end}\nevent: {event.get('event', 'message')}\ndata: {json.dumps(event)}\n\n"
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str, request: Request):
+    """
+    Stream a job's progress as Server-Sent Events: stage start/finish, per-week
+    progress from the deep agent and per-artifact completion from the generators.
+    Ends with a `job_finished` event. Reconnecting clients resume via Last-Event-ID.
+    """
+    job = job_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    workspace = _workspace_or_404(job["workspace_id"])
+    last_event_id = request.headers.get("last-event-id", "")
+    offset = int(last_event_id) if last_event_id.isdigit() else job["events_offset"]
+
+    async def stream():
+        position = offset
+        idle = 0.0
+        yield "retry: 3000\n\n"
+        while not await request.is_disconnected():
+            # File reads and the job table lock stay off the event loop
+            events, position = await asyncio.to_thread(read_events, workspace, position)
+            for end, event in events:
+                yield _sse_event(end, event)
+            current = await asyncio.to_thread(job_manager.get, job_id)
+            if current["status"] in ("completed", "failed"):
+                # Drain what the last stage wrote between the read above and the status change
+                events, position = await asyncio.to_thread(read_events, workspace, position)
+                for end, event in events:
+                    yield _sse_event(end, event)
+                summary = {k: current.get(k) for k in ("job_id", "status", "total_files", "cache_hits", "error")}
+                yield f"event: job_finished\ndata: {json.dumps(summary)}\n\n"
+                break
+            idle = 0.0 if events else idle + 1.0
+            if idle >= 15:
+                # Comment line keeps proxies from closing an idle stream
+                yield ": keep-alive\n\n"
+                idle = 0.0
+            await asyncio.sleep(1)
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.post("/jobs/{job_id}/resume")
+async def resume_job(job_id: str):
+    """Queue a new job that continues a finished or failed job from its first incomplete stage."""
+    try:
+        job = job_manager.resume(job_id)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JSONResponse(
+        status_code=202,
+        content={
+            "message": "Resume job queued",
+            "job_id": job["job_id"],
+            "resumed_from": job_id,
+            "workspace_id": job["workspace_id"],
+            "status": job["status"],
+            "status_url": f"/jobs/{job['job_id']}"
+        }
+    )
+
+@app.get("/workspaces/{workspace_id}/checkpoint")
+async def get_checkpoint(workspace_id: str):
+    """Return the checkpoint manifest of a workspace's last run."""
+    workspace = _workspace_or_404(workspace_id)
+    return load_checkpoint(workspace)
+
+@app.get("/workspaces/{workspace_id}/curriculum")
+async def get_curriculum_index(workspace_id: str, text: bool = False):
+    """Page/section index of the workspace's curriculum PDF; text=true includes each page's text."""
+    workspace = _workspace_or_404(workspace_id)
+    index = await asyncio.to_thread(curriculum_index, workspace)
+    if not index:
+        raise HTTPException(status_code=404, detail="No extractable curriculum PDF in this workspace")
+    return index if text else pdf_summary(index)
+
+@app.get("/workspaces/{workspace_id}/model-stats")
+async def get_workspace_model_stats(workspace_id: str):
+    """Per-task latency and token stats of a workspace's Gemini calls."""
+    workspace = _workspace_or_404(workspace_id)
+    return {"routes": model_routes(), "stats": task_stats(workspace)}
+
+@app.get("/model-stats")
+async def get_model_stats():
+    """The model routing table with per-task stats aggregated over all workspaces."""
+    return {"routes": model_routes(), "stats": all_task_stats()}
+
 @app.get("/status/")
-async def get_status():
+async def get_status(workspace_id: Optional[str] = None):
     """
-    Get the current status of the system
+    Get the upload status of a workspace (default: the most recent one)
     """
     try:
-        config_exists = Path("user_config.json").exists()
-        pdf_exists = (UPLOAD_DIR / "curriculum.pdf").exists()
+        workspace = _latest_workspace(workspace_id)
+        config_exists = bool(workspace) and config_path(workspace).exists()
+        pdf_exists = bool(workspace) and curriculum_path(workspace).exists()
         
         status = {
+            "workspace_id": workspace.name if workspace else None,
             "config_uploaded": config_exists,
             "curriculum_uploaded": pdf_exists,
             "ready_for_generation": config_exists and pdf_exists
         }
         
         if config_exists:
-            with open("user_config.json", 'r', encoding='utf-8') as f:
-                status["user_config"] = json.load(f)
+            status["user_config"] = load_config(workspace)
         
         return status
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in get_status: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/generated-files/")
-async def get_generated_files():
+async def get_generated_files(workspace_id: Optional[str] = None):
     """
-    Get list of generated files
+    Get list of generated files in a workspace (default: the most recent one)
     """
     try:
         generated_files = []
-        output_dir = UPLOAD_DIR
+        workspace = _latest_workspace(workspace_id)
+        output_dir = io_dir(workspace) if workspace else None
         
-        if output_dir.exists():
+        if output_dir and output_dir.exists():
             for file_path in output_dir.glob("*"):
                 if file_path.is_file() and file_path.suffix in ['.txt', '.docx', '.pdf', '.pptx']:
                     generated_files.append({
@@ -320,10 +351,13 @@ async def get_generated_files():
                     })
         
         return {
+            "workspace_id": workspace.name if workspace else None,
             "files": generated_files,
             "total": len(generated_files)
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in get_generated_files: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -338,8 +372,8 @@ if __name__ == "__main__":
 # Additional Content APIs
 # ----------------------
 
-def _safe_category_to_dir(category: str) -> Path:
-    """Map category to a safe subdirectory under 'Inputs and Outputs'."""
+def _safe_category_to_dir(category: str, workspace: Path) -> Path:
+    """Map category to a safe subdirectory under the workspace's 'Inputs and Outputs'."""
     mapping = {
         "course-material": "course material",
         "quizzes": "quizzes",
@@ -349,7 +383,7 @@ def _safe_category_to_dir(category: str) -> Path:
     sub = mapping.get(category)
     if not sub:
         raise HTTPException(status_code=400, detail="Invalid category")
-    return UPLOAD_DIR / sub
+    return io_dir(workspace) / sub
 
 def _list_files_in_dir(directory: Path) -> List[Dict]:
     if not directory.exists():
@@ -371,26 +405,34 @@ def _list_files_in_dir(directory: Path) -> List[Dict]:
     return items
 
 @app.get("/generation/status")
-async def generation_status():
-    """Return whether generation has completed, by checking a marker file."""
-    marker = UPLOAD_DIR / "generation_complete.json"
+async def generation_status(workspace_id: Optional[str] = None):
+    """Return whether generation has completed for a workspace (default: the most recent one), by checking a marker file."""
+    workspace = _latest_workspace(workspace_id)
+    if not workspace:
+        return {"completed": False, "completed_at": None, "workspace_id": None}
+    marker = io_dir(workspace) / "generation_complete.json"
     if marker.exists():
         try:
             with open(marker, "r", encoding="utf-8") as f:
                 data = json.load(f)
-            return {"completed": bool(data.get("completed", False)), "completed_at": data.get("completed_at")}
+            return {"completed": bool(data.get("completed", False)), "completed_at": data.get("completed_at"), "workspace_id": workspace.name}
         except Exception:
-            return {"completed": True, "completed_at": None}
-    return {"completed": False, "completed_at": None}
+            return {"completed": True, "completed_at": None, "workspace_id": workspace.name}
+    return {"completed": False, "completed_at": None, "workspace_id": workspace.name}
 
 @app.get("/course-material/preview")
-async def get_course_material_preview():
+async def get_course_material_preview(workspace_id: Optional[str] = None):
     """
-    Return text content preview from the most recent .txt in 'Inputs and Outputs/course material'.
-    Fallback to any .txt in 'Inputs and Outputs' if none found.
+    Return text content preview from the most recent .txt in the workspace's 'Inputs and Outputs/course material'.
+    Fallback to any .txt in its 'Inputs and Outputs' if none found.
     """
+    workspace = _latest_workspace(workspace_id)
+    if not workspace:
+        return {"file": None, "path": None, "preview": ""}
+    output_dir = io_dir(workspace)
+
     # First, check for deep_agent_output.txt explicitly
-    deep_agent_output_path = UPLOAD_DIR / "deep_agent_output.txt"
+    deep_agent_output_path = output_dir / "deep_agent_output.txt"
     if deep_agent_output_path.exists():
         try:
             text = deep_agent_output_path.read_text(encoding="utf-8", errors="replace")
@@ -400,12 +442,12 @@ async def get_course_material_preview():
             # Fallback to normal logic if reading fails
     
     # Prefer course material folder
-    cm_dir = _safe_category_to_dir("course-material")
+    cm_dir = _safe_category_to_dir("course-material", workspace)
     candidates: List[Path] = []
     if cm_dir.exists():
         candidates += list(cm_dir.glob("*.txt"))
-    # Fallback: any txt in root UPLOAD_DIR
-    candidates += list(UPLOAD_DIR.glob("*.txt"))
+    # Fallback: any txt in the workspace's output root
+    candidates += list(output_dir.glob("*.txt"))
     if not candidates:
         # Return empty preview gracefully instead of 404
         return {"file": None, "path": None, "preview": ""}
@@ -418,24 +460,33 @@ async def get_course_material_preview():
     return {"file": latest.name, "path": str(latest), "preview": text}
 
 @app.get("/files/{category}")
-async def list_category_files(category: str):
+async def list_category_files(category: str, workspace_id: Optional[str] = None):
     """
-    List files for a given category: course-material | quizzes | ppts | flashcards
+    List files for a given category: course-material | quizzes | ppts | flashcards.
+    Without workspace_id the most recent workspace is used, as for /generate-content/.
     """
-    directory = _safe_category_to_dir(category)
-    files = _list_files_in_dir(directory)
-    return {"category": category, "directory": str(directory), "files": files, "total": len(files)}
+    workspace = _latest_workspace(workspace_id)
+    files: List[Dict] = []
+    if workspace:
+        directory = _safe_category_to_dir(category, workspace)
+        for f in _list_files_in_dir(directory):
+            f["workspace_id"] = workspace.name
+            files.append(f)
+    files.sort(key=lambda x: x["modified"], reverse=True)
+    return {"category": category, "workspace_id": workspace.name if workspace else workspace_id,
+            "files": files, "total": len(files)}
 
 @app.get("/download/{category}/{filename}")
-async def download_file(category: str, filename: str):
-    """Download a file by category and filename."""
+async def download_file(category: str, filename: str, workspace_id: Optional[str] = None):
+    """Download a file by category and filename (from the given workspace, else the most recent one)."""
     if "/" in filename or "\\" in filename:
         raise HTTPException(status_code=400, detail="Invalid filename")
-    directory = _safe_category_to_dir(category)
-    file_path = directory / filename
-    if not file_path.exists() or not file_path.is_file():
-        raise HTTPException(status_code=404, detail="File not found")
-    return FileResponse(path=str(file_path), filename=filename)
+    workspace = _latest_workspace(workspace_id)
+    if workspace:
+        file_path = _safe_category_to_dir(category, workspace) / filename
+        if file_path.exists() and file_path.is_file():
+            return FileResponse(path=str(file_path), filename=filename)
+    raise HTTPException(status_code=404, detail="File not found")
 
 def _slugify(name: str) -> str:
     base = Path(name).stem
@@ -443,66 +494,78 @@ def _slugify(name: str) -> str:
 
 @app.get("/courses")
 async def list_courses():
-    """Group generated content into courses based on files in 'course material'."""
-    cm_dir = _safe_category_to_dir("course-material")
-    if not cm_dir.exists():
-        return {"courses": [], "total": 0}
+    """Group generated content into courses based on files in each workspace's 'course material'."""
     courses: Dict[str, Dict] = {}
-    # Identify courses from course material files (txt/docx/pdf)
-    for p in cm_dir.iterdir():
-        if p.is_file() and p.suffix.lower() in [".txt", ".docx", ".pdf"]:
-            stem = p.stem
-            slug = _slugify(stem)
-            info = courses.setdefault(slug, {
-                "slug": slug,
-                "title": stem,
-                "updated": datetime.fromtimestamp(p.stat().st_mtime).isoformat(),
-                "categories": {"course-material": 0, "quizzes": 0, "ppts": 0, "flashcards": 0},
-            })
-            info["categories"]["course-material"] += 1
-            # Track latest update
-            ts = datetime.fromtimestamp(p.stat().st_mtime).isoformat()
-            if ts > info["updated"]:
-                info["updated"] = ts
-    # Count across other categories by prefix match
-    for cat in ["quizzes", "ppts", "flashcards"]:
-        d = _safe_category_to_dir(cat)
-        if not d.exists():
+    for workspace in list_workspaces():
+        cm_dir = _safe_category_to_dir("course-material", workspace)
+        if not cm_dir.exists():
             continue
-        for p in d.iterdir():
-            if not p.is_file():
+        workspace_courses: Dict[str, Dict] = {}
+        # Identify courses from course material files (txt/docx/pdf)
+        for p in cm_dir.iterdir():
+            if p.is_file() and p.suffix.lower() in [".txt", ".docx", ".pdf"]:
+                stem = p.stem
+                slug = _slugify(stem)
+                if slug in courses and slug not in workspace_courses:
+                    # Same course title already listed from a newer workspace
+                    continue
+                info = courses.setdefault(slug, {
+                    "slug": slug,
+                    "title": stem,
+                    "workspace_id": workspace.name,
+                    "updated": datetime.fromtimestamp(p.stat().st_mtime).isoformat(),
+                    "categories": {"course-material": 0, "quizzes": 0, "ppts": 0, "flashcards": 0},
+                })
+                workspace_courses[slug] = info
+                info["categories"]["course-material"] += 1
+                # Track latest update
+                ts = datetime.fromtimestamp(p.stat().st_mtime).isoformat()
+                if ts > info["updated"]:
+                    info["updated"] = ts
+        # Count across other categories by prefix match, within the same workspace
+        for cat in ["quizzes", "ppts", "flashcards"]:
+            d = _safe_category_to_dir(cat, workspace)
+            if not d.exists():
                 continue
-            stem = p.stem
-            # attempt to map to a known course by checking if any course title is a prefix of stem
-            for slug, info in courses.items():
-                title_stem = info["title"]
-                if stem.lower().startswith(title_stem.lower()):
-                    info["categories"][cat] += 1
-                    ts = datetime.fromtimestamp(p.stat().st_mtime).isoformat()
-                    if ts > info["updated"]:
-                        info["updated"] = ts
-                    break
+            for p in d.iterdir():
+                if not p.is_file():
+                    continue
+                stem = p.stem
+                # attempt to map to a known course by checking if any course title is a prefix of stem
+                for slug, info in workspace_courses.items():
+                    title_stem = info["title"]
+                    if stem.lower().startswith(title_stem.lower()):
+                        info["categories"][cat] += 1
+                        ts = datetime.fromtimestamp(p.stat().st_mtime).isoformat()
+                        if ts > info["updated"]:
+                            info["updated"] = ts
+                        break
     list_courses_resp = sorted(courses.values(), key=lambda x: x["updated"], reverse=True)
     return {"courses": list_courses_resp, "total": len(list_courses_resp)}
 
 @app.get("/courses/{slug}")
-async def course_detail(slug: str):
+async def course_detail(slug: str, workspace_id: Optional[str] = None):
     """Return files per category for the given course slug."""
-    # Find matching course title from slug by scanning course material
-    cm_dir = _safe_category_to_dir("course-material")
-    if not cm_dir.exists():
-        raise HTTPException(status_code=404, detail="No courses available")
+    # Find matching course title from slug by scanning course material, newest workspace first
     title = None
-    for p in cm_dir.iterdir():
-        if p.is_file():
-            if _slugify(p.stem) == slug:
-                title = p.stem
-                break
+    workspace = None
+    for ws in _workspaces_for(workspace_id):
+        cm_dir = _safe_category_to_dir("course-material", ws)
+        if not cm_dir.exists():
+            continue
+        for p in cm_dir.iterdir():
+            if p.is_file():
+                if _slugify(p.stem) == slug:
+                    title = p.stem
+                    workspace = ws
+                    break
+        if title:
+            break
     if not title:
         raise HTTPException(status_code=404, detail="Course not found")
 
     def collect(cat: str) -> List[Dict]:
-        dirp = _safe_category_to_dir(cat)
+        dirp = _safe_category_to_dir(cat, workspace)
         out: List[Dict] = []
         if not dirp.exists():
             return out
@@ -513,7 +576,7 @@ async def course_detail(slug: str):
                     "size": f.stat().st_size,
                     "modified": datetime.fromtimestamp(f.stat().st_mtime).isoformat(),
                     "ext": f.suffix.lower(),
-                    "download_url": f"/download/{cat}/{f.name}",
+                    "download_url": f"/download/{cat}/{f.name}?workspace_id={workspace.name}",
                 })
         out.sort(key=lambda x: x["modified"], reverse=True)
         return out
@@ -521,6 +584,7 @@ async def course_detail(slug: str):
     result = {
         "slug": slug,
         "title": title,
+        "workspace_id": workspace.name,
         "course_material": collect("course-material"),
         "quizzes": collect("quizzes"),
         "ppts": collect("ppts"),
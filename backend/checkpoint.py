@@ -0,0 +1,89 @@
+"""Per-workspace checkpoint manifest for the stage graph.
+
+`checkpoint.json` in the workspace records, for every stage of the last run,
+its status, timing and the artifacts it wrote. A resumed run keeps stages
+that completed (and whose artifacts are still on disk) and reruns the rest,
+so a deep agent timeout or a ppt.py crash no longer restarts from llm.py.
+"""
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Set
+
+from workspace import io_dir
+
+CHECKPOINT_FILE = "checkpoint.json"
+
+_lock = threading.Lock()
+
+
+def checkpoint_path(workspace: Path) -> Path:
+    return Path(workspace) / CHECKPOINT_FILE
+
+
+def load_checkpoint(workspace: Path) -> Dict:
+    """Return the workspace's checkpoint manifest, or an empty one."""
+    path = checkpoint_path(workspace)
+    if not path.exists():
+        return {"stages": {}}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        data.setdefault("stages", {})
+        return data
+    except Exception:
+        return {"stages": {}}
+
+
+def _write(workspace: Path, data: Dict):
+    path = checkpoint_path(workspace)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".json.tmp")
+    data["updated_at"] = datetime.now().isoformat()
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+
+
+def reset_checkpoint(workspace: Path):
+    """Start a fresh manifest for a new (non-resumed) run."""
+    with _lock:
+        _write(workspace, {"created_at": datetime.now().isoformat(), "stages": {}})
+
+
+def record_stage(workspace: Path, stage, result: Dict):
+    """Record a finished or skipped stage and the artifacts it produced."""
+    output_root = io_dir(workspace)
+    entry = {k: result.get(k) for k in ("status", "return_code", "started_at", "finished_at", "duration", "cached")}
+    entry["artifacts"] = [str(output_root / a) for a in stage.outputs if (output_root / a).exists()]
+    with _lock:
+        data = load_checkpoint(workspace)
+        data["stages"][stage.name] = entry
+        _write(workspace, data)
+
+
+def completed_stages(workspace: Path, stages: List, deps: Dict[str, List[str]]) -> Set[str]:
+    """Stages that can be kept on resume.
+
+    A stage is kept if it succeeded, all its declared outputs still exist and
+    every stage it depends on is kept too (otherwise its inputs are about to be
+    regenerated and its outputs would be stale).
+    """
+    recorded = load_checkpoint(workspace)["stages"]
+    output_root = io_dir(workspace)
+    candidates = {
+        s.name for s in stages
+        if recorded.get(s.name, {}).get("status") == "success"
+        and all((output_root / a).exists() for a in s.outputs)
+    }
+    kept: Set[str] = set()
+    changed = True
+    while changed:
+        changed = False
+        for name in candidates - kept:
+            if all(d in kept for d in deps[name]):
+                kept.add(name)
+                changed = True
+    return kept
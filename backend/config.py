@@ -1,20 +1,11 @@
-import json
-import os
+from workspace import load_config, save_config, workspace_from_args
 
-def load_user_inputs():
-    """Load user inputs from file if exists"""
-    config_file = "user_config.json"
-    if os.path.exists(config_file):
-        try:
-            with open(config_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            return None
-    return None
+def load_user_inputs(workspace=None):
+    """Load user inputs from the workspace's user_config.json if it exists"""
+    return load_config(workspace)
 
-def save_user_inputs(user_name, user_id, difficulty_level, duration, teaching_style):
-    """Save user inputs to file"""
-    config_file = "user_config.json"
+def save_user_inputs(user_name, user_id, difficulty_level, duration, teaching_style, workspace=None):
+    """Save user inputs to the workspace's user_config.json"""
     config_data = {
         "user_name": user_name,
         "user_id": user_id,
@@ -23,15 +14,14 @@ def save_user_inputs(user_name, user_id, difficulty_level, duration, teaching_st
         "teaching_style": teaching_style
     }
     try:
-        with open(config_file, 'w', encoding='utf-8') as f:
-            json.dump(config_data, f, indent=2)
+        save_config(config_data, workspace)
         return True
     except:
         return False
 
-def get_user_config():
+def get_user_config(workspace=None):
     """Get user configuration without prompting"""
-    saved_inputs = load_user_inputs()
+    saved_inputs = load_user_inputs(workspace)
     if saved_inputs:
         return saved_inputs
     else:
@@ -44,8 +34,8 @@ def get_user_config():
             "teaching_style": "theoretical"
         }
 
-# Load configuration when imported
-config = get_user_config()
+# Load configuration when imported (from the workspace given on the command line, if any)
+config = get_user_config(workspace_from_args())
 user_name = config['user_name']
 user_id = config['user_id']
 difficulty_level = config['difficulty_level']
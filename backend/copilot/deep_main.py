@@ -1,31 +1,39 @@
-import asyncio, os, sys, uuid, inspect
+import asyncio, os, re, sys, inspect
 from pathlib import Path
-from datetime import datetime
 
 from google.adk.runners import Runner
-from google.adk.sessions import InMemorySessionService
 from google.genai import types  # Content / Part
 from dotenv import load_dotenv
 
 # Make project root importable
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
-from knowledge_1.agent import deep_content_loop as final_pipeline  # LoopAgent over DeepCourseContentCreator
+from workspace import job_from_args, io_dir, agent_files_dir
+import telemetry
+import progress
+from stream_sink import StreamSink
+from adk_sessions import APP_NAME, USER_ID, get_session_service, open_session, resuming
+# Agents are built per run from the job's inputs (LoopAgent over DeepCourseContentCreator, or one agent per week)
+from knowledge_1.agent import (create_deep_content_loop, get_output_file_path, load_planner_output,
+                               week_agent, week_outline)
+from plan_sections import course_weeks
+from course_material import get_duration_weeks
+from deep_validation import (DEEP_REPAIR_ROUNDS, check_week, describe, make_report, read_week, split_weeks,
+                             week_block, week_spans)
 
-APP_NAME = "AI Copilot for Instructors"
-EXPORT_DIR = "Inputs and Outputs"
+# Weeks generated at once; the host-wide rate limiter still bounds the actual Gemini calls
+DEEP_WEEK_CONCURRENCY = int(os.getenv("DEEP_WEEK_CONCURRENCY", "4"))
+DEEP_WEEKS_DIR = "deep_weeks"
+# Labelled log of every event the loop streamed (the course itself is deep_agent_output.txt)
+DEEP_EVENTS_FILE = "deep_agent_events.txt"
+COURSE_HEADER = "Course Content Generated by DeepCourseContentCreator Agent"
 
-def _out_dir() -> Path:
-    root = Path(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
-    p = root / EXPORT_DIR
-    p.mkdir(parents=True, exist_ok=True)
-    return p
+# Week markers the DeepCourseContentCreator instruction asks for
+WEEK_STARTED_RE = re.compile(r"=== PROCESSING WEEK (\d+) ===")
+WEEK_COMPLETED_RE = re.compile(r"=== WEEK (\d+) COMPLETED ===")
 
-def _write_txt(basename: str, text: str) -> Path:
-    path = _out_dir() / f"{basename}.txt"
-    path.write_text(text or "", encoding="utf-8")
-    print(f"[OK] Saved: {path}")
-    return path
+def _out_dir(workspace=None) -> Path:
+    return io_dir(workspace)
 
 def _extract_text(event) -> str:
     # Prefer event.text, else fall back to structured content.parts[*].text
@@ -40,7 +48,24 @@ def _extract_text(event) -> str:
                 return pt
     return ""
 
-async def run_knowledge_and_save(prompt: str):
+def _open_course(workspace=None) -> StreamSink:
+    """The stage artifact (deep_agent_output.txt), written week by week through one buffered handle."""
+    sink = StreamSink(_out_dir(workspace) / "deep_agent_output.txt")
+    sink.write(f"{COURSE_HEADER}\n\n")
+    return sink
+
+def _marker_text(event, txt: str) -> str:
+    """Event text plus any write_to_file content, where completed weeks usually appear."""
+    parts = [txt]
+    content = getattr(event, "content", None)
+    for p in (getattr(content, "parts", None) or []):
+        call = getattr(p, "function_call", None)
+        args = getattr(call, "args", None) if call else None
+        if isinstance(args, dict) and isinstance(args.get("content"), str):
+            parts.append(args["content"])
+    return "\n".join(parts)
+
+async def run_knowledge_and_save(prompt: str, planner_content: str, workspace=None):
     # Ensure GEMINI_API_KEY loaded from project root .env
     project_root = Path(__file__).resolve().parents[1]
     load_dotenv(dotenv_path=project_root / ".env", override=False)
@@ -56,93 +81,233 @@ async def run_knowledge_and_save(prompt: str):
     if os.getenv("NO_SERVER") == "1" or os.getenv("DISABLE_SERVICES") == "1":
         print("Running in no-server mode - disabling any potential service bindings")
 
-    # 1) DB-free session
-    session_service = InMemorySessionService()
-    user_id = "user-local"
-    session_id = f"session-{uuid.uuid4()}"
-    created = session_service.create_session(app_name=APP_NAME, user_id=user_id, session_id=session_id)
-    if inspect.isawaitable(created):
-        await created  # some builds expose async create
+    # 1) Session persisted in the workspace's SQLite store, keyed by job and stage;
+    #    a resumed run keeps the weeks its earlier run wrote and only adds the rest
+    session_service = get_session_service(workspace)
+    user_id = USER_ID
+    session_id, resumed = await open_session(session_service, "deep_agent", workspace)
+    content_path = Path(get_output_file_path(workspace))
+    completed_weeks = []
+    if resumed and content_path.exists():
+        completed_weeks = sorted(week_spans(content_path))
+    if completed_weeks:
+        print(f"⏩ Week(s) {completed_weeks} already written; continuing after them")
+        prompt = ("Continue the week-by-week lessons from where you stopped. "
+                  "Do not repeat weeks that are already completed.")
 
     # 2) Prepare message (GenAI format)
     user_msg = types.Content(role="user", parts=[types.Part.from_text(text=prompt)])
 
     # 3) Runner (SequentialAgent executes sub-agents in order) 
     #    (Sequential/Loop agent semantics in ADK docs)
-    runner = Runner(agent=final_pipeline, app_name=APP_NAME, session_service=session_service)
+    runner = Runner(agent=create_deep_content_loop(planner_content, workspace, completed_weeks), app_name=APP_NAME,
+                    session_service=session_service)
 
     print("\n=== Running Deep Content Loop (DeepCourseContentCreator) ===")
-    # Prepare output file: truncate at start so this run has a clean log
-    output_path = _out_dir() / "deep_agent_output.txt"
-    output_path.write_text("", encoding="utf-8")
-    # Stream buckets as a fallback if session.state isn't filled
-    stream_bucket = {
-        "DeepCourseContentCreator": [],
-        "Other": []
-    }
-    # Chronological capture of ALL text events (to preserve order)
-    stream_all: list[str] = []
-
-    seen_done = False
-    async for event in runner.run_async(user_id=user_id, session_id=session_id, new_message=user_msg):
-        # Capture ANY event text to avoid missing intermediate chunks
-        txt = _extract_text(event)
-        if not txt:
-            continue
-        # Detect source agent if available, else try to infer, else mark unknown
-        agent_name = getattr(event, "agent_name", None)
-        if not agent_name and txt.startswith("=== [DeepCourseContentCreator] ==="):
-            agent_name = "DeepCourseContentCreator"
-        # Save into buckets
-        if agent_name in stream_bucket:
-            stream_bucket[agent_name].append(txt)
-        else:
-            stream_bucket["Other"].append(txt)
-        # Append to chronological log with labels
-        etype = getattr(event, "type", "")
-        label = agent_name or "UnknownAgent"
-        chunk = f"--- [{label} | {etype}] ---\n{txt}\n"
-        stream_all.append(chunk)
-        # Also append to the file immediately to persist progress
-        with output_path.open("a", encoding="utf-8") as f:
-            f.write(chunk)
-        # Detect completion sentinel
-        if "DONE and DUSTED" in txt:
-            seen_done = True
-
-    # 4) Prefer full chronological stream so every iteration/message is captured (with labels)
-    stream_full = "\n\n".join(stream_all).strip()
-
-    if stream_full:
-        # If we already appended while streaming, ensure file has the final full content as well
-        # Overwrite to keep a single cohesive log
-        output_path.write_text(stream_full + "\n", encoding="utf-8")
-        # If sentinel was found, we consider this a complete run
-        if seen_done:
-            return
+    # Event log: a fresh run starts a clean log; a resumed session appends to what its
+    # earlier run captured. Events stream into it through one buffered handle.
+    events_path = _out_dir(workspace) / DEEP_EVENTS_FILE
+    weeks_started, weeks_completed = set(), set()
+    with StreamSink(events_path, append=resumed) as sink:
+        if resumed and events_path.stat().st_size:
+            sink.write("\n")
+        async for event in runner.run_async(user_id=user_id, session_id=session_id, new_message=user_msg):
+            # Capture ANY event text to avoid missing intermediate chunks
+            txt = _extract_text(event)
+            # Report each week once, as the agent starts and finishes it
+            markers = _marker_text(event, txt)
+            for week in WEEK_STARTED_RE.findall(markers):
+                if int(week) not in weeks_started:
+                    weeks_started.add(int(week))
+                    progress.emit("week_started", workspace, week=int(week))
+            for week in WEEK_COMPLETED_RE.findall(markers):
+                if int(week) not in weeks_completed:
+                    weeks_completed.add(int(week))
+                    progress.emit("week_completed", workspace, week=int(week), weeks_completed=len(weeks_completed))
+            if not txt:
+                continue
+            # Detect source agent if available, else try to infer, else mark unknown
+            agent_name = getattr(event, "agent_name", None)
+            if not agent_name and txt.startswith("=== [DeepCourseContentCreator] ==="):
+                agent_name = "DeepCourseContentCreator"
+            # Chronological log with labels, so every iteration/message is captured in order
+            etype = getattr(event, "type", "")
+            label = agent_name or "UnknownAgent"
+            sink.write(f"--- [{label} | {etype}] ---\n{txt}\n\n")
+    print(f"[OK] Streamed {sink.chunks} events ({sink.chars} characters) to: {events_path}")
+
+    # 4) The artifact is the course the quality gate checked: the creator's file with
+    #    repaired weeks replacing their earlier versions, copied one week at a time in week order
+    spans = week_spans(content_path) if content_path.exists() else {}
+    if spans:
+        sections = ((week, read_week(content_path, spans[week])) for week in sorted(spans))
+    else:
+        # The creator did not write its file; fall back to its final answer (output_key)
+        sess = session_service.get_session(app_name=APP_NAME, user_id=user_id, session_id=session_id)
+        if inspect.isawaitable(sess):
+            sess = await sess
+        state = getattr(sess, "state", {}) or {}
+        sections = sorted(split_weeks(state.get("deep_content", "")).items())
+    problems = {}
+    with _open_course(workspace) as course:
+        for week, section in sections:
+            problems[week] = check_week(section)
+            course.write(week_block(week, section))
+        course.write("DONE and DUSTED\n")
+    if not problems:
+        raise RuntimeError("No week content captured from DeepCourseContentCreator; "
+                           f"see {events_path} for what the agent streamed.")
+    report = make_report(problems, get_duration_weeks(workspace))
+    print(f"🔎 Deep content check: {describe(report)}")
+    if not report["ok"]:
+        print("⚠️ Deep content still has weak weeks after the loop; saved the best available content")
+    print(f"[OK] Saved: {course.path}")
 
-    # 5) Fallback to final state output if stream didn't capture
-    sess = session_service.get_session(app_name=APP_NAME, user_id=user_id, session_id=session_id)
+def _week_path(week: int, workspace=None) -> Path:
+    return agent_files_dir(workspace) / DEEP_WEEKS_DIR / f"week_{week:02d}.txt"
+
+async def _generate_week(session_service, agent, week: int, workspace=None) -> str:
+    """Run one week's agent in its own session and return the week's lesson text."""
+    session_id, _ = await open_session(session_service, f"deep_agent_week{week}", workspace, resume=False)
+    runner = Runner(agent=agent, app_name=APP_NAME, session_service=session_service)
+    user_msg = types.Content(role="user", parts=[types.Part.from_text(
+        text=f"Generate the deeply elaborated lesson for week {week}.")])
+    texts = []
+    async for event in runner.run_async(user_id=USER_ID, session_id=session_id, new_message=user_msg):
+        txt = _extract_text(event)
+        if txt:
+            texts.append(txt)
+    # Prefer the agent's final answer (output_key) over the streamed chunks
+    sess = session_service.get_session(app_name=APP_NAME, user_id=USER_ID, session_id=session_id)
     if inspect.isawaitable(sess):
         sess = await sess
     state = getattr(sess, "state", {}) or {}
-    deep_txt = state.get("deep_content", "").strip()  # from DeepCourseContentCreator (output_key)
+    text = (state.get(f"week_{week}_content") or "\n\n".join(texts)).strip()
+    if not text:
+        raise RuntimeError(f"No output captured for week {week}")
+    # Make sure the assembled course keeps the markers later stages index weeks by
+    if not WEEK_STARTED_RE.search(text):
+        text = f"=== PROCESSING WEEK {week} ===\n\n{text}"
+    if not WEEK_COMPLETED_RE.search(text):
+        text = f"{text}\n\n=== WEEK {week} COMPLETED ==="
+    return text
 
-    if deep_txt:
-        _write_txt("deep_agent_output", deep_txt)
-        return
+async def run_weeks_and_save(plan_overview: str, plan_weeks, workspace=None, kind: str = "week"):
+    """Generate every planned week concurrently (bounded) and assemble them in week order.
 
-    # 6) Last resort: dump anything else we caught
-    combined = "\n\n".join(stream_bucket["Other"]).strip()
-    if not combined:
-        raise RuntimeError("No output captured from DeepCourseContentCreator. Ensure output_key is set and agent replies.")
-    _write_txt("deep_agent_output", combined)
-    return
+    plan_weeks and kind come from plan_sections.course_weeks(). Only a plan written
+    week by week is padded to the configured course duration; scheduled modules are
+    checked against the weeks the plan gives them, unscheduled ones against the
+    module count.
 
-async def main_async():
+    Each finished week is saved under the agent folder's deep_weeks/, so a resumed run
+    only generates the weeks that are still missing, and checked locally
+    (deep_validation). Weeks that fail the check are regenerated, up to
+    DEEP_REPAIR_ROUNDS more times, instead of the whole course. A week is appended
+    to deep_agent_output.txt as soon as it and every week before it have passed,
+    so the artifact grows in week order and is never rewritten.
+    """
+    if not resuming():
+        for path in (agent_files_dir(workspace) / DEEP_WEEKS_DIR).glob("week_*.txt"):
+            path.unlink()
+    session_service = get_session_service(workspace)
+    semaphore = asyncio.Semaphore(max(1, DEEP_WEEK_CONCURRENCY))
+    week_plans = dict(plan_weeks)
+    expected_weeks = max(week_plans)
+    if kind == "week":
+        expected_weeks = max(expected_weeks, get_duration_weeks(workspace) or 0)
+        for week in range(1, expected_weeks + 1):
+            # Weeks of the configured duration (or gaps in the plan) without a plan section
+            week_plans.setdefault(week, f"Week {week}: not detailed separately in the plan; "
+                                        "continue the course arc from the neighbouring weeks.")
+    elif kind == "module":
+        print(f"⚠️ The plan's modules don't say which weeks they cover; writing one lesson per module "
+              f"({expected_weeks} modules)")
+    weeks = sorted(week_plans)
+    outline = week_outline(plan_weeks)
+    print(f"\n=== Generating {len(weeks)} weeks (up to {DEEP_WEEK_CONCURRENCY} at once) ===")
+
+    problems = {}  # week -> check_week() problems of its current draft
+    written = 0  # weeks[:written] are in the artifact
+    course = _open_course(workspace)
+
+    def write_ready(final: bool = False):
+        """Append the next weeks in order while they have passed (or, when final, exist at all)."""
+        nonlocal written
+        while written < len(weeks) and weeks[written] in problems and (final or not problems[weeks[written]]):
+            week = weeks[written]
+            text = _week_path(week, workspace).read_text(encoding="utf-8")
+            course.write(week_block(week, split_weeks(text).get(week, text)))
+            written += 1
+
+    def check(week: int, text: str):
+        section = split_weeks(text).get(week)
+        problems[week] = check_week(section) if section is not None else ["missing"]
+        write_ready()
+
+    async def run_week(week: int, repair_note: str = ""):
+        path = _week_path(week, workspace)
+        if path.exists() and path.stat().st_size:
+            print(f"⏩ Week {week} already generated")
+            check(week, path.read_text(encoding="utf-8"))
+            return
+        async with semaphore:
+            progress.emit("week_started", workspace, week=week, repair=bool(repair_note))
+            agent = week_agent(week, week_plans[week], plan_overview, outline, repair_note)
+            text = await _generate_week(session_service, agent, week, workspace)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text, encoding="utf-8")
+        done = sum(1 for w in weeks if _week_path(w, workspace).exists())
+        progress.emit("week_completed", workspace, week=week, weeks_completed=done)
+        print(f"✅ Week {week} generated ({len(text)} characters)")
+        check(week, text)
+
+    repair_notes = {}
+    try:
+        for round_number in range(DEEP_REPAIR_ROUNDS + 1):
+            results = await asyncio.gather(*(run_week(week, repair_notes.get(week, "")) for week in weeks),
+                                           return_exceptions=True)
+            failed = [week for week, result in zip(weeks, results) if isinstance(result, BaseException)]
+            for week, result in zip(weeks, results):
+                if isinstance(result, BaseException):
+                    print(f"❌ Week {week} failed: {result}")
+            if failed:
+                raise RuntimeError(f"Deep content generation failed for week(s) {failed}; "
+                                   "completed weeks are kept for a resumed run")
+
+            report = make_report(problems, expected_weeks)
+            print(f"🔎 Deep content check: {describe(report)}")
+            if report["ok"] or round_number == DEEP_REPAIR_ROUNDS:
+                break
+            repairable = sorted(report["issues"])
+            print(f"🔧 Regenerating week(s) {repairable}")
+            repair_notes = {week: "; ".join(report["issues"][week]) for week in repairable}
+            for week in repairable:
+                _week_path(week, workspace).unlink(missing_ok=True)
+                problems.pop(week, None)
+        if not report["ok"]:
+            print("⚠️ Deep content still has weak weeks after repair; saving the best available content")
+        write_ready(final=True)
+        course.write("DONE and DUSTED\n")
+    finally:
+        course.close()
+    print(f"[OK] Saved: {course.path}")
+
+async def main_async(workspace=None):
     # Provide the deep content creator a concise task prompt
     prompt = "Take the provided course_content and generate deeply elaborated week-by-week lessons."
-    await run_knowledge_and_save(prompt)
+    try:
+        planner_content = await load_planner_output(workspace)
+        plan_overview, plan_weeks, kind = course_weeks(planner_content)
+        if plan_weeks:
+            await run_weeks_and_save(plan_overview, plan_weeks, workspace, kind)
+        else:
+            # No week headings found in the plan: one agent writes all weeks in sequence
+            await run_knowledge_and_save(prompt, planner_content, workspace)
+    finally:
+        # Per-call records are in the job's llm_calls.jsonl (recorded by the agent's model callbacks)
+        telemetry.print_summary("Deep agent LLM calls")
 
 if __name__ == "__main__":
-    asyncio.run(main_async())
+    with job_from_args() as workspace:
+        asyncio.run(main_async(workspace))
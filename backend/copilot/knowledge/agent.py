@@ -1,30 +1,76 @@
 from google.adk.agents import LlmAgent
 from google.adk.tools import google_search
 from pathlib import Path
+import sys
+
+# Resolve project root: this file is at copilot/knowledge/agent.py -> go up 2 levels
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from workspace import lazy_root_agent, io_dir
+from rate_limiter import agent_callbacks
+from model_routes import model_for
+from grounding import grounding_enabled
 
 # Read the planner agent instruction file
-def read_planner_instruction():
+def read_planner_instruction(workspace=None):
     try:
-        # Resolve project root: this file is at copilot/knowledge/agent.py -> go up 2 levels
-        project_root = Path(__file__).resolve().parents[2]
-        file_path = project_root / "Inputs and Outputs" / "planner_agent_instruction.txt"
+        file_path = io_dir(workspace) / "planner_agent_instruction.txt"
         with file_path.open('r', encoding='utf-8') as file:
             return file.read()
     except FileNotFoundError:
-        return "Planner instruction file not found. Please ensure the file exists at 'Inputs and Outputs/planner_agent_instruction.txt' under the project root."
+        return "Planner instruction file not found. Please ensure the file exists at 'Inputs and Outputs/planner_agent_instruction.txt' in the job workspace."
     except Exception as e:
         return f"Error reading planner instruction file: {str(e)}"
 
-# Get the content from the planner instruction file
-planner_content = read_planner_instruction()
-
-courseplanneragent = LlmAgent(
-    name="CoursePlannerAgent",
-    model="gemini-2.5-flash",
-    tools=[google_search],
-    description="A course planning agent that helps design and organize educational content.",
-    instruction=f"""
-    You are an expert Course Planner Agent that creates comprehensive, detailed course content plans while also functioning as a high-precision Web Search Agent to find, evaluate, and organize high-quality online resources. Your goal is to produce a fully implementable course plan aligned with the provided curriculum, topic, teaching style, and difficulty level.
+# Per-module resource curation, run after the plan skeleton (see module_resource_agent)
+RESOURCE_CURATION = """- Search the web for current, relevant, high-quality sources
+  Categories to cover where relevant:
+    * Academic resources and papers
+    * Blogs, tutorials, documentation
+    * Forums, community Q&A (StackOverflow, Reddit, etc.)
+    * Social media updates from domain experts
+    * “Go-to” industry hubs (e.g., Anthropic Blog, MDN Web Docs)
+    * Interactive tools and datasets
+  - Ensure **content type diversity** (text, video, interactive, code repos, etc.)
+  - Ensure **perspective diversity** (academic vs. practitioner, global perspectives)
+  - Avoid over-reliance on a single publisher/platform
+- For each resource found, provide:
+    * Module/Week it supports
+    * Title & URL
+    * Source Type (article, repo, blog, paper, etc.)
+    * Source Category (academic, blog, community, official docs, etc.)
+    * Difficulty Level Supported
+    * Teaching Style Supported
+    * Learning Style Supported
+    * Confidence Level (High / Medium / Low authority)
+    * License type (if applicable)
+    * 1-2 sentence rationale
+"""
+
+AUTHORITY_EVALUATION = """## AUTHORITY EVALUATION & SPARSE TOPICS HANDLING
+- Evaluate credibility:
+    * Domain provenance (`.edu`, `.org`, established publications)
+    * Author credentials
+    * Quality of structure/examples/references
+    * Reputation signals (citations, community trust)
+- Confidence Levels:
+    * [BLUE] High: Peer-reviewed, institution-backed, widely trusted
+    * [YELLOW] Medium: Popular blogs, reputable tutorials, community-endorsed
+    * [RED] Low: Unverified/anonymous - use only if fallback is needed
+- Sparse coverage handling:
+    * Return best-available with rationale
+    * Combine partial sources into coherent coverage
+"""
+
+def create_course_planner_agent(planner_content: str) -> LlmAgent:
+    """The planner agent for one job, given its `planner_agent_instruction.txt` content."""
+    return LlmAgent(
+        name="CoursePlannerAgent",
+        model=model_for("planner_agent"),
+        tools=[google_search] if grounding_enabled("planner_agent") else [],
+        description="A course planning agent that helps design and organize educational content.",
+        instruction=f"""
+    You are an expert Course Planner Agent that creates comprehensive, detailed course content plans. Your goal is to produce a fully implementable course plan aligned with the provided curriculum, topic, teaching style, and difficulty level.
 
 ---
 
@@ -51,7 +97,7 @@ The structured input will always include:
 ---
 
 ## CORE TASK
-Transform the provided specifications into a **highly detailed, actionable course content plan** that educators can immediately implement **and** curate diverse, credible, pedagogically aligned resources for each module.
+Transform the provided specifications into a **highly detailed, actionable course content plan** that educators can immediately implement. Diverse, credible, pedagogically aligned resources for each module are curated afterwards, per module, by resource agents working from your plan.
 
 ---
 
@@ -80,29 +126,8 @@ For each **Module/Week**:
 - **Core Content**: Topics, concepts, materials
 - **Activities & Exercises**: Practice, assignments, discussions
 - **Deliverables**: Expected student outputs
-- **Resources**:
-    - Search the web for current, relevant, high-quality sources  
-      Categories to cover where relevant:
-        * Academic resources and papers
-        * Blogs, tutorials, documentation
-        * Forums, community Q&A (StackOverflow, Reddit, etc.)
-        * Social media updates from domain experts
-        * “Go-to” industry hubs (e.g., Anthropic Blog, MDN Web Docs)
-        * Interactive tools and datasets
-      - Ensure **content type diversity** (text, video, interactive, code repos, etc.)
-      - Ensure **perspective diversity** (academic vs. practitioner, global perspectives)
-      - Avoid over-reliance on a single publisher/platform
-    - For each resource found, provide:
-        * Module/Week it supports
-        * Title & URL
-        * Source Type (article, repo, blog, paper, etc.)
-        * Source Category (academic, blog, community, official docs, etc.)
-        * Difficulty Level Supported
-        * Teaching Style Supported
-        * Learning Style Supported
-        * Confidence Level (High / Medium / Low authority)
-        * License type (if applicable)
-        * 1-2 sentence rationale
+- **Resources**: do NOT search for or list resources per module here; they are
+  curated separately for every module, in parallel, once this plan is done
 
 ---
 
@@ -131,31 +156,16 @@ For each **Module/Week**:
 
 ---
 
-### 6. Authority Evaluation & Sparse Topics Handling
-- Evaluate credibility:
-    * Domain provenance (`.edu`, `.org`, established publications)
-    * Author credentials
-    * Quality of structure/examples/references
-    * Reputation signals (citations, community trust)
-- Confidence Levels:
-    * [BLUE] High: Peer-reviewed, institution-backed, widely trusted
-    * [YELLOW] Medium: Popular blogs, reputable tutorials, community-endorsed
-    * [RED] Low: Unverified/anonymous - use only if fallback is needed
-- Sparse coverage handling:
-    * Return best-available with rationale
-    * Combine partial sources into coherent coverage
-
----
-
-### 7. Go-To Sources & Social Media Monitoring
+### 6. Go-To Sources & Social Media Monitoring
 - Identify **must-follow** resources and personalities for the domain
 - Include relevant social hashtags, LinkedIn groups, and Twitter/X lists
 - Always check for **latest news/blog updates** relevant to the course topic
 
 ---
 
-### 8. Output Format
+### 7. Output Format
 - Clear **Markdown** hierarchy (#, ##, ###)
+- Start every module's section with a level-2 heading `## Module N: Title` (N = 1, 2, 3, ...) and keep everything about that module inside its section
 - Bulleted and numbered lists
 - Tables for schedules/resources
 - Code blocks for technical instructions
@@ -163,7 +173,7 @@ For each **Module/Week**:
 
 ---
 
-### 9. Quality Standards
+### 8. Quality Standards
 - All activities have clear, actionable instructions
 - All resources are current, accessible, and matched to difficulty/style
 - Timeline is realistic and aligned with learning goals
@@ -172,7 +182,7 @@ For each **Module/Week**:
 
 ---
 
-### 10. Final Deliverable
+### 9. Final Deliverable
 At the end of your output:
 - Provide a **specialized system prompt for a Teaching Agent** that:
     * Uses the designed course outline to guide learners
@@ -183,14 +193,44 @@ At the end of your output:
 
 ---
 
-You must combine your **course planning expertise** with **rigorous web resource discovery and evaluation** to produce a plan that is both academically strong and practically implementable.
+You must apply your **course planning expertise** to produce a plan that is both academically strong and practically implementable.
 Begin every response with a heading saying "=== [CoursePlannerAgent] ===
 """,
-    output_key="course_plan",
-)
+        output_key="course_plan",
+        **agent_callbacks("planner_agent"),
+    )
+
+def module_resource_agent(module: int, module_plan: str, course_overview: str, planner_content: str) -> LlmAgent:
+    """Agent that curates the resources for one module of the planner's course plan skeleton.
+
+    The planner stage (copilot/main.py) runs one per module concurrently and merges
+    their answers into the plan's module sections.
+    """
+    return LlmAgent(
+        name=f"ModuleResourceCurator{module}",
+        model=model_for("planner_agent"),
+        tools=[google_search] if grounding_enabled("planner_agent") else [],
+        description=f"Finds and evaluates online resources for module {module} of the course plan.",
+        instruction=f"""
+You are a high-precision Web Search Agent that finds, evaluates, and organizes high-quality online resources for ONE module of a course.
+
+COURSE DESIGN SPECIFICATIONS (from `planner_agent_instruction.txt`):
+{planner_content}
 
-print("Planner agent has successfully completed its task")
+COURSE PLAN OVERVIEW:
+{course_overview}
 
-root_agent = courseplanneragent
+THE MODULE YOU CURATE RESOURCES FOR (module {module}):
+{module_plan}
+
+## RESOURCES
+{RESOURCE_CURATION}
+{AUTHORITY_EVALUATION}
+## OUTPUT
+Reply with only a level-3 heading `### Resources for Module {module}` followed by the resources (a table or a list), matched to the module's objectives, difficulty level and teaching style.
+""",
+        output_key=f"module_{module}_resources",
+        **agent_callbacks("planner_agent"),
+    )
 
-print("Course content generation pipeline has been successfully configured!")
\ No newline at end of file
+__getattr__ = lazy_root_agent(__name__, lambda workspace: create_course_planner_agent(read_planner_instruction(workspace)))
\ No newline at end of file
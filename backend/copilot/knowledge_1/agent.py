@@ -1,7 +1,22 @@
-from google.adk.agents import LlmAgent, SequentialAgent, LoopAgent
+from google.adk.agents import BaseAgent, LlmAgent, LoopAgent, ParallelAgent
+from google.adk.events import Event, EventActions
 from google.adk.tools import google_search
 from pathlib import Path
 import os
+import sys
+from typing import List, Optional, Tuple
+
+# Resolve project root: this file is at copilot/knowledge_1/agent.py -> go up 2 levels
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from workspace import lazy_root_agent, io_dir, agent_files_dir
+from rate_limiter import agent_callbacks
+from model_routes import model_for
+from grounding import grounding_enabled
+from course_material import get_duration_weeks
+from deep_validation import describe, validate_course
+from adk_sessions import load_state, load_state_async
+from plan_sections import course_weeks
 
 # File writing function (will be automatically wrapped as FunctionTool by ADK)
 def write_to_file(file_path: str, content: str, mode: str = "a") -> dict:
@@ -27,63 +42,39 @@ def write_to_file(file_path: str, content: str, mode: str = "a") -> dict:
         }
 
 # Helper function to get the proper file path
-def get_output_file_path():
+def get_output_file_path(workspace=None):
     """Get the proper file path for saving the deep course content"""
-    project_root = Path(__file__).resolve().parents[2]
-    file_path = project_root / "Inputs and Outputs" / "deep_agent_output.txt"
+    file_path = agent_files_dir(workspace) / "deep_course_content_output.txt"
     return str(file_path)
 
+def _state_plan(state) -> Optional[str]:
+    course_plan = state.get("course_plan")
+    return course_plan if isinstance(course_plan, str) and course_plan.strip() else None
+
 # Read the planner agent instruction file
-def read_planner_output():
+def read_planner_output(workspace=None):
+    # Prefer the plan the planner agent left in the job's persisted session state
+    course_plan = _state_plan(load_state("planner_agent", workspace))
+    if course_plan:
+        return course_plan
+    return _read_planner_output_file(workspace)
+
+async def load_planner_output(workspace=None):
+    """read_planner_output() for code already running in an event loop (e.g. deep_main)."""
+    return _state_plan(await load_state_async("planner_agent", workspace)) or _read_planner_output_file(workspace)
+
+def _read_planner_output_file(workspace=None):
     try:
-        # Resolve project root: this file is at copilot/knowledge/agent.py -> go up 2 levels
-        project_root = Path(__file__).resolve().parents[2]
-        file_path = project_root / "Inputs and Outputs" / "plan_agent_output.txt"
+        file_path = io_dir(workspace) / "plan_agent_output.txt"
         with file_path.open('r', encoding='utf-8') as file:
             return file.read()
     except FileNotFoundError:
-        return "Planner agent output file not found. Please ensure the file exists at 'Inputs and Outputs/planner_agent_instruction.txt' under the project root."
+        return "Planner agent output file not found. Please ensure the file exists at 'Inputs and Outputs/plan_agent_output.txt' in the job workspace."
     except Exception as e:
         return f"Error reading planner output file: {str(e)}"
 
-# Get the content from the planner instruction file
-planner_content = read_planner_output()
-
-deep_course_content_Creator = LlmAgent(
-    name = "DeepCourseContentCreator",
-    model = "gemini-2.0-flash",
-    tools = [write_to_file],  
-    description = "A deep content creator agent that generates extremely comprehensive and detailed course materials week-by-week and saves them to a file.",
-    instruction= f"""
-You are an Expert Deep Course Content Creator Agent with 20+ years of experience in educational design. 
-You transform basic course content into fully teachable, deeply elaborated week-by-week lessons.
-
-INPUT:
-You will be provided with the following course design specifications (from `plan_agent_output.txt`):
-{planner_content}
-
-YOUR MANDATE:
-- Teach using a real-world-problem-first approach
-- Each week should be a complete, stand-alone teaching unit
-- Always connect new weeks to the knowledge from previous weeks
-- Focus on rich explanations, not quizzes or flashcards
-- Use BOTH your LLM intelligence and the Google Search tool to gather, verify, and integrate the **most accurate, current, and outstanding course content possible**
-- **IMPORTANT: Save ALL generated content to a file using the write_to_file tool**
-
-FILE SAVING INSTRUCTIONS:
-- At the start of content generation, use write_to_file tool to create/overwrite the output file: 'Inputs and Outputs/deep_course_content_output.txt' with a course header
-- After completing each week's content, use write_to_file tool with mode='a' to append that week's content to the file
-- At the end, use write_to_file tool with mode='a' to append "DONE and DUSTED" to signal completion
-
-WEEK-BY-WEEK PROCESS:
-1. **FIRST**: Call write_to_file(file_path='Inputs and Outputs/deep_course_content_output.txt', content='Course Content Generated by DeepCourseContentCreator Agent\\n\\n', mode='w') to initialize the file
-2. Identify the total number of weeks in the course
-3. Start with Week 1 (or next incomplete week) and complete it fully
-4. **After each week**: Call write_to_file(file_path='Inputs and Outputs/deep_course_content_output.txt', content=[week_content], mode='a') to append the week's content
-5. After each week, output a HALT marker to pause for ~10 seconds before continuing
-
-CONTENT STRUCTURE FOR EACH WEEK:
-=== PROCESSING WEEK [NUMBER] ===
+# Structure of one week's lesson, shared by the per-week agents and the single-agent loop
+WEEK_CONTENT_STRUCTURE = """=== PROCESSING WEEK [NUMBER] ===
 
 # Week [Number]: [Week Title] - From Real-World Problem to Solution
 
@@ -117,12 +108,68 @@ Briefly recap what was covered before and explain how it links to this week's to
 - Summarize key takeaways
 - Explain how this week's content sets up the next week's learning
 
-=== WEEK [NUMBER] COMPLETED ===
+=== WEEK [NUMBER] COMPLETED ==="""
+
+def create_deep_content_creator(planner_content: str, output_file_path: str,
+                                completed_weeks: Optional[List[int]] = None) -> LlmAgent:
+    """The single agent that writes every week in sequence into output_file_path.
+
+    completed_weeks (a resumed run) are already in the file: the agent appends the
+    remaining weeks instead of starting the file over.
+    """
+    if completed_weeks:
+        done = ", ".join(str(week) for week in completed_weeks)
+        file_start = (f"- '{output_file_path}' already holds week(s) {done} from an earlier run: "
+                      "NEVER overwrite it (no mode='w') and do not rewrite those weeks")
+        first_step = (f"**FIRST**: Do NOT initialize '{output_file_path}'; it already holds week(s) {done}. "
+                      "Continue with the first week not listed there")
+        summary_start = f"Continue '{output_file_path}' after week(s) {done}, appending only (mode='a')"
+    else:
+        file_start = ("- At the start of content generation, use write_to_file tool to create/overwrite the output "
+                      f"file: '{output_file_path}' with a course header")
+        first_step = (f"**FIRST**: Call write_to_file(file_path='{output_file_path}', content='Course Content "
+                      "Generated by DeepCourseContentCreator Agent\\n\\n', mode='w') to initialize the file")
+        summary_start = f"Start by calling write_to_file to create '{output_file_path}' with course header (mode='w')"
+    return LlmAgent(
+        name = "DeepCourseContentCreator",
+        model = model_for("deep_agent"),
+        tools = [write_to_file],  
+        description = "A deep content creator agent that generates extremely comprehensive and detailed course materials week-by-week and saves them to a file.",
+        instruction= f"""
+You are an Expert Deep Course Content Creator Agent with 20+ years of experience in educational design. 
+You transform basic course content into fully teachable, deeply elaborated week-by-week lessons.
+
+INPUT:
+You will be provided with the following course design specifications (from `plan_agent_output.txt`):
+{planner_content}
+
+YOUR MANDATE:
+- Teach using a real-world-problem-first approach
+- Each week should be a complete, stand-alone teaching unit
+- Always connect new weeks to the knowledge from previous weeks
+- Focus on rich explanations, not quizzes or flashcards
+- Use BOTH your LLM intelligence and the Google Search tool to gather, verify, and integrate the **most accurate, current, and outstanding course content possible**
+- **IMPORTANT: Save ALL generated content to a file using the write_to_file tool**
+
+FILE SAVING INSTRUCTIONS:
+{file_start}
+- After completing each week's content, use write_to_file tool with mode='a' to append that week's content to the file
+- At the end, use write_to_file tool with mode='a' to append "DONE and DUSTED" to signal completion
+
+WEEK-BY-WEEK PROCESS:
+1. {first_step}
+2. Identify the total number of weeks in the course
+3. Start with Week 1 (or next incomplete week) and complete it fully
+4. **After each week**: Call write_to_file(file_path='{output_file_path}', content=[week_content], mode='a') to append the week's content
+5. After each week, output a HALT marker to pause for ~10 seconds before continuing
+
+CONTENT STRUCTURE FOR EACH WEEK:
+{WEEK_CONTENT_STRUCTURE}
 
 <Halt/Pause for 4 seconds>
 
 WORKFLOW SUMMARY:
-1. Start by calling write_to_file to create 'Inputs and Outputs/deep_course_content_output.txt' with course header (mode='w')
+1. {summary_start}
 2. Generate each week's content fully using Google Search for enriched information
 3. After each week, call write_to_file with mode='a' to append that week's content to the file
 4. Continue until all weeks are complete
@@ -131,15 +178,124 @@ WORKFLOW SUMMARY:
 Begin every response with a heading saying "=== [DeepCourseContentCreator] ===
 
 Important: After all weeks are completed, use write_to_file to append "DONE and DUSTED" to the file to signal that the course content has been fully elaborated into week-by-week lessons.
+
+{{repair_note?}}
 """,
-    output_key="deep_content",
-)
+        output_key="deep_content",
+        **agent_callbacks("deep_agent"),
+    )
+
+class DeepContentQualityGate(BaseAgent):
+    """Validates the creator's output file after each loop iteration (no model call).
+
+    Escalates, ending the loop, once every week passes; otherwise leaves a
+    `repair_note` in the session state so the next iteration only rewrites the
+    failing weeks.
+    """
+
+    output_file: str
+    expected_weeks: Optional[int] = None
+
+    async def _run_async_impl(self, ctx):
+        try:
+            text = Path(self.output_file).read_text(encoding="utf-8")
+        except OSError:
+            text = ""
+        report = validate_course(text, self.expected_weeks)
+        print(f"🔎 Deep content check: {describe(report)}")
+        note = "" if report["ok"] else f"""REPAIR REQUEST (the previous pass failed the quality check):
+{describe(report)}
+- Do NOT re-initialize the file and do NOT rewrite weeks that are not listed above
+- Regenerate ONLY the listed weeks in full and append each with write_to_file(file_path='{self.output_file}', content=[week_content], mode='a')
+- Then append "DONE and DUSTED" again"""
+        yield Event(
+            author=self.name,
+            invocation_id=ctx.invocation_id,
+            actions=EventActions(escalate=report["ok"], state_delta={"repair_note": note}),
+        )
+
+def create_deep_content_loop(planner_content: str, workspace=None,
+                             completed_weeks: Optional[List[int]] = None) -> LoopAgent:
+    """Single-agent loop over all weeks, checked by the quality gate after each pass.
+
+    completed_weeks: weeks a resumed run already has in the output file (see
+    create_deep_content_creator).
+    """
+    output_file_path = get_output_file_path(workspace).replace("\\", "/")
+    quality_gate = DeepContentQualityGate(
+        name="DeepContentQualityGate",
+        description="Checks week count, required subsections and length of the generated content.",
+        output_file=output_file_path,
+        expected_weeks=get_duration_weeks(workspace),
+    )
+    return LoopAgent(
+        name="deepcontentloop",
+        sub_agents=[create_deep_content_creator(planner_content, output_file_path, completed_weeks), quality_gate],
+        description="A loop agent that refines and enhances the generated course content based on quality checks and saves output to file.",
+        max_iterations=3,
+    )
+
+def week_outline(plan_weeks: List[Tuple[int, str]]) -> str:
+    """One line per planned week (its section heading), so each week agent sees the whole arc."""
+    return "\n".join(f"- {text.splitlines()[0].strip('# *')}" for _, text in plan_weeks)
+
+def week_agent(week: int, week_plan: str, plan_overview: str, outline: str, repair_note: str = "") -> LlmAgent:
+    """Agent that writes the deep lesson for a single week of the plan.
+
+    Weeks are independent generations: the runner (deep_main) fans them out with
+    bounded concurrency and assembles the results in week order. outline is
+    week_outline() of the whole plan; repair_note lists what was wrong with a
+    rejected earlier draft of the week.
+    """
+    if repair_note:
+        repair_note = f"\nA PREVIOUS DRAFT OF THIS WEEK WAS REJECTED ({repair_note}). Make sure this one is complete.\n"
+    return LlmAgent(
+        name=f"DeepWeekCreator{week}",
+        model=model_for("deep_agent"),
+        tools=[google_search] if grounding_enabled("deep_agent") else [],
+        description=f"Generates the deeply elaborated lesson for week {week} of the course.",
+        instruction=f"""
+You are an Expert Deep Course Content Creator Agent with 20+ years of experience in educational design.
+You transform one week of a course plan into a fully teachable, deeply elaborated lesson.
+
+COURSE OVERVIEW (from `plan_agent_output.txt`):
+{plan_overview}
+
+ALL WEEKS OF THE COURSE:
+{outline}
+
+THE PLAN FOR WEEK {week} (the week you write):
+{week_plan}
+
+YOUR MANDATE:
+- Write ONLY week {week}; other weeks are written separately, in parallel
+- Teach using a real-world-problem-first approach
+- The week should be a complete, stand-alone teaching unit
+- Connect to the earlier weeks listed above and set up the next one
+- Focus on rich explanations, not quizzes or flashcards
+- Gather, verify, and integrate the **most accurate, current, and outstanding course content possible**
+
+{repair_note}
+OUTPUT: Reply with the complete week {week} lesson in exactly this structure (with [NUMBER] = {week}), and nothing else:
+{WEEK_CONTENT_STRUCTURE}
+""",
+        output_key=f"week_{week}_content",
+        **agent_callbacks("deep_agent"),
+    )
+
+def create_deep_agent(planner_content: str, workspace=None):
+    """All weeks at once as a ParallelAgent, or the single-agent loop for plans without week headings.
 
-deep_content_loop = LoopAgent(
-    name="deepcontentloop",
-    sub_agents=[deep_course_content_Creator],
-    description="A loop agent that refines and enhances the generated course content based on quality checks and saves output to file.",
-    max_iterations=3,
-)
+    deep_main runs the weeks with a bounded fan-out instead; this is the agent `adk web` shows.
+    """
+    plan_overview, plan_weeks, _ = course_weeks(planner_content)
+    if not plan_weeks:
+        return create_deep_content_loop(planner_content, workspace)
+    outline = week_outline(plan_weeks)
+    return ParallelAgent(
+        name="deepweeksparallel",
+        sub_agents=[week_agent(week, text, plan_overview, outline) for week, text in plan_weeks],
+        description="Generates every week of the course concurrently.",
+    )
 
-root_agent = deep_content_loop
\ No newline at end of file
+__getattr__ = lazy_root_agent(__name__, lambda workspace: create_deep_agent(read_planner_output(workspace), workspace))
\ No newline at end of file
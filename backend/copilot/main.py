@@ -1,31 +1,34 @@
-import asyncio, os, sys, uuid, inspect
+import asyncio, os, sys, inspect
 from pathlib import Path
 from datetime import datetime
 
+from google.adk.events import Event, EventActions
 from google.adk.runners import Runner
-from google.adk.sessions import InMemorySessionService
 from google.genai import types  # Content / Part
 from dotenv import load_dotenv
 
 # Make project root importable
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
-from knowledge.agent import courseplanneragent as final_pipeline  # your SequentialAgent (planner -> loop(content))
+from workspace import job_from_args, io_dir
+import telemetry
+import progress
+from adk_sessions import APP_NAME, USER_ID, get_session_service, get_state, open_session
+from plan_sections import add_to_weeks, split_plan_weeks
+# Agents are built per run from the job's inputs
+from knowledge.agent import create_course_planner_agent, module_resource_agent, read_planner_instruction
 
-APP_NAME = "AI Copilot for Instructors"
-EXPORT_DIR = "Inputs and Outputs"
+# Modules whose resources are curated at once; the host-wide rate limiter still bounds the Gemini calls
+PLANNER_RESOURCE_CONCURRENCY = int(os.getenv("PLANNER_RESOURCE_CONCURRENCY", "4"))
 
 def _nowstamp():
     return datetime.now().strftime("%Y%m%d-%H%M%S")
 
-def _out_dir() -> Path:
-    root = Path(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
-    p = root / EXPORT_DIR
-    p.mkdir(parents=True, exist_ok=True)
-    return p
+def _out_dir(workspace=None) -> Path:
+    return io_dir(workspace)
 
-def _write_txt(basename: str, text: str) -> Path:
-    path = _out_dir() / f"{basename}.txt"
+def _write_txt(basename: str, text: str, workspace=None) -> Path:
+    path = _out_dir(workspace) / f"{basename}.txt"
     path.write_text(text or "", encoding="utf-8")
     print(f"[OK] Saved: {path}")
     return path
@@ -43,45 +46,63 @@ def _extract_text(event) -> str:
                 return pt
     return ""
 
-async def run_knowledge_and_save(prompt: str):
-    # Ensure GEMINI_API_KEY loaded from project root .env
-    project_root = Path(__file__).resolve().parents[1]
-    load_dotenv(dotenv_path=project_root / ".env", override=False)
-    if not os.getenv("GEMINI_API_KEY"):
-        # Try alternative environment variable names
-        if os.getenv("GOOGLE_API_KEY"):
-            os.environ["GEMINI_API_KEY"] = os.getenv("GOOGLE_API_KEY")
-        else:
-            print("WARNING: GEMINI_API_KEY not found. Agent may not function properly.")
-            return
-    
-    # Check for no-server mode to prevent port conflicts
-    if os.getenv("NO_SERVER") == "1" or os.getenv("DISABLE_SERVICES") == "1":
-        print("Running in no-server mode - disabling any potential service bindings")
-
-    # 1) DB-free session
-    session_service = InMemorySessionService()
-    user_id = "user-local"
-    session_id = f"session-{uuid.uuid4()}"
-    created = session_service.create_session(app_name=APP_NAME, user_id=user_id, session_id=session_id)
-    if inspect.isawaitable(created):
-        await created  # some builds expose async create
-
-    # 2) Prepare message (GenAI format)
-    user_msg = types.Content(role="user", parts=[types.Part.from_text(text=prompt)])
-
-    # 3) Runner (SequentialAgent executes sub-agents in order) 
-    #    (Sequential/Loop agent semantics in ADK docs)
-    runner = Runner(agent=final_pipeline, app_name=APP_NAME, session_service=session_service)
-
-    print("\n=== Running Knowledge Pipeline (Planner -> Content) ===")
+async def _curate_module(session_service, module: int, module_plan: str, overview: str, planner_content: str,
+                         workspace=None) -> str:
+    """Run one module's resource agent in its own session and return its resources section."""
+    session_id, _ = await open_session(session_service, f"planner_agent_resources{module}", workspace, resume=False)
+    runner = Runner(agent=module_resource_agent(module, module_plan, overview, planner_content), app_name=APP_NAME,
+                    session_service=session_service)
+    user_msg = types.Content(role="user", parts=[types.Part.from_text(
+        text=f"Curate the resources for module {module}.")])
+    texts = []
+    async for event in runner.run_async(user_id=USER_ID, session_id=session_id, new_message=user_msg):
+        txt = _extract_text(event)
+        if txt:
+            texts.append(txt)
+    sess = session_service.get_session(app_name=APP_NAME, user_id=USER_ID, session_id=session_id)
+    if inspect.isawaitable(sess):
+        sess = await sess
+    state = getattr(sess, "state", {}) or {}
+    return (state.get(f"module_{module}_resources") or (texts[-1] if texts else "")).strip()
+
+async def add_module_resources(session_service, plan_txt: str, planner_content: str, workspace=None) -> str:
+    """Curate every module's resources concurrently (bounded) and merge them into the plan.
+
+    A module whose curation fails keeps its section without resources.
+    """
+    overview, modules = split_plan_weeks(plan_txt)
+    if not modules:
+        # No module headings to split on: curate for the course as a whole
+        overview, modules = "", [(1, plan_txt)]
+    semaphore = asyncio.Semaphore(max(1, PLANNER_RESOURCE_CONCURRENCY))
+    print(f"\n=== Curating resources for {len(modules)} modules (up to {PLANNER_RESOURCE_CONCURRENCY} at once) ===")
+
+    async def curate(module: int, module_plan: str) -> str:
+        async with semaphore:
+            resources = await _curate_module(session_service, module, module_plan, overview, planner_content, workspace)
+        progress.emit("module_resources_completed", workspace, module=module)
+        print(f"✅ Module {module} resources curated ({len(resources)} characters)")
+        return resources
+
+    results = await asyncio.gather(*(curate(module, text) for module, text in modules), return_exceptions=True)
+    additions = {}
+    for (module, _), result in zip(modules, results):
+        if isinstance(result, BaseException):
+            print(f"⚠️ Resources for module {module} failed: {result}")
+        elif result:
+            additions[module] = result
+    return add_to_weeks(plan_txt, additions, fallback_heading="Course Resources")
+
+async def run_planner(runner, user_msg, session_service, session_id: str, workspace=None) -> str:
+    """Run the planner agent and return the plan skeleton ("" if it only left unlabelled output)."""
+    print("\n=== Running Knowledge Pipeline (Plan skeleton -> Module resources) ===")
     # Stream buckets as a fallback if session.state isn't filled
     stream_bucket = {
         "CoursePlannerAgent": [],
         "Other": []
     }
 
-    async for event in runner.run_async(user_id=user_id, session_id=session_id, new_message=user_msg):
+    async for event in runner.run_async(user_id=USER_ID, session_id=session_id, new_message=user_msg):
         if getattr(event, "type", "") == "agent_reply" or hasattr(event, "is_final_response"):
             txt = _extract_text(event)
             # Try to detect source agent
@@ -93,10 +114,7 @@ async def run_knowledge_and_save(prompt: str):
             else:
                 stream_bucket["Other"].append(txt)
 
-    sess = session_service.get_session(app_name=APP_NAME, user_id=user_id, session_id=session_id)
-    if inspect.isawaitable(sess):
-        sess = await sess
-    state = getattr(sess, "state", {}) or {}
+    state = await get_state(session_service, session_id)
     plan_txt = state.get("course_plan", "").strip()     # from CoursePlannerAgent
 
     if not plan_txt:
@@ -108,16 +126,79 @@ async def run_knowledge_and_save(prompt: str):
         combined = "\n\n".join(stream_bucket["Other"]).strip()
         if not combined:
             raise RuntimeError("No output captured from planner agent. Ensure output_key is set and agent replies.")
-        _write_txt("plan_agent_output", combined)
+        _write_txt("plan_agent_output", combined, workspace)
+    return plan_txt
+
+async def run_knowledge_and_save(prompt: str, workspace=None):
+    # Ensure GEMINI_API_KEY loaded from project root .env
+    project_root = Path(__file__).resolve().parents[1]
+    load_dotenv(dotenv_path=project_root / ".env", override=False)
+    if not os.getenv("GEMINI_API_KEY"):
+        # Try alternative environment variable names
+        if os.getenv("GOOGLE_API_KEY"):
+            os.environ["GEMINI_API_KEY"] = os.getenv("GOOGLE_API_KEY")
+        else:
+            print("WARNING: GEMINI_API_KEY not found. Agent may not function properly.")
+            return
+    
+    # Check for no-server mode to prevent port conflicts
+    if os.getenv("NO_SERVER") == "1" or os.getenv("DISABLE_SERVICES") == "1":
+        print("Running in no-server mode - disabling any potential service bindings")
+
+    # 1) Session persisted in the workspace's SQLite store, keyed by job and stage;
+    #    a resumed run reuses the plan its earlier run already left in the state
+    session_service = get_session_service(workspace)
+    user_id = USER_ID
+    session_id, resumed = await open_session(session_service, "planner_agent", workspace)
+    state = await get_state(session_service, session_id) if resumed else {}
+    plan_txt = (state.get("course_plan") or "").strip()
+    if plan_txt and state.get("module_resources_added"):
+        print("⏩ Course plan and module resources already in the resumed session")
+        _write_txt("plan_agent_output", plan_txt, workspace)
         return
 
+    # 2) Prepare message (GenAI format)
+    user_msg = types.Content(role="user", parts=[types.Part.from_text(text=prompt)])
+
+    # 3) Runner (SequentialAgent executes sub-agents in order) 
+    #    (Sequential/Loop agent semantics in ADK docs)
+    planner_content = read_planner_instruction(workspace)
+    planner_agent = create_course_planner_agent(planner_content)
+    runner = Runner(agent=planner_agent, app_name=APP_NAME, session_service=session_service)
+
     if plan_txt:
-        _write_txt("plan_agent_output", plan_txt)
+        print("⏩ Plan skeleton already in the resumed session; skipping the planner")
+    else:
+        plan_txt = await run_planner(runner, user_msg, session_service, session_id, workspace)
+        if not plan_txt:
+            return
 
-async def main_async():
+    # The planner wrote the plan skeleton; resource curation fans out per module
+    plan_txt = await add_module_resources(session_service, plan_txt, planner_content, workspace)
+    # Later stages read the merged plan from the planner's session state; the flag
+    # lets a resumed run skip both steps
+    try:
+        sess = session_service.get_session(app_name=APP_NAME, user_id=user_id, session_id=session_id)
+        if inspect.isawaitable(sess):
+            sess = await sess
+        appended = session_service.append_event(sess, Event(
+            author=planner_agent.name,
+            actions=EventActions(state_delta={"course_plan": plan_txt, "module_resources_added": True})))
+        if inspect.isawaitable(appended):
+            await appended
+    except Exception as e:
+        print(f"⚠️ Could not store the merged plan in the session state: {e}")
+    _write_txt("plan_agent_output", plan_txt, workspace)
+
+async def main_async(workspace=None):
     # You can tailor this to your exact expected input contract for the planner
     prompt = "Generate the course plan."
-    await run_knowledge_and_save(prompt)
+    try:
+        await run_knowledge_and_save(prompt, workspace)
+    finally:
+        # Per-call records are in the job's llm_calls.jsonl (recorded by the agent's model callbacks)
+        telemetry.print_summary("Planner agent LLM calls")
 
 if __name__ == "__main__":
-    asyncio.run(main_async())
+    with job_from_args() as workspace:
+        asyncio.run(main_async(workspace))
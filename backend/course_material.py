@@ -12,22 +12,26 @@ from reportlab.lib.units import inch
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_JUSTIFY
 
+from workspace import job_from_args, io_dir, agent_files_dir, curriculum_path, load_config
+import progress
+
 # Import LLM helpers
 try:
-    from llm import get_gemini_client, get_google_search_tool, generate_course_content, system_prompt
+    from llm import get_gemini_client, get_google_search_tool, generate_course_content, system_prompt, GEMINI_STREAMING
 except Exception:
     # Allow running without LLM for fallback
     get_gemini_client = None
     get_google_search_tool = None
     generate_course_content = None
     system_prompt = None
+    GEMINI_STREAMING = False
 
-def read_all_text_files():
-    """Read all text files from the Inputs and Outputs directory"""
+def read_all_text_files(workspace=None):
+    """Read all text files from the workspace's Inputs and Outputs directory"""
     text_files_content = {}
     
-    # Read from home directory "Inputs and Outputs"
-    home_dir_path = pathlib.Path("Inputs and Outputs")
+    # Read from the workspace's "Inputs and Outputs"
+    home_dir_path = io_dir(workspace)
     
     if not home_dir_path.exists():
         return text_files_content
@@ -41,8 +45,8 @@ def read_all_text_files():
         except Exception as e:
             pass
     
-    # Also check copilot subdirectory
-    copilot_dir_path = pathlib.Path("copilot/Inputs and Outputs")
+    # Also check the deep content agent's own copy
+    copilot_dir_path = agent_files_dir(workspace)
     if copilot_dir_path.exists():
         for txt_file in copilot_dir_path.glob("*.txt"):
             try:
@@ -501,8 +505,12 @@ def create_combined_pdf(content, course_title, output_dir):
         return None
 
 # Update the LLM prompt to ensure proper structure ordering
-def build_structured_text_llm(raw_corpus: str, planner_text: str, title_hint: str | None) -> str | None:
-    """Use LLM to produce strict structured text with required layout."""
+def build_structured_text_llm(raw_corpus: str, planner_text: str, title_hint: str | None, workspace=None, stream_to: str | None = None) -> str | None:
+    """Use LLM to produce strict structured text with required layout.
+
+    With stream_to, the text is written to that file as it is generated and a
+    progress event is emitted as each week's section completes.
+    """
     if not (get_gemini_client and get_google_search_tool and generate_course_content and system_prompt):
         return None
     client = get_gemini_client()
@@ -637,9 +645,13 @@ def build_structured_text_llm(raw_corpus: str, planner_text: str, title_hint: st
             difficulty_level="",
             google_search_tool=tool,
             system_prompt=system_prompt,
-            filepath=pathlib.Path("Inputs and Outputs/curriculum.pdf"),
+            filepath=curriculum_path(workspace),
             course_content=course_content,
             task=task,
+            stream_to=stream_to,
+            on_week=(lambda week: progress.emit("week_streamed", workspace, week=week)) if stream_to else None,
+            model_task="course_material",
+            workspace=workspace,
         )
         return response.text
     except Exception:
@@ -671,30 +683,31 @@ def write_structured_txt(structured_text: str, course_name: str, output_dir: str
     except Exception:
         return None
 
-def get_duration_weeks():
-    """Read `user_config.json` and return the number of weeks as int if available."""
+def get_duration_weeks(workspace=None):
+    """Read the workspace's `user_config.json` and return the number of weeks as int if available."""
     try:
-        with open('user_config.json', 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        duration = data.get('duration', '')
+        data = load_config(workspace) or {}
+        # The API stores the number of weeks as an int, the CLI config as e.g. "8 weeks"
+        duration = str(data.get('duration', '')).strip()
         match = re.search(r'(\d+)\s*week', duration, re.IGNORECASE)
         if match:
             return int(match.group(1))
+        if duration.isdigit():
+            return int(duration)
     except Exception:
         pass
     return None
 
-def should_only_list_weeks(content: str) -> bool:
+def should_only_list_weeks(content: str, workspace=None) -> bool:
     """Return True if there are no explicit week sections in content and we have a duration."""
     has_week_sections = re.search(r'#\s*Week\s*\d+\s*[:\-]?', content or '', re.IGNORECASE) is not None
-    duration_weeks = get_duration_weeks()
+    duration_weeks = get_duration_weeks(workspace)
     return (not has_week_sections) and bool(duration_weeks and duration_weeks > 0)
 
-def get_subject_from_config() -> str | None:
-    """Return a sanitized subject string from user_config.json if available."""
+def get_subject_from_config(workspace=None) -> str | None:
+    """Return a sanitized subject string from the workspace's user_config.json if available."""
     try:
-        with open('user_config.json', 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        data = load_config(workspace) or {}
         # Possible keys to look for
         raw = data.get('subject') or data.get('course_subject') or data.get('course_name')
         if raw and isinstance(raw, str):
@@ -708,10 +721,10 @@ def get_subject_from_config() -> str | None:
         pass
     return None
 
-def main():
+def main(workspace=None):
     """Main function to generate combined course materials"""
     # Read all text files
-    text_files = read_all_text_files()
+    text_files = read_all_text_files(workspace)
     
     # Combine all content
     combined_content = ""
@@ -756,7 +769,7 @@ def main():
     combined_content = '\n'.join(cleaned_lines)
     
     # Read planner agent instruction for title and as LLM input
-    planner_path = pathlib.Path("Inputs and Outputs/planner_agent_instruction.txt")
+    planner_path = io_dir(workspace) / "planner_agent_instruction.txt"
     planner_text = ""
     if planner_path.exists():
         try:
@@ -768,14 +781,14 @@ def main():
     course_title = extract_title_from_planner(planner_text) or extract_course_name_from_content(planner_text or combined_content)
     # If still generic, try config subject
     if not course_title or course_title == 'course_material':
-        subject = get_subject_from_config()
+        subject = get_subject_from_config(workspace)
         if subject:
             course_title = subject.replace('_', ' ').title()
         else:
             course_title = "Course"
     
     # Create output directory named "course material" inside "Inputs and Outputs"
-    output_dir = os.path.join("Inputs and Outputs", "course material")
+    output_dir = os.path.join(io_dir(workspace), "course material")
     
     try:
         os.makedirs(output_dir, exist_ok=True)
@@ -784,7 +797,9 @@ def main():
         return
     
     # Build structured TXT via LLM first; fallback to simple assembly if needed
-    structured_text = build_structured_text_llm(combined_content, planner_text, course_title)
+    # Stream into the final TXT so completed weeks are on disk while later ones generate
+    stream_to = os.path.join(output_dir, f"{sanitize_filename(course_title)}.txt") if GEMINI_STREAMING else None
+    structured_text = build_structured_text_llm(combined_content, planner_text, course_title, workspace, stream_to=stream_to)
     if not structured_text:
         # Minimal fallback ensuring required headers exist
         lines = [f"# Course Name: {course_title}", "", "## Course Overview", "", "## Weekly Summary", "- Week 1", "", "# Week 1: Introduction", "Content TBD"]
@@ -800,8 +815,10 @@ def main():
         print("Course materials created successfully!")
         base = sanitize_filename(course_title)
         print(f"Files created: {base}.txt, {base}.docx and {base}.pdf")
+        progress.emit("artifact_completed", workspace, kind="course_material", index=1, total=1, path=pdf_path)
     else:
         print("Error creating course materials")
 
 if __name__ == "__main__":
-    main()
+    with job_from_args() as workspace:
+        main(workspace)
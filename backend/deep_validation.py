@@ -0,0 +1,127 @@
+"""Cheap local quality checks for the deep agent's week-by-week course content.
+
+No model call: the course text is split on its `# Week N:` headings and each
+week is checked for the subsections the lesson template requires and for a
+minimum length, and the weeks found are counted against the configured course
+duration. The deep stage uses the report to stop as soon as the content
+passes and to regenerate only the weeks that are missing or too thin, and
+week_block() to write each checked week into the stage artifact as it goes.
+Files are read one week at a time (week_spans / read_week), so checking a
+long course does not hold all of it in memory.
+"""
+import os
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+DEEP_MIN_WEEK_CHARS = int(os.getenv("DEEP_MIN_WEEK_CHARS", "2500"))
+# Extra generation rounds for weeks that fail validation
+DEEP_REPAIR_ROUNDS = int(os.getenv("DEEP_REPAIR_ROUNDS", "2"))
+
+WEEK_HEADING_RE = re.compile(r"^#\s*Week\s+(\d+)\s*[:\-]", re.IGNORECASE | re.MULTILINE)
+# Progress markers and the completion sentinel around each week in the agent's file
+MARKER_LINE_RE = re.compile(r"^\s*(?:=== (?:PROCESSING WEEK \d+|WEEK \d+ COMPLETED) ===|DONE and DUSTED)\s*$",
+                            re.MULTILINE)
+
+# Subsections of the lesson template that every week must have (the recap and
+# case studies are optional in the template)
+REQUIRED_SUBSECTIONS = (
+    "The Real-World Problem",
+    "Introducing the Topic as the Solution",
+    "Deep Explanation",
+    "Practical Examples",
+    "Looking Ahead",
+)
+
+
+def split_weeks(text: str) -> Dict[int, str]:
+    """Week number -> section text, from each `# Week N:` heading to the next.
+
+    A week that appears again later (e.g. a repaired week appended to the file)
+    replaces the earlier version.
+    """
+    matches = list(WEEK_HEADING_RE.finditer(text or ""))
+    weeks = {}
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        weeks[int(match.group(1))] = text[match.start():end].strip()
+    return weeks
+
+
+def week_spans(path: Path) -> Dict[int, Tuple[int, int]]:
+    """Week number -> (start, end) byte offsets of its section in a course file.
+
+    Like split_weeks(), a week that appears again later replaces the earlier version.
+    """
+    spans: Dict[int, Tuple[int, int]] = {}
+    current, start = None, 0
+    with open(path, "rb") as f:
+        while True:
+            offset = f.tell()
+            line = f.readline()
+            match = WEEK_HEADING_RE.match(line.decode("utf-8", errors="replace")) if line else None
+            if match or not line:
+                if current is not None:
+                    spans[current] = (start, offset)
+                if not line:
+                    return spans
+                current, start = int(match.group(1)), offset
+
+
+def read_week(path: Path, span: Tuple[int, int]) -> str:
+    """The section at span (from week_spans) of a course file."""
+    with open(path, "rb") as f:
+        f.seek(span[0])
+        return f.read(span[1] - span[0]).decode("utf-8", errors="replace").strip()
+
+
+def week_block(week: int, section: str) -> str:
+    """One checked week as the stage artifact holds it, between fresh progress markers."""
+    body = MARKER_LINE_RE.sub("", section).strip()
+    return f"=== PROCESSING WEEK {week} ===\n\n{body}\n\n=== WEEK {week} COMPLETED ===\n\n"
+
+
+def check_week(text: str) -> List[str]:
+    """Problems with one week's section (empty when it passes)."""
+    problems = []
+    missing = [name for name in REQUIRED_SUBSECTIONS
+               if not re.search(rf"^#+\s*{re.escape(name)}", text, re.IGNORECASE | re.MULTILINE)]
+    if missing:
+        problems.append("missing subsections: " + ", ".join(missing))
+    if len(text) < DEEP_MIN_WEEK_CHARS:
+        problems.append(f"too short ({len(text)} < {DEEP_MIN_WEEK_CHARS} characters)")
+    return problems
+
+
+def make_report(week_problems: Dict[int, List[str]], expected_weeks: Optional[int] = None) -> Dict:
+    """Report over weeks 1..expected_weeks (or up to the last week found) from each
+    found week's check_week() problems.
+
+    Returns {"ok", "expected_weeks", "found_weeks", "issues": {week: [problems]}}.
+    """
+    expected = expected_weeks or (max(week_problems) if week_problems else 0)
+    issues = {}
+    for week in range(1, expected + 1):
+        problems = week_problems[week] if week in week_problems else ["missing"]
+        if problems:
+            issues[week] = problems
+    return {
+        "ok": expected > 0 and not issues,
+        "expected_weeks": expected,
+        "found_weeks": sorted(week_problems),
+        "issues": issues,
+    }
+
+
+def validate_course(text: str, expected_weeks: Optional[int] = None) -> Dict:
+    """Check weeks 1..expected_weeks (or up to the last week found) of the course text."""
+    return make_report({week: check_week(section) for week, section in split_weeks(text).items()}, expected_weeks)
+
+
+def describe(report: Dict) -> str:
+    """One line per failing week, for logs and repair prompts."""
+    if report["ok"]:
+        return f"All {report['expected_weeks']} weeks pass"
+    if not report["expected_weeks"]:
+        return "No week sections found"
+    return "\n".join(f"Week {week}: {'; '.join(problems)}" for week, problems in sorted(report["issues"].items()))
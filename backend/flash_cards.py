@@ -1,22 +1,30 @@
 import os
-import pathlib
-import re
+import asyncio
 from PIL import Image, ImageDraw, ImageFont
 from google import genai
-from google.genai import types
 from dotenv import load_dotenv
-from llm import generate_course_content, load_user_inputs
-import json
+from llm import generate_course_content_async, get_gemini_client, load_user_inputs
+from retrieval import build_course_index, format_chunks
+from schemas import FLASHCARDS_SCHEMA, parse_flashcards
+from pydantic import ValidationError
+from workspace import job_from_args, io_dir
+import progress
 import textwrap
 
 load_dotenv()
 
-def read_course_content_files():
+# Flashcards are generated in batches of weeks, each from only that batch's most relevant course chunks
+FLASHCARD_TARGET = int(os.getenv("FLASHCARD_TARGET", "18"))
+FLASHCARD_WEEKS_PER_BATCH = int(os.getenv("FLASHCARD_WEEKS_PER_BATCH", "3"))
+FLASHCARD_CHUNKS_PER_WEEK = int(os.getenv("FLASHCARD_CHUNKS_PER_WEEK", "3"))
+FLASHCARD_QUERY = "definition concept key terms algorithm process steps example comparison difference advantages disadvantages"
+
+def read_course_content_files(workspace=None):
     planner_content = ""
     deep_content = ""
     
-    # Read from home directory "Inputs and Outputs"
-    home_dir_path = pathlib.Path("Inputs and Outputs")
+    # Read from the workspace's "Inputs and Outputs"
+    home_dir_path = io_dir(workspace)
     
     # Try to read planner agent instruction (directly in Inputs and Outputs)
     planner_file = home_dir_path / "planner_agent_instruction.txt"
@@ -177,89 +185,75 @@ Each flashcard must:
 
 ## 🚀 OUTPUT FORMAT
 
-Provide your response as a valid JSON array containing exactly 15-20 flashcard objects:
-
-```json
-[
-  {{
-    "id": 1,
-    "week": "Week 1",
-    "topic": "AI Basics",
-    "question": "What does AI stand for?",
-    "answer": "Artificial Intelligence - systems that perform tasks requiring human intelligence.",
-    "difficulty": "easy",
-    "tags": ["AI", "definition", "basics"]
-  }},
-  // ... continue for all flashcards
-]
-```
-
-Begin your analysis with: "=== FLASHCARD CONTENT ANALYSIS ==="
-Then provide your comprehensive analysis followed by the complete JSON array of flashcards."""
+Respond with only a JSON array of flashcard objects in the format above: as many as the task asks for, or 15-20 if it does not say.
+The response is checked against a schema, so do not add analysis, comments or text outside the array."""
 
     return system_prompt
 
-def generate_flashcard_content(client, google_search_tool, system_prompt, combined_content, user_config):
-    """Generate flashcard content using LLM"""
-    
-    task = """
+def plan_flashcard_batches(index):
+    """Split the course weeks into batches, each with its card count and retrieved course context."""
+    weeks = index.weeks
+    if not weeks:
+        return [{"label": "the whole course", "count": FLASHCARD_TARGET,
+                 "context": format_chunks(index.search(FLASHCARD_QUERY))}]
+    batches = []
+    for start in range(0, len(weeks), FLASHCARD_WEEKS_PER_BATCH):
+        group = weeks[start:start + FLASHCARD_WEEKS_PER_BATCH]
+        label = f"Week {group[0]}" if len(group) == 1 else f"Weeks {group[0]}-{group[-1]}"
+        batches.append({
+            "label": label,
+            "count": max(2, round(FLASHCARD_TARGET * len(group) / len(weeks))),
+            "context": format_chunks(index.search_per_week(FLASHCARD_QUERY, FLASHCARD_CHUNKS_PER_WEEK, weeks=group)),
+        })
+    return batches
+
+
+async def generate_flashcard_batch(client, google_search_tool, system_prompt, batch, user_config, workspace=None):
+    """Generate one batch of flashcards from its retrieved course context"""
+    
+    task = f"""
 GENERATE FLASHCARD CONTENT:
 
-Create 15-20 high-quality flashcards covering all weeks of the course content.
+Create exactly {batch['count']} high-quality flashcards covering {batch['label']} of the course content below.
 Focus on the most important concepts, definitions, algorithms, and applications.
-Ensure proper distribution across all weeks and topics.
+Ensure proper distribution across the weeks and topics of {batch['label']}.
 
 Output the result as a valid JSON array of flashcard objects.
 """
     
-    print("🔄 Generating flashcard content...")
+    print(f"🔄 Generating {batch['count']} flashcards for {batch['label']} ({len(batch['context'])} characters of course content)...")
     
     try:
-        response = generate_course_content(
+        response = await generate_course_content_async(
             client=client,
             teaching_style=user_config.get('teaching_style', 'Project-Based / Hands-On'),
             duration=user_config.get('duration', '6 weeks'),
             difficulty_level=user_config.get('difficulty_level', 'intermediate'),
             google_search_tool=google_search_tool,
             system_prompt=system_prompt,
-            course_content=combined_content,
-            task=task
+            course_content=batch['context'],
+            task=task,
+            response_schema=FLASHCARDS_SCHEMA,
+            model_task="flashcards",
+            workspace=workspace,
         )
         
-        if not response or not hasattr(response, 'text') or not response.text:
-            print("❌ No response received from LLM")
+        if not response:
+            print(f"❌ No response received from LLM for {batch['label']}")
             return None
-        
-        # Extract JSON from the response
-        response_text = response.text
-        print(f"✅ Received response ({len(response_text)} characters)")
-        
-        # Try to find JSON array in the response
-        json_match = re.search(r'\[.*\]', response_text, re.DOTALL)
-        if json_match:
-            json_str = json_match.group(0)
-            try:
-                flashcards = json.loads(json_str)
-                print(f"✅ Successfully parsed {len(flashcards)} flashcards")
-                return flashcards
-            except json.JSONDecodeError as e:
-                print(f"❌ JSON parsing error: {e}")
-                # Try to clean up the JSON
-                json_str = json_str.replace('// ... continue for all flashcards', '')
-                json_str = re.sub(r'//.*?\n', '', json_str)  # Remove comments
-                try:
-                    flashcards = json.loads(json_str)
-                    print(f"✅ Successfully parsed {len(flashcards)} flashcards after cleanup")
-                    return flashcards
-                except json.JSONDecodeError:
-                    print("❌ Could not parse JSON even after cleanup")
-                    return None
-        else:
-            print("❌ No JSON array found in response")
+
+        # The response is constrained to FLASHCARDS_SCHEMA; validate it into typed cards
+        try:
+            cards = parse_flashcards(response)
+        except ValidationError as e:
+            print(f"❌ Flashcard response for {batch['label']} did not match the schema: {e}")
             return None
-        
+        flashcards = [card.model_dump() for card in cards]
+        print(f"✅ Successfully parsed {len(flashcards)} flashcards for {batch['label']}")
+        return flashcards
+
     except Exception as e:
-        print(f"❌ Error generating flashcards: {e}")
+        print(f"❌ Error generating flashcards for {batch['label']}: {e}")
         return None
 
 def get_font_path():
@@ -448,14 +442,14 @@ def create_flashcard_summary(flashcards, output_dir):
         print(f"❌ Error creating summary: {e}")
         return None
 
-def generate_flashcards():
+def generate_flashcards(workspace=None):
     """Main function to generate flashcards"""
     
     print("📚 Starting Flashcard Generation Process...")
     print("=" * 60)
     
     # Load user configuration
-    user_config = load_user_inputs()
+    user_config = load_user_inputs(workspace)
     if not user_config:
         print("❌ No user configuration found. Please run the main application first.")
         return
@@ -465,25 +459,18 @@ def generate_flashcards():
     
     # Read course content
     print("\n📖 Reading course content files...")
-    planner_content, deep_content = read_course_content_files()
+    planner_content, deep_content = read_course_content_files(workspace)
     
     if not planner_content and not deep_content:
         print("❌ No course content found. Please ensure content files exist.")
         return
     
-    # Create combined content
-    combined_content = f"""
-=== COURSE PLAN CONTENT ===
-{planner_content}
-
-=== DETAILED COURSE CONTENT ===
-{deep_content}
-"""
-    
-    print(f"✅ Combined content length: {len(combined_content)} characters")
+    # Index the course text so each batch of weeks only sends its own relevant chunks
+    index = build_course_index(("plan", planner_content), ("course", deep_content))
+    batches = plan_flashcard_batches(index)
     
     # Initialize LLM client
-    client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+    client = get_gemini_client()
     
     # Configure Google Search tool
     google_search_tool = genai.types.Tool(
@@ -493,15 +480,26 @@ def generate_flashcards():
     # Create system prompt
     system_prompt = create_flashcard_system_prompt(difficulty_level)
     
-    # Generate flashcard content
-    print("\n🧠 Generating flashcard content with AI...")
-    flashcards = generate_flashcard_content(
-        client=client,
-        google_search_tool=google_search_tool,
-        system_prompt=system_prompt,
-        combined_content=combined_content,
-        user_config=user_config
-    )
+    # Generate flashcard content, all batches concurrently (bounded by GEMINI_MAX_CONCURRENCY)
+    print(f"\n🧠 Generating flashcard content with AI in {len(batches)} batch(es)...")
+
+    async def generate_all():
+        return await asyncio.gather(*[
+            generate_flashcard_batch(
+                client=client,
+                google_search_tool=google_search_tool,
+                system_prompt=system_prompt,
+                batch=batch,
+                user_config=user_config,
+                workspace=workspace,
+            )
+            for batch in batches
+        ])
+
+    flashcards = [card for cards in asyncio.run(generate_all()) if cards for card in cards]
+    # Batches number their cards independently
+    for i, card in enumerate(flashcards, 1):
+        card['id'] = i
     
     if not flashcards:
         print("❌ Failed to generate flashcard content")
@@ -517,7 +515,7 @@ def generate_flashcards():
     print(f"✅ Processing {len(flashcards)} flashcards")
     
     # Create output directory under Inputs and Outputs
-    output_dir = os.path.join("Inputs and Outputs", "flashcards")
+    output_dir = os.path.join(io_dir(workspace), "flashcards")
     os.makedirs(output_dir, exist_ok=True)
     print(f"📁 Created flashcards output directory: {output_dir}")
     
@@ -529,6 +527,8 @@ def generate_flashcards():
         front_path, back_path = create_flashcard_image(flashcard, output_dir, i)
         if front_path and back_path:
             created_files.extend([front_path, back_path])
+            progress.emit("artifact_completed", workspace, kind="flashcard", index=i,
+                          total=len(flashcards), path=front_path)
     
     # Create summary
     summary_path = create_flashcard_summary(flashcards, output_dir)
@@ -562,7 +562,7 @@ def generate_flashcards():
         print("❌ No flashcards were created successfully.")
         return None
 
-def main():
+def main(workspace=None):
     """Run the flashcard generation process"""
     try:
         # Check if required packages are installed
@@ -574,7 +574,7 @@ def main():
             os.system("pip install Pillow")
             from PIL import Image, ImageDraw, ImageFont
             
-        generated_flashcards = generate_flashcards()
+        generated_flashcards = generate_flashcards(workspace)
         
         if generated_flashcards:
             print("\n🎉 Flashcard generation completed successfully!")
@@ -591,4 +591,5 @@ def main():
         print("   pip install Pillow")
 
 if __name__ == "__main__":
-    main()
+    with job_from_args() as workspace:
+        main(workspace)
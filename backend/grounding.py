@@ -0,0 +1,153 @@
+"""Per-task Google Search grounding and a cache of grounding results by topic.
+
+Grounding adds search round-trips to a call, so it is only on for tasks that
+need fresh web sources (the course plan and course material); quizzes,
+flashcards and slide outlines are built from already-generated course text.
+Override with GEMINI_GROUNDING ("task=on,task=off" pairs) or
+GEMINI_GROUNDING_<TASK>=1/0.
+
+A grounded response's grounding_metadata (search queries and source URLs) is
+kept host-wide under GROUNDING_CACHE_DIR, keyed by the course topic. Later
+grounded calls on the same topic, from any stage or job, get those sources in
+their prompt and skip the search tool until the entry is older than
+GROUNDING_CACHE_TTL_HOURS.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from workspace import BACKEND_DIR, load_config
+
+GROUNDING_CACHE = os.getenv("GROUNDING_CACHE", "1").lower() not in ("0", "false", "no")
+GROUNDING_CACHE_DIR = Path(os.getenv("GROUNDING_CACHE_DIR", BACKEND_DIR / ".grounding_cache"))
+GROUNDING_CACHE_TTL_HOURS = float(os.getenv("GROUNDING_CACHE_TTL_HOURS", "168"))
+GROUNDING_MAX_SOURCES = int(os.getenv("GROUNDING_MAX_SOURCES", "40"))
+
+DEFAULT_GROUNDING: Dict[str, bool] = {
+    "course_plan": True,
+    "planner_agent": True,
+    "deep_agent": False,
+    "course_material": True,
+    "quizzes": False,
+    "flashcards": False,
+    "slide_outline": False,
+}
+
+_lock = threading.Lock()
+
+
+def _flag(value: str) -> bool:
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def grounding_enabled(task: Optional[str]) -> bool:
+    """Whether calls for task should carry the Google Search tool."""
+    task = task or "default"
+    enabled = DEFAULT_GROUNDING.get(task, True)
+    for pair in os.getenv("GEMINI_GROUNDING", "").split(","):
+        name, _, value = pair.partition("=")
+        if name.strip() == task and value.strip():
+            enabled = _flag(value)
+    override = os.getenv(f"GEMINI_GROUNDING_{task.upper()}")
+    if override:
+        enabled = _flag(override)
+    return enabled
+
+
+def topic_for(workspace=None) -> Optional[str]:
+    """Normalized course topic from the workspace's user_config.json, or None if unknown."""
+    config = load_config(workspace) or {}
+    raw = (config.get("course_topic") or config.get("subject") or config.get("course_subject")
+           or config.get("course_name") or "")
+    topic = re.sub(r"\s+", " ", str(raw)).strip().lower()
+    return topic or None
+
+
+def _entry_path(topic: str) -> Path:
+    return GROUNDING_CACHE_DIR / f"{hashlib.sha256(topic.encode('utf-8')).hexdigest()[:32]}.json"
+
+
+def extract(response) -> Optional[Dict]:
+    """Search queries and web sources from a response's grounding_metadata, or None."""
+    queries, sources = [], []
+    for candidate in getattr(response, "candidates", None) or []:
+        metadata = getattr(candidate, "grounding_metadata", None)
+        if not metadata:
+            continue
+        queries.extend(q for q in (metadata.web_search_queries or []) if q not in queries)
+        for chunk in metadata.grounding_chunks or []:
+            web = getattr(chunk, "web", None)
+            if web and web.uri and all(s["uri"] != web.uri for s in sources):
+                sources.append({"title": web.title or "", "uri": web.uri})
+    if not queries and not sources:
+        return None
+    return {"queries": queries, "sources": sources}
+
+
+def lookup(topic: Optional[str]) -> Optional[Dict]:
+    """Cached grounding for topic if caching is on and the entry is fresh."""
+    if not (GROUNDING_CACHE and topic):
+        return None
+    path = _entry_path(topic)
+    try:
+        entry = json.loads(path.read_text(encoding="utf-8"))
+    except Exception:
+        return None
+    if time.time() - entry.get("updated_at", 0) > GROUNDING_CACHE_TTL_HOURS * 3600:
+        return None
+    return entry if entry.get("sources") else None
+
+
+def store(topic: Optional[str], grounding: Optional[Dict], task: Optional[str] = None):
+    """Merge a response's grounding into the topic's cache entry. Never raises."""
+    if not (GROUNDING_CACHE and topic and grounding):
+        return
+    try:
+        with _lock:
+            path = _entry_path(topic)
+            try:
+                entry = json.loads(path.read_text(encoding="utf-8"))
+            except Exception:
+                entry = {"topic": topic, "queries": [], "sources": [], "tasks": []}
+            entry["queries"] += [q for q in grounding["queries"] if q not in entry["queries"]]
+            known = {s["uri"] for s in entry["sources"]}
+            entry["sources"] += [s for s in grounding["sources"] if s["uri"] not in known]
+            entry["sources"] = entry["sources"][:GROUNDING_MAX_SOURCES]
+            if task and task not in entry["tasks"]:
+                entry["tasks"].append(task)
+            entry["updated_at"] = time.time()
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(path.name + f".{os.getpid()}.tmp")
+            tmp.write_text(json.dumps(entry, indent=2), encoding="utf-8")
+            os.replace(tmp, path)
+        print(f"🔎 Cached {len(grounding['sources'])} grounding sources for '{topic}'")
+    except Exception as e:
+        print(f"⚠️ Could not cache grounding for '{topic}': {e}")
+
+
+def as_context(entry: Dict) -> str:
+    """Prompt section handing cached search results to a call that skips the search tool."""
+    lines = ["WEB SOURCES (from earlier Google searches on this course topic; cite these instead of searching again):"]
+    if entry.get("queries"):
+        lines.append("Searches: " + "; ".join(entry["queries"]))
+    for source in entry["sources"]:
+        lines.append(f"- {source['title']}: {source['uri']}" if source["title"] else f"- {source['uri']}")
+    return "\n".join(lines)
+
+
+def print_grounding(response):
+    """Print a response's search queries and sources, if it was grounded."""
+    grounding = extract(response)
+    if not grounding:
+        return
+    print("\n--- Grounding Metadata ---")
+    print("Web Search Queries:", grounding["queries"])
+    if grounding["sources"]:
+        print("Grounding Chunks (Web):")
+        for source in grounding["sources"]:
+            print(f"  - Title: {source['title']}, URL: {source['uri']}")
@@ -0,0 +1,196 @@
+"""Background generation jobs.
+
+Generation runs take tens of minutes, so the API submits them to a bounded
+thread pool and hands back a job ID immediately. Each worker drives the
+stage graph from pipeline.py against the job's own workspace; the API only
+reads the shared job table.
+"""
+import json
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from pipeline import run_pipeline, STAGES
+from progress import events_offset
+from workspace import curriculum_path, get_workspace, io_dir, OUTPUT_CATEGORIES
+
+logger = logging.getLogger(__name__)
+
+GENERATED_SUFFIXES = ['.txt', '.docx', '.pdf', '.pptx']
+
+# Each job runs in its own workspace; this bounds how many pipelines (and
+# their LLM traffic) run at once on this host. Extra jobs wait in the queue.
+MAX_CONCURRENT_JOBS = int(os.environ.get("MAX_CONCURRENT_JOBS", "2"))
+
+
+def collect_generated_files(output_dir: Path) -> List[Dict]:
+    """List generated files directly under output_dir and its category subdirectories.
+
+    The uploaded curriculum PDF lives in output_dir too and is never counted.
+    """
+    generated_files = []
+    dirs = [output_dir] + [output_dir / sub for sub in OUTPUT_CATEGORIES]
+    for directory in dirs:
+        if not directory.exists():
+            continue
+        for file_path in directory.glob("*"):
+            if file_path == curriculum_path(output_dir.parent):
+                continue
+            if file_path.is_file() and file_path.suffix in GENERATED_SUFFIXES:
+                generated_files.append({
+                    "name": file_path.name,
+                    "path": str(file_path),
+                    "size": file_path.stat().st_size
+                })
+    return generated_files
+
+
+def _pipeline_env() -> Dict[str, str]:
+    """Environment for stage processes: no service bindings, no inherited web PORT."""
+    env = os.environ.copy()
+    env.update({
+        'NO_SERVER': '1',
+        'DISABLE_SERVICES': '1',
+        'PYTHONUNBUFFERED': '1'
+    })
+    env.pop('PORT', None)
+    if not env.get('GEMINI_API_KEY') and not env.get('GOOGLE_API_KEY'):
+        logger.warning("GEMINI_API_KEY not found in environment variables")
+    return env
+
+
+class JobManager:
+    """Thread-safe job table plus a bounded pool of pipeline workers."""
+
+    def __init__(self, max_workers: int = MAX_CONCURRENT_JOBS):
+        self._jobs: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="generation")
+
+    def submit(self, workspace: Path, resume: bool = False, resumed_from: Optional[str] = None) -> Dict:
+        """Queue a pipeline run. With resume, stages completed in the workspace's
+        checkpoint are kept and only the rest are run.
+
+        Raises ValueError if the workspace already has a queued or running job:
+        two runs would share its checkpoint, outputs and retry budget.
+        """
+        job_id = uuid.uuid4().hex
+        job = {
+            "job_id": job_id,
+            "workspace_id": workspace.name,
+            "status": "queued",
+            "created_at": datetime.now().isoformat(),
+            "started_at": None,
+            "finished_at": None,
+            "stages": {s.name: {"status": "pending"} for s in STAGES},
+            "generated_files": [],
+            "total_files": 0,
+            "cache_hits": [],
+            "resume": resume,
+            "resumed_from": resumed_from,
+            # Progress events for this job start here in the workspace's events.jsonl
+            "events_offset": events_offset(workspace),
+            "error": None,
+        }
+        with self._lock:
+            active = self._active_job(workspace.name)
+            if active:
+                raise ValueError(f"Workspace {workspace.name} already has job {active['job_id']} {active['status']}")
+            self._jobs[job_id] = job
+        self._pool.submit(self._run, job_id, workspace, resume)
+        logger.info(f"Queued generation job {job_id}" + (" (resume)" if resume else ""))
+        return self.get(job_id)
+
+    def resume(self, job_id: str) -> Optional[Dict]:
+        """Queue a new job continuing job_id's workspace from its checkpoint.
+
+        Returns None for an unknown job; raises ValueError if it is still active.
+        """
+        job = self.get(job_id)
+        if not job:
+            return None
+        if job["status"] in ("queued", "running"):
+            raise ValueError(f"Job {job_id} is still {job['status']}")
+        workspace = get_workspace(job["workspace_id"])
+        if not workspace:
+            raise ValueError(f"Workspace {job['workspace_id']} no longer exists")
+        return self.submit(workspace, resume=True, resumed_from=job_id)
+
+    def _active_job(self, workspace_id: str) -> Optional[Dict]:
+        """The workspace's queued or running job (callers hold the lock)."""
+        for job in self._jobs.values():
+            if job["workspace_id"] == workspace_id and job["status"] in ("queued", "running"):
+                return job
+        return None
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return json.loads(json.dumps(job)) if job else None
+
+    def list_jobs(self) -> List[Dict]:
+        with self._lock:
+            jobs = [json.loads(json.dumps(j)) for j in self._jobs.values()]
+        jobs.sort(key=lambda j: j["created_at"], reverse=True)
+        return jobs
+
+    def _update(self, job_id: str, **fields):
+        with self._lock:
+            self._jobs[job_id].update(fields)
+
+    def _stage_update(self, job_id: str):
+        def on_update(stage_result: Dict):
+            with self._lock:
+                self._jobs[job_id]["stages"][stage_result["name"]] = dict(stage_result)
+        return on_update
+
+    def _log(self, job_id: str):
+        def log(line: str):
+            logger.info(f"[job {job_id[:8]}] {line}")
+        return log
+
+    def _run(self, job_id: str, workspace: Path, resume: bool = False):
+        output_dir = io_dir(workspace)
+        marker = output_dir / "generation_complete.json"
+        try:
+            # Remove any previous completion marker to signal new run
+            if marker.exists():
+                marker.unlink()
+        except Exception as e:
+            logger.warning(f"Failed clearing generation_complete.json: {e}")
+
+        self._update(job_id, status="running", started_at=datetime.now().isoformat())
+        try:
+            results = run_pipeline(workspace, STAGES, env=_pipeline_env(), log=self._log(job_id),
+                                   on_update=self._stage_update(job_id), resume=resume)
+            generated_files = collect_generated_files(output_dir)
+            critical_ok = all(results[s.name]["status"] == "success" for s in STAGES if s.critical)
+            # Files left by a failed run are partial output, not success
+            success = critical_ok
+            self._update(
+                job_id,
+                status="completed" if success else "failed",
+                finished_at=datetime.now().isoformat(),
+                stages=results,
+                generated_files=generated_files,
+                total_files=len(generated_files),
+                cache_hits=[name for name, res in results.items() if res.get("cached")],
+            )
+            if success:
+                try:
+                    with open(marker, "w", encoding="utf-8") as f:
+                        json.dump({
+                            "completed": True,
+                            "completed_at": datetime.now().isoformat(),
+                            "job_id": job_id,
+                        }, f)
+                except Exception as e:
+                    logger.warning(f"Failed to write generation_complete.json: {e}")
+        except Exception as e:
+            logger.error(f"Generation job {job_id} failed: {e}")
+            self._update(job_id, status="failed", finished_at=datetime.now().isoformat(), error=str(e))
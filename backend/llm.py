@@ -1,27 +1,36 @@
 from google import genai
 from dotenv import load_dotenv
 import os
+import re
+import sys
+import json
+import time
+import asyncio
+import hashlib
 import pathlib
+import threading
+import weakref
+from datetime import datetime, timedelta, timezone
+import httpx
 from google.genai import types
-import json
+
+import grounding
+import pdf_text
+import rate_limiter
+from model_routes import model_for
+from telemetry import timed_chunks, track_call
+from resilience import LLM_MAX_ATTEMPTS, call_with_retries, call_with_retries_async
+from workspace import job_from_args, load_config, save_config, io_dir, curriculum_path
 
 load_dotenv()
 
-def load_user_inputs():
-    """Load user inputs from file if exists"""
-    config_file = "user_config.json"
-    if os.path.exists(config_file):
-        try:
-            with open(config_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            return None
-    return None
+def load_user_inputs(workspace=None):
+    """Load user inputs from the workspace's user_config.json if it exists"""
+    return load_config(workspace)
 
 
-def save_user_inputs(user_name, user_id, difficulty_level, duration, teaching_style):
-    """Save user inputs to file"""
-    config_file = "user_config.json"
+def save_user_inputs(user_name, user_id, difficulty_level, duration, teaching_style, workspace=None):
+    """Save user inputs to the workspace's user_config.json"""
     config_data = {
         "user_name": user_name,
         "user_id": user_id,
@@ -30,15 +39,327 @@ def save_user_inputs(user_name, user_id, difficulty_level, duration, teaching_st
         "teaching_style": teaching_style
     }
     try:
-        with open(config_file, 'w', encoding='utf-8') as f:
-            json.dump(config_data, f, indent=2)
+        save_config(config_data, workspace)
     except:
         pass
 
 
+# One client per process: its HTTP connection pool (and TLS sessions) is reused
+# by every call, so per-week and per-quiz requests skip connection setup
+GEMINI_MAX_CONNECTIONS = int(os.getenv("GEMINI_MAX_CONNECTIONS", "20"))
+GEMINI_KEEPALIVE_SECONDS = float(os.getenv("GEMINI_KEEPALIVE_SECONDS", "120"))
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def _http_options() -> types.HttpOptions:
+    """Connection pool limits shared by the sync and async transports."""
+    limits = httpx.Limits(
+        max_connections=GEMINI_MAX_CONNECTIONS,
+        max_keepalive_connections=GEMINI_MAX_CONNECTIONS,
+        keepalive_expiry=GEMINI_KEEPALIVE_SECONDS,
+    )
+    return types.HttpOptions(client_args={"limits": limits}, async_client_args={"limits": limits})
+
+
 def get_gemini_client() -> genai.Client:
-    """Return an authenticated Gemini client using GEMINI_API_KEY from env."""
-    return genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+    """Return the process-wide Gemini client, authenticated with GEMINI_API_KEY from env.
+
+    Created on first use and safe to share between threads.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"), http_options=_http_options())
+    return _client
+
+
+# Upper bound on in-flight async requests per process (per-key concurrency limit)
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "4"))
+
+_semaphores = weakref.WeakKeyDictionary()
+
+
+def _request_semaphore() -> asyncio.Semaphore:
+    """Concurrency limiter for the running event loop (asyncio primitives are loop-bound)."""
+    loop = asyncio.get_running_loop()
+    semaphore = _semaphores.get(loop)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(max(1, GEMINI_MAX_CONCURRENCY))
+        _semaphores[loop] = semaphore
+    return semaphore
+
+
+# Curriculum PDFs are uploaded to the Files API once and referenced by URI.
+# The handle is kept in a sidecar next to the PDF so every stage process of a
+# job reuses the same upload; uploaded files expire after 48 hours.
+GEMINI_UPLOAD_FILES = os.getenv("GEMINI_UPLOAD_FILES", "1").lower() not in ("0", "false", "no", "off")
+UPLOAD_SIDECAR_SUFFIX = ".upload.json"
+# "file" sends the PDF itself; "text" sends its locally extracted text (see pdf_text.py)
+# when it has a text layer, and falls back to the file for scanned PDFs; "auto" sends
+# the file to whole-course calls and, to per-week/per-theme calls that pass a
+# pdf_query, only the text of the pages most relevant to it
+GEMINI_PDF_MODE = os.getenv("GEMINI_PDF_MODE", "auto").lower()
+PDF_RELEVANT_PAGES = int(os.getenv("GEMINI_PDF_RELEVANT_PAGES", "5"))
+# Whether calls given a pdf_query send their own curriculum pages (so shared contexts leave the PDF out)
+PDF_PAGES_PER_QUERY = GEMINI_PDF_MODE != "file"
+UPLOAD_EXPIRY_MARGIN = timedelta(hours=1)
+
+_uploads = {}
+_upload_lock = threading.Lock()
+
+
+def _file_sha256(filepath: pathlib.Path) -> str:
+    h = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _expires_later(expires, margin: timedelta) -> bool:
+    """True unless the ISO timestamp is missing-but-required, unreadable or within margin of now."""
+    try:
+        return datetime.fromisoformat(expires) - margin > datetime.now(timezone.utc)
+    except (TypeError, ValueError):
+        return False
+
+
+def _upload_usable(handle) -> bool:
+    expires = handle.get("expiration_time") if handle else None
+    if not expires:
+        return bool(handle)
+    return _expires_later(expires, UPLOAD_EXPIRY_MARGIN)
+
+
+def _upload_pdf(client, filepath: pathlib.Path, digest: str) -> dict:
+    uploaded = call_with_retries(
+        lambda: client.files.upload(
+            file=str(filepath),
+            config=types.UploadFileConfig(mime_type='application/pdf', display_name=filepath.name),
+        ),
+        model="files", description=f"Upload {filepath.name}",
+    )
+    # Large PDFs are processed asynchronously; wait until the file can be referenced
+    deadline = time.monotonic() + 120
+    while getattr(uploaded.state, "name", str(uploaded.state)) == "PROCESSING" and time.monotonic() < deadline:
+        time.sleep(2)
+        uploaded = client.files.get(name=uploaded.name)
+    if getattr(uploaded.state, "name", str(uploaded.state)) == "FAILED":
+        raise RuntimeError(f"Upload of {filepath.name} failed processing")
+    expiration = uploaded.expiration_time
+    return {
+        "sha256": digest,
+        "name": uploaded.name,
+        "uri": uploaded.uri,
+        "mime_type": uploaded.mime_type or 'application/pdf',
+        "expiration_time": expiration.isoformat() if expiration else None,
+        "uploaded_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def get_pdf_part(client, filepath: pathlib.Path, query=None) -> types.Part:
+    """Return a Part for the PDF: its extracted text (see GEMINI_PDF_MODE), only the
+    pages most relevant to query when one is given, an uploaded-file reference, or
+    inline bytes as a fallback."""
+    if GEMINI_PDF_MODE == "text" or (query and PDF_PAGES_PER_QUERY):
+        index = pdf_text.extract_pdf(filepath)
+        if index and index["has_text"]:
+            pages = pdf_text.relevant_pages(index, query, PDF_RELEVANT_PAGES) if query else []
+            if pages:
+                return (f"CURRICULUM DOCUMENT (pages {', '.join(map(str, pages))} of {filepath.name}, "
+                        f"the most relevant to this task):\n{pdf_text.pages_text(index, pages)}")
+            return f"CURRICULUM DOCUMENT (text extracted from {filepath.name}):\n{pdf_text.pages_text(index)}"
+        print(f"⚠️ No usable text layer in {filepath.name}, sending the PDF itself")
+    if GEMINI_UPLOAD_FILES and client is not None:
+        try:
+            stat = filepath.stat()
+            memo_key = (str(filepath.resolve()), stat.st_mtime_ns, stat.st_size)
+            with _upload_lock:
+                handle = _uploads.get(memo_key)
+                if not _upload_usable(handle):
+                    digest = _file_sha256(filepath)
+                    sidecar = filepath.with_name(filepath.name + UPLOAD_SIDECAR_SUFFIX)
+                    handle = None
+                    if sidecar.exists():
+                        try:
+                            handle = json.loads(sidecar.read_text(encoding='utf-8'))
+                        except Exception:
+                            handle = None
+                    if not handle or handle.get("sha256") != digest or not _upload_usable(handle):
+                        handle = _upload_pdf(client, filepath, digest)
+                        tmp = sidecar.with_name(sidecar.name + f".{os.getpid()}.tmp")
+                        tmp.write_text(json.dumps(handle, indent=2), encoding='utf-8')
+                        os.replace(tmp, sidecar)
+                        print(f"📤 Uploaded {filepath.name} once as {handle['name']}")
+                    _uploads[memo_key] = handle
+            return types.Part.from_uri(file_uri=handle["uri"], mime_type=handle["mime_type"])
+        except Exception as e:
+            print(f"⚠️ Could not upload {filepath.name}, sending it inline instead: {e}")
+    return types.Part.from_bytes(
+        data=filepath.read_bytes(),
+        mime_type='application/pdf',
+    )
+
+
+# Explicit context caches hold a job's shared request prefix (system instruction,
+# tools, curriculum and course content) so repeated calls only send their task.
+# Entries are recorded per workspace in context_caches.json for reuse across
+# the job's stage processes.
+GEMINI_CONTEXT_CACHE = os.getenv("GEMINI_CONTEXT_CACHE", "1").lower() not in ("0", "false", "no", "off")
+CONTEXT_CACHE_TTL_SECONDS = int(os.getenv("CONTEXT_CACHE_TTL_SECONDS", "3600"))
+CONTEXT_CACHE_REGISTRY = "context_caches.json"
+CONTEXT_CACHE_EXPIRY_MARGIN = timedelta(minutes=5)
+
+_context_caches = {}
+# Guards the two dicts and the registry file only; creating a cache holds just its key's lock
+_context_cache_lock = threading.Lock()
+_context_cache_key_locks = {}
+
+
+def _part_fingerprint(part) -> str:
+    if isinstance(part, str):
+        return "text:" + part
+    file_data = getattr(part, "file_data", None)
+    if file_data is not None and getattr(file_data, "file_uri", None):
+        return "file:" + file_data.file_uri
+    inline = getattr(part, "inline_data", None)
+    if inline is not None and getattr(inline, "data", None):
+        return "inline:" + hashlib.sha256(inline.data).hexdigest()
+    return "part:" + repr(part)
+
+
+def get_shared_context(client, teaching_style, duration, difficulty_level, google_search_tool, system_prompt, filepath=None, course_content=None, workspace=None, model_task='course_plan'):
+    """
+    Create (or reuse) an explicit context cache holding everything a
+    generate_course_content call sends except its task.
+
+    Returns the cache name to pass as cached_content, or None when caching is
+    disabled or unavailable (e.g. the prefix is below the model's minimum
+    cacheable size); callers then send the full prompt as before. A cache only
+    serves its own model, so pass the model_task of the calls that will use it.
+    """
+    if not GEMINI_CONTEXT_CACHE or client is None:
+        return None
+    model = model_for(model_task)
+    google_search_tool, sources = _grounding_for(model_task, google_search_tool, workspace=workspace)
+    try:
+        contents = _build_contents(teaching_style, duration, difficulty_level, filepath, course_content, None, client, sources=sources)
+        h = hashlib.sha256()
+        for piece in [model, system_prompt or "", "search" if google_search_tool else "no-tools"]:
+            h.update(piece.encode("utf-8") + b"\0")
+        for part in contents:
+            h.update(_part_fingerprint(part).encode("utf-8") + b"\0")
+        key = h.hexdigest()
+
+        registry = pathlib.Path(workspace) / CONTEXT_CACHE_REGISTRY if workspace else None
+        with _context_cache_lock:
+            key_lock = _context_cache_key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            with _context_cache_lock:
+                entry = _context_caches.get(key)
+                if not (entry and _expires_later(entry.get("expire_time"), CONTEXT_CACHE_EXPIRY_MARGIN)) and registry and registry.exists():
+                    try:
+                        entry = json.loads(registry.read_text(encoding='utf-8')).get(key)
+                    except Exception:
+                        entry = None
+            if not (entry and _expires_later(entry.get("expire_time"), CONTEXT_CACHE_EXPIRY_MARGIN)):
+                cache = call_with_retries(
+                    lambda: client.caches.create(
+                        model=model,
+                        config=types.CreateCachedContentConfig(
+                            display_name=f"course-context-{key[:12]}",
+                            system_instruction=system_prompt,
+                            contents=contents,
+                            tools=[google_search_tool] if google_search_tool else None,
+                            ttl=f"{CONTEXT_CACHE_TTL_SECONDS}s",
+                        ),
+                    ),
+                    model=model, description=f"Create context cache [{model_task}]", workspace=workspace,
+                )
+                expire_time = cache.expire_time or (datetime.now(timezone.utc) + timedelta(seconds=CONTEXT_CACHE_TTL_SECONDS))
+                entry = {"name": cache.name, "model": model, "expire_time": expire_time.isoformat()}
+                if registry:
+                    with _context_cache_lock:
+                        try:
+                            known = json.loads(registry.read_text(encoding='utf-8')) if registry.exists() else {}
+                        except Exception:
+                            known = {}
+                        known[key] = entry
+                        tmp = registry.with_name(registry.name + f".{os.getpid()}.tmp")
+                        tmp.write_text(json.dumps(known, indent=2), encoding='utf-8')
+                        os.replace(tmp, registry)
+                print(f"🗄️ Created context cache {cache.name} for the shared prompt")
+            with _context_cache_lock:
+                _context_caches[key] = entry
+        return entry["name"]
+    except Exception as e:
+        print(f"⚠️ Context cache unavailable, sending the full prompt: {e}")
+        return None
+
+
+# Long-form outputs can be streamed straight into their artifact so a failure
+# late in the call keeps what was already generated
+GEMINI_STREAMING = os.getenv("GEMINI_STREAMING", "1").lower() not in ("0", "false", "no", "off")
+WEEK_HEADING_RE = re.compile(r"^#{1,3}\s*Week\s+(\d+)\b", re.IGNORECASE | re.MULTILINE)
+
+
+class StreamedResponse:
+    """Stand-in for a GenerateContentResponse assembled from streamed chunks.
+
+    text is None when the caller asked not to keep it in memory (the artifact
+    on disk holds it); candidates and usage_metadata come from the last chunk.
+    """
+
+    def __init__(self, text, last_chunk=None):
+        self.text = text
+        self.candidates = getattr(last_chunk, "candidates", None)
+        self.usage_metadata = getattr(last_chunk, "usage_metadata", None)
+
+
+def _stream_to_file(chunks, stream_to, on_week=None, keep_text=True) -> StreamedResponse:
+    """Write streamed chunks to stream_to as they arrive.
+
+    on_week(n) is called once week n's section is complete, i.e. when the next
+    "# Week" heading (or the end of the stream) arrives.
+    """
+    pieces = [] if keep_text else None
+    pending_line = ""
+    current_week = None
+    last_chunk = None
+
+    def scan(lines):
+        nonlocal current_week
+        for match in WEEK_HEADING_RE.finditer(lines):
+            week = int(match.group(1))
+            if current_week is not None and week != current_week and on_week:
+                on_week(current_week)
+            current_week = week
+
+    path = pathlib.Path(stream_to)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        for chunk in chunks:
+            last_chunk = chunk
+            text = getattr(chunk, "text", None)
+            if not text:
+                continue
+            f.write(text)
+            f.flush()
+            if pieces is not None:
+                pieces.append(text)
+            # Only whole lines are scanned for headings; keeps memory bounded to one line
+            pending_line += text
+            cut = pending_line.rfind("\n")
+            if cut >= 0:
+                scan(pending_line[:cut + 1])
+                pending_line = pending_line[cut + 1:]
+    scan(pending_line)
+    if current_week is not None and on_week:
+        on_week(current_week)
+    return StreamedResponse("".join(pieces) if pieces is not None else None, last_chunk)
 
 
 def get_google_search_tool() -> genai.types.Tool:
@@ -143,7 +464,7 @@ Create a **cohesive, learner-aligned course plan** that:
 Respond only after carefully analyzing all inputs and formatting the final course plan in structured Markdown."""
 
 
-def generate_course_content(client, teaching_style, duration, difficulty_level, google_search_tool, system_prompt, filepath=None, course_content=None, task=None):
+def generate_course_content(client, teaching_style, duration, difficulty_level, google_search_tool, system_prompt, filepath=None, course_content=None, task=None, cached_content=None, stream_to=None, on_week=None, keep_text=True, response_schema=None, model_task='course_plan', workspace=None, pdf_query=None):
     """
     Generate course content using the LLM
     
@@ -157,10 +478,145 @@ def generate_course_content(client, teaching_style, duration, difficulty_level,
         filepath: Optional path to PDF file to include
         course_content: Optional text content to include (for quiz generation, etc.)
         task: Optional specific task description
+        cached_content: Optional context cache from get_shared_context for the same
+            inputs; only the task is then sent with the request
+        stream_to: Optional file path; the response is streamed and written there
+            chunk by chunk instead of arriving all at once
+        on_week: With stream_to, called with each week number as its section completes
+        keep_text: With stream_to, set False to not also hold the full text in memory
+        response_schema: Optional type (see schemas.py) the response must be JSON for;
+            the search tool is dropped and the result is in response.parsed
+        model_task: Routing task (see model_routes.py) that picks the model and
+            under which the call's latency and tokens are recorded; grounding
+            is on or off per task (see grounding.py)
+        workspace: The job's workspace, whose retry budget and telemetry the call uses
+        pdf_query: For per-week/per-theme calls, what the call is about; unless
+            GEMINI_PDF_MODE=file only the curriculum pages most relevant to it are
+            sent (with cached_content too, so leave the PDF out of that context)
         
     Returns:
-        Generated response from the LLM
+        Generated response from the LLM (a StreamedResponse when streaming)
+    """
+    model = model_for(model_task)
+    tool, sources = _grounding_for(model_task, google_search_tool, response_schema, workspace)
+    # Attempts are shared by the cached-context call and its full-prompt fallback
+    attempts = {"used": 0}
+
+    def call(contents, config, context_cache=False):
+        # One telemetry record per call, covering all of its retries
+        with track_call(model_task, model, workspace) as tracked:
+            tracked.context_cache = context_cache
+            tracked.grounding_reused = sources is not None
+
+            def attempt():
+                attempts["used"] += 1
+                tracked.start_attempt()
+                waiting = time.monotonic()
+                # Each attempt holds a host-wide lease so concurrent jobs share the model's quota
+                with rate_limiter.slot(model) as slot:
+                    tracked.queued(time.monotonic() - waiting)
+                    if stream_to:
+                        # A retried stream starts the artifact over
+                        chunks = timed_chunks(client.models.generate_content_stream(model=model, contents=contents, config=config), tracked)
+                        return tracked.record(slot.record(_stream_to_file(chunks, stream_to, on_week, keep_text)))
+                    return tracked.record(slot.record(client.models.generate_content(model=model, contents=contents, config=config)))
+            return call_with_retries(attempt, model=model, description=f"generate_course_content[{model_task}]",
+                                     max_attempts=LLM_MAX_ATTEMPTS - attempts["used"], workspace=workspace)
+
+    if cached_content:
+        try:
+            return _remember_grounding(model_task, workspace, call(
+                _build_contents(teaching_style, duration, difficulty_level, filepath, course_content, task, client, cached_content, pdf_query=pdf_query),
+                _generate_config(tool, system_prompt, cached_content, response_schema),
+                context_cache=True,
+            ))
+        except Exception as e:
+            if attempts["used"] >= LLM_MAX_ATTEMPTS:
+                raise
+            print(f"⚠️ Cached context {cached_content} failed, sending the full prompt: {e}")
+    response = call(
+        _build_contents(teaching_style, duration, difficulty_level, filepath, course_content, task, client, sources=sources, pdf_query=pdf_query),
+        _generate_config(tool, system_prompt, response_schema=response_schema),
+    )
+    return _remember_grounding(model_task, workspace, response)
+
+
+async def generate_course_content_async(client, teaching_style, duration, difficulty_level, google_search_tool, system_prompt, filepath=None, course_content=None, task=None, semaphore=None, cached_content=None, response_schema=None, model_task='course_plan', workspace=None, pdf_query=None):
+    """
+    Async counterpart of generate_course_content on the client's async API.
+
+    At most GEMINI_MAX_CONCURRENCY requests run at once per event loop (or per the
+    given semaphore), so callers can asyncio.gather many requests safely.
     """
+    model = model_for(model_task)
+    tool, sources = _grounding_for(model_task, google_search_tool, response_schema, workspace)
+    # Attempts are shared by the cached-context call and its full-prompt fallback
+    attempts = {"used": 0}
+    # Held per attempt, around the request only: backoff sleeps free it for other calls
+    limit = semaphore or _request_semaphore()
+
+    async def call(contents, config, context_cache=False):
+        with track_call(model_task, model, workspace) as tracked:
+            tracked.context_cache = context_cache
+            tracked.grounding_reused = sources is not None
+
+            async def attempt():
+                attempts["used"] += 1
+                tracked.start_attempt()
+                waiting = time.monotonic()
+                async with limit, rate_limiter.slot_async(model) as slot:
+                    tracked.queued(time.monotonic() - waiting)
+                    return tracked.record(slot.record(await client.aio.models.generate_content(model=model, contents=contents, config=config)))
+            return await call_with_retries_async(attempt, model=model, description=f"generate_course_content_async[{model_task}]",
+                                                 max_attempts=LLM_MAX_ATTEMPTS - attempts["used"], workspace=workspace)
+
+    if cached_content:
+        try:
+            return _remember_grounding(model_task, workspace, await call(
+                _build_contents(teaching_style, duration, difficulty_level, filepath, course_content, task, client, cached_content, pdf_query=pdf_query),
+                _generate_config(tool, system_prompt, cached_content, response_schema),
+                context_cache=True,
+            ))
+        except Exception as e:
+            if attempts["used"] >= LLM_MAX_ATTEMPTS:
+                raise
+            print(f"⚠️ Cached context {cached_content} failed, sending the full prompt: {e}")
+    response = await call(
+        _build_contents(teaching_style, duration, difficulty_level, filepath, course_content, task, client, sources=sources, pdf_query=pdf_query),
+        _generate_config(tool, system_prompt, response_schema=response_schema),
+    )
+    return _remember_grounding(model_task, workspace, response)
+
+
+def _grounding_for(model_task, google_search_tool, response_schema=None, workspace=None):
+    """Search tool to attach for model_task, or cached search results to send in its place."""
+    if google_search_tool is None or response_schema is not None or not grounding.grounding_enabled(model_task):
+        return None, None
+    cached = grounding.lookup(grounding.topic_for(workspace))
+    if cached:
+        print(f"🔎 Reusing {len(cached['sources'])} cached web sources for {model_task}")
+        return None, cached
+    return google_search_tool, None
+
+
+def _remember_grounding(model_task, workspace, response):
+    """Keep a grounded response's search results for later calls on the same topic."""
+    found = grounding.extract(response)
+    if found:
+        grounding.store(grounding.topic_for(workspace), found, model_task)
+    return response
+
+
+def _build_contents(teaching_style, duration, difficulty_level, filepath=None, course_content=None, task=None, client=None, cached_content=None, sources=None, pdf_query=None):
+    """Request contents shared by the sync and async generate calls."""
+    if cached_content:
+        # The style lines, course content and PDF already live in the cached context;
+        # curriculum pages picked for pdf_query are this request's own
+        contents = [f"TASK: {task}"] if task else ["Proceed with the cached instructions."]
+        if pdf_query and PDF_PAGES_PER_QUERY and filepath and filepath.exists():
+            contents.append(get_pdf_part(client, filepath, pdf_query))
+        return contents
+
     # Build contents list properly - all content should be strings
     contents = [
         f"Teaching Style: {teaching_style}",
@@ -175,29 +631,36 @@ def generate_course_content(client, teaching_style, duration, difficulty_level,
     # Add task description if provided
     if task:
         contents.append(f"TASK: {task}")
+
+    # Search results cached from an earlier grounded call on this topic, sent instead of the search tool
+    if sources:
+        contents.append(grounding.as_context(sources))
     
     # Add PDF content only if filepath is provided and file exists
     if filepath and filepath.exists():
-        contents.append(types.Part.from_bytes(
-            data=filepath.read_bytes(),
-            mime_type='application/pdf',
-        ))
-    
-    response = client.models.generate_content(
-        model='gemini-2.5-flash',
-        contents=contents,
-        config=genai.types.GenerateContentConfig(
-            tools=[google_search_tool],
-            system_instruction=system_prompt,
-        ),
+        contents.append(get_pdf_part(client, filepath, pdf_query))
+    return contents
+
+
+def _generate_config(google_search_tool, system_prompt, cached_content=None, response_schema=None):
+    schema = {}
+    if response_schema is not None:
+        # JSON mode cannot be combined with tools, so schema calls go ungrounded
+        schema = {"response_mime_type": "application/json", "response_schema": response_schema}
+    if cached_content:
+        # System instruction and tools are part of the cached context
+        return genai.types.GenerateContentConfig(cached_content=cached_content, **schema)
+    return genai.types.GenerateContentConfig(
+        tools=[google_search_tool] if google_search_tool is not None and response_schema is None else None,
+        system_instruction=system_prompt,
+        **schema,
     )
-    return response
 
 
-def _run_standalone():
+def _run_standalone(workspace=None):
     """Standalone execution to produce planner_agent_instruction.txt (preserves old behavior)."""
     # Try to load existing user inputs
-    saved_inputs = load_user_inputs()
+    saved_inputs = load_user_inputs(workspace)
 
     if saved_inputs:
         print("Using saved user configuration:")
@@ -246,7 +709,7 @@ def _run_standalone():
             teaching_style = "Exploratory & Guided"  # Default to Exploratory & Guided if none specified
 
         # Save inputs for future runs
-        save_user_inputs(user_name, user_id, difficulty_level, duration, teaching_style)
+        save_user_inputs(user_name, user_id, difficulty_level, duration, teaching_style, workspace)
         print("Configuration saved for future runs.")
 
     print("Thank you for providing the inputs. Processing your request...")
@@ -254,43 +717,53 @@ def _run_standalone():
     client = get_gemini_client()
     google_search_tool = get_google_search_tool()
 
+    filepath = curriculum_path(workspace)
+    output_file_path = io_dir(workspace) / "planner_agent_instruction.txt"
+    # Written under a temporary name and renamed only once complete, so a failed call
+    # never leaves a truncated instruction file for the pipeline (and its stage cache)
+    partial_path = output_file_path.with_name(output_file_path.name + ".partial")
     try:
-        filepath = pathlib.Path("Inputs and Outputs/curriculum.pdf")
-        response = generate_course_content(
-            client,
-            teaching_style,
-            duration,
-            difficulty_level,
-            google_search_tool,
-            system_prompt,
-            filepath,
-        )
-
-        print(response.text)
-
-        # Save the response to a text file for the master agent
-        output_file_path = "Inputs and Outputs/planner_agent_instruction.txt"
-        try:
-            with open(output_file_path, 'w', encoding='utf-8') as f:
+        if GEMINI_STREAMING:
+            response = generate_course_content(
+                client,
+                teaching_style,
+                duration,
+                difficulty_level,
+                google_search_tool,
+                system_prompt,
+                filepath,
+                stream_to=partial_path,
+                workspace=workspace,
+            )
+            print(response.text)
+        else:
+            response = generate_course_content(
+                client,
+                teaching_style,
+                duration,
+                difficulty_level,
+                google_search_tool,
+                system_prompt,
+                filepath,
+                workspace=workspace,
+            )
+
+            print(response.text)
+
+            # Save the response to a text file for the master agent
+            with open(partial_path, 'w', encoding='utf-8') as f:
                 f.write(response.text)
-            print(f"\nResponse saved to: {output_file_path}")
-        except Exception as e:
-            print(f"Error saving response to file: {e}")
+        os.replace(partial_path, output_file_path)
+        print(f"\nResponse saved to: {output_file_path}")
 
         # Optional: Print grounding metadata if available
-        if response.candidates:
-            for candidate in response.candidates:
-                if candidate.grounding_metadata and candidate.grounding_metadata.web_search_queries:
-                    print("\n--- Grounding Metadata ---")
-                    print("Web Search Queries:", candidate.grounding_metadata.web_search_queries)
-                    if candidate.grounding_metadata.grounding_chunks:
-                        print("Grounding Chunks (Web):")
-                        for chunk in candidate.grounding_metadata.grounding_chunks:
-                            if chunk.web:
-                                print(f"  - Title: {chunk.web.title}, URL: {chunk.web.uri}")
+        grounding.print_grounding(response)
     except Exception as e:
+        partial_path.unlink(missing_ok=True)
         print(f"An error occurred during LLM interaction: {e}")
+        sys.exit(1)
 
 
 if __name__ == "__main__":
-    _run_standalone()
\ No newline at end of file
+    with job_from_args() as workspace:
+        _run_standalone(workspace)
\ No newline at end of file
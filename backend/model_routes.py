@@ -0,0 +1,79 @@
+"""Per-task model routing.
+
+Each kind of Gemini call names its task, and model_for(task) picks the model
+from the routing table. The defaults keep the heavy generation tasks on the
+full models and send short derivative tasks (flashcards, slide outlines) to a
+lite model. A deployment overrides the table with
+
+- GEMINI_MODEL_ROUTES: JSON object or "task=model,task=model" pairs, and/or
+- GEMINI_MODEL_<TASK>: one task, e.g. GEMINI_MODEL_SLIDE_OUTLINE=gemini-2.5-flash.
+
+telemetry.task_stats() rolls the job's llm_calls.jsonl up per task and model
+to tune the table with.
+"""
+import json
+import os
+from typing import Dict, Optional
+
+DEFAULT_MODEL = os.getenv("GEMINI_DEFAULT_MODEL", "gemini-2.5-flash")
+
+DEFAULT_ROUTES: Dict[str, str] = {
+    "course_plan": "gemini-2.5-flash",        # llm.py master instructions
+    "planner_agent": "gemini-2.5-flash",      # CoursePlannerAgent
+    "deep_agent": "gemini-2.0-flash",         # DeepCourseContentCreator
+    "course_material": "gemini-2.5-flash",    # structured course text
+    "quizzes": "gemini-2.5-flash",
+    "flashcards": "gemini-2.5-flash-lite",
+    "slide_outline": "gemini-2.5-flash-lite",
+}
+
+
+def _parse_routes(value: str) -> Dict[str, str]:
+    value = (value or "").strip()
+    if not value:
+        return {}
+    if value.startswith("{"):
+        try:
+            return {str(k): str(v) for k, v in json.loads(value).items() if v}
+        except ValueError:
+            print("⚠️ GEMINI_MODEL_ROUTES is not valid JSON; using the default routes")
+            return {}
+    routes = {}
+    for pair in value.split(","):
+        task, _, model = pair.partition("=")
+        if task.strip() and model.strip():
+            routes[task.strip()] = model.strip()
+    return routes
+
+
+def model_routes() -> Dict[str, str]:
+    """The effective routing table: defaults, then GEMINI_MODEL_ROUTES, then per-task variables."""
+    routes = dict(DEFAULT_ROUTES)
+    routes.update(_parse_routes(os.getenv("GEMINI_MODEL_ROUTES", "")))
+    for task in list(routes):
+        override = os.getenv(f"GEMINI_MODEL_{task.upper()}")
+        if override:
+            routes[task] = override
+    return routes
+
+
+def model_for(task: Optional[str]) -> str:
+    """Model to use for task; unknown tasks get GEMINI_DEFAULT_MODEL."""
+    if not task:
+        return DEFAULT_MODEL
+    return model_routes().get(task) or os.getenv(f"GEMINI_MODEL_{task.upper()}") or DEFAULT_MODEL
+
+
+def usage_counts(response) -> Dict[str, int]:
+    """Prompt, cached, output and total token counts from a response's usage_metadata."""
+    usage = getattr(response, "usage_metadata", None)
+
+    def count(name):
+        return int(getattr(usage, name, 0) or 0)
+
+    return {
+        "prompt_tokens": count("prompt_token_count"),
+        "cached_tokens": count("cached_content_token_count"),
+        "output_tokens": count("candidates_token_count"),
+        "total_tokens": count("total_token_count"),
+    }
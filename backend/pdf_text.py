@@ -0,0 +1,158 @@
+"""Local text extraction and page/section index for curriculum PDFs.
+
+The curriculum is extracted once, at upload time, with pypdf. Results are kept
+host-wide under PDF_TEXT_CACHE_DIR keyed by the PDF's SHA-256, so uploading
+the same PDF again (in any workspace) costs nothing. Each entry holds:
+
+- pages: [{"page": n, "text": ..., "chars": ...}]
+- sections: [{"title": ..., "page_start": n, "page_end": m}] from heading-like
+  lines (numbered headings, Unit/Module/Chapter/Week N, short all-caps lines)
+- has_text: False for scanned PDFs without a text layer
+
+Stages can then send extracted text (all of it, or only the pages relevant to
+a query) instead of the PDF binary; see llm.get_pdf_part and GEMINI_PDF_MODE.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from retrieval import CourseIndex
+from workspace import BACKEND_DIR, curriculum_path
+
+try:
+    from pypdf import PdfReader
+except ImportError:  # extraction is optional; stages fall back to sending the PDF
+    PdfReader = None
+
+PDF_TEXT_CACHE_DIR = Path(os.getenv("PDF_TEXT_CACHE_DIR", BACKEND_DIR / ".pdf_text_cache"))
+# Below this many characters per page on average the PDF is treated as scanned
+PDF_MIN_CHARS_PER_PAGE = int(os.getenv("PDF_MIN_CHARS_PER_PAGE", "200"))
+
+SECTION_RE = re.compile(
+    r"^(?:(?:unit|module|chapter|week|part|section|lecture)\s+[\dIVXivx]+\b.*"
+    r"|\d+(?:\.\d+){0,2}\.?\s+[A-Z].{2,80})$",
+    re.IGNORECASE,
+)
+
+_lock = threading.Lock()
+
+
+def _sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _is_heading(line: str) -> bool:
+    if not 3 <= len(line) <= 90:
+        return False
+    if SECTION_RE.match(line):
+        return True
+    letters = [c for c in line if c.isalpha()]
+    return len(letters) >= 4 and all(c.isupper() for c in letters) and len(line.split()) <= 10
+
+
+def _sections(pages: List[Dict]) -> List[Dict]:
+    sections: List[Dict] = []
+    for page in pages:
+        for line in page["text"].splitlines():
+            line = line.strip()
+            if _is_heading(line):
+                if sections:
+                    # Inclusive ranges: a section ends on the page where the next one starts
+                    sections[-1]["page_end"] = page["page"]
+                sections.append({"title": line, "page_start": page["page"], "page_end": page["page"]})
+    if sections:
+        sections[-1]["page_end"] = pages[-1]["page"]
+    return sections
+
+
+def _extract(path: Path, digest: str) -> Dict:
+    reader = PdfReader(str(path))
+    pages = []
+    for number, page in enumerate(reader.pages, 1):
+        try:
+            text = page.extract_text() or ""
+        except Exception as e:
+            print(f"⚠️ Could not extract text from page {number} of {path.name}: {e}")
+            text = ""
+        text = re.sub(r"[ \t]+\n", "\n", text).strip()
+        pages.append({"page": number, "text": text, "chars": len(text)})
+    total = sum(p["chars"] for p in pages)
+    return {
+        "sha256": digest,
+        "file_name": path.name,
+        "page_count": len(pages),
+        "chars": total,
+        "has_text": bool(pages) and total / len(pages) >= PDF_MIN_CHARS_PER_PAGE,
+        "pages": pages,
+        "sections": _sections(pages),
+    }
+
+
+def extract_pdf(path: Path) -> Optional[Dict]:
+    """Per-page text and section index for the PDF, from the hash-keyed cache when possible.
+
+    Returns None when pypdf is not installed or the PDF cannot be read.
+    """
+    path = Path(path)
+    if PdfReader is None or not path.exists():
+        return None
+    digest = _sha256(path)
+    cached = PDF_TEXT_CACHE_DIR / f"{digest}.json"
+    with _lock:
+        if cached.exists():
+            try:
+                return json.loads(cached.read_text(encoding="utf-8"))
+            except Exception:
+                pass
+        try:
+            index = _extract(path, digest)
+        except Exception as e:
+            print(f"⚠️ Could not extract text from {path.name}: {e}")
+            return None
+        PDF_TEXT_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = cached.with_name(cached.name + f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(index), encoding="utf-8")
+        os.replace(tmp, cached)
+    print(f"📑 Extracted {index['page_count']} pages ({index['chars']} characters, "
+          f"{len(index['sections'])} sections) from {path.name}")
+    return index
+
+
+def curriculum_index(workspace=None) -> Optional[Dict]:
+    """Text index of the workspace's curriculum.pdf (extracted on first use)."""
+    return extract_pdf(curriculum_path(workspace))
+
+
+def pages_text(index: Dict, pages: Optional[List[int]] = None) -> str:
+    """Extracted text of the given page numbers (all pages by default), labelled per page."""
+    wanted = set(pages) if pages is not None else None
+    return "\n\n".join(
+        f"[Page {p['page']}]\n{p['text']}"
+        for p in index["pages"]
+        if p["text"] and (wanted is None or p["page"] in wanted)
+    )
+
+
+def relevant_pages(index: Dict, query: str, k: int = 5) -> List[int]:
+    """Numbers of the k pages most relevant to query (BM25), in page order."""
+    chunks = [{"source": "curriculum", "week": None, "heading": "", "text": p["text"], "page": p["page"]}
+              for p in index["pages"] if p["text"]]
+    if not chunks:
+        return []
+    hits = CourseIndex(chunks).search(query, k)
+    return sorted(hit["page"] for hit in hits if hit["score"] > 0)
+
+
+def summary(index: Dict) -> Dict:
+    """The index without page text, for the API."""
+    brief = {key: value for key, value in index.items() if key != "pages"}
+    brief["pages"] = [{"page": p["page"], "chars": p["chars"]} for p in index["pages"]]
+    return brief
@@ -0,0 +1,357 @@
+"""Stage graph for the course generation pipeline.
+
+Each stage declares the artifacts it reads and writes (relative to the
+workspace's "Inputs and Outputs"). A stage depends on whichever stages produce
+its inputs, and is started as soon as those producers have finished, so the
+generators that only read the planner/deep outputs run side by side. Every
+stage script is launched with `--workspace <dir>` for the job it belongs to.
+
+Stages whose inputs, config fields, prompt sources and model are unchanged
+are restored from the content-addressed cache in stage_cache.py instead of
+being run again. Progress is recorded in the workspace's checkpoint manifest
+(checkpoint.py) so a failed run can be resumed from its incomplete stages,
+and stage start/finish events go to the workspace's progress log (progress.py).
+"""
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import checkpoint
+import progress
+import resilience
+import stage_cache
+import telemetry
+from model_routes import model_for
+from workspace import BACKEND_DIR, default_workspace
+
+
+@dataclass
+class Stage:
+    name: str
+    script: str                      # path relative to the backend directory
+    inputs: List[str] = field(default_factory=list)
+    outputs: List[str] = field(default_factory=list)
+    cwd: str = "."                   # working directory relative to the backend directory
+    timeout: int = 6000
+    critical: bool = False           # a failed critical stage skips everything downstream
+    description: str = ""
+    # Cache key ingredients besides the input artifacts
+    model: str = ""
+    config_fields: List[str] = field(default_factory=list)    # user_config keys the stage reads
+    prompt_sources: List[str] = field(default_factory=list)   # files holding its prompt text
+    cacheable: bool = True
+
+
+STAGES: List[Stage] = [
+    Stage(
+        name="llm",
+        script="llm.py",
+        inputs=["curriculum.pdf"],
+        outputs=["planner_agent_instruction.txt"],
+        timeout=3000,
+        critical=True,
+        description="Generating master instructions with LLM",
+        model=model_for("course_plan"),
+        config_fields=["teaching_style", "duration", "difficulty_level"],
+        prompt_sources=["llm.py"],
+    ),
+    Stage(
+        name="planner_agent",
+        script="copilot/main.py",
+        inputs=["planner_agent_instruction.txt"],
+        outputs=["plan_agent_output.txt"],
+        cwd="copilot",
+        description="Running Course Planner Agent",
+        model=model_for("planner_agent"),
+        prompt_sources=["copilot/main.py", "copilot/knowledge/agent.py", "plan_sections.py"],
+    ),
+    Stage(
+        name="deep_agent",
+        script="copilot/deep_main.py",
+        inputs=["plan_agent_output.txt"],
+        outputs=["deep_agent_output.txt"],
+        cwd="copilot",
+        description="Running Deep Content Agent",
+        model=model_for("deep_agent"),
+        prompt_sources=["copilot/deep_main.py", "copilot/knowledge_1/agent.py", "plan_sections.py"],
+    ),
+    Stage(
+        name="course_material",
+        script="course_material.py",
+        inputs=["planner_agent_instruction.txt", "plan_agent_output.txt", "deep_agent_output.txt"],
+        outputs=["course material"],
+        description="Generating course materials and documents",
+        model=model_for("course_material"),
+        config_fields=["subject", "course_subject", "course_name"],
+        prompt_sources=["course_material.py", "llm.py"],
+    ),
+    Stage(
+        name="quizzes",
+        script="quizzes.py",
+        inputs=["planner_agent_instruction.txt", "deep_agent_output.txt"],
+        outputs=["quizzes"],
+        description="Generating quiz questions and assessments",
+        model=model_for("quizzes"),
+        config_fields=["teaching_style", "duration", "difficulty_level"],
+        prompt_sources=["quizzes.py", "llm.py", "retrieval.py"],
+    ),
+    Stage(
+        name="flash_cards",
+        script="flash_cards.py",
+        inputs=["planner_agent_instruction.txt", "deep_agent_output.txt"],
+        outputs=["flashcards"],
+        description="Generating flash cards for study",
+        model=model_for("flashcards"),
+        config_fields=["teaching_style", "duration", "difficulty_level"],
+        prompt_sources=["flash_cards.py", "llm.py", "retrieval.py"],
+    ),
+    Stage(
+        name="ppt",
+        script="ppt.py",
+        inputs=["planner_agent_instruction.txt", "plan_agent_output.txt", "deep_agent_output.txt"],
+        outputs=["ppts"],
+        description="Generating PowerPoint presentations",
+        model=model_for("slide_outline"),
+        config_fields=["subject", "course_subject", "course_name"],
+        prompt_sources=["ppt.py", "llm.py"],
+    ),
+]
+
+
+def stage_dependencies(stages: List[Stage]) -> Dict[str, List[str]]:
+    """Map each stage name to the names of the stages producing its inputs."""
+    producers: Dict[str, str] = {}
+    for stage in stages:
+        for artifact in stage.outputs:
+            if artifact in producers:
+                raise ValueError(f"Artifact '{artifact}' is produced by both {producers[artifact]} and {stage.name}")
+            producers[artifact] = stage.name
+
+    deps: Dict[str, List[str]] = {}
+    for stage in stages:
+        deps[stage.name] = sorted({producers[a] for a in stage.inputs if a in producers and producers[a] != stage.name})
+
+    # Reject cycles up front so the scheduler can never stall
+    visiting, done = set(), set()
+
+    def visit(name: str):
+        if name in done:
+            return
+        if name in visiting:
+            raise ValueError(f"Stage graph has a cycle through '{name}'")
+        visiting.add(name)
+        for dep in deps[name]:
+            visit(dep)
+        visiting.discard(name)
+        done.add(name)
+
+    for name in deps:
+        visit(name)
+    return deps
+
+
+def _run_stage_process(stage: Stage, workspace: Path, env: Dict[str, str], log: Callable[[str], None]) -> Dict:
+    """Run one stage script, prefixing its output with the stage name."""
+    started = time.monotonic()
+    result = {
+        "name": stage.name,
+        "status": "running",
+        "return_code": None,
+        "started_at": datetime.now().isoformat(),
+        "finished_at": None,
+        "duration": None,
+        "cached": False,
+    }
+    command = [sys.executable, str(BACKEND_DIR / stage.script), "--workspace", str(workspace), "--stage", stage.name]
+    log(f"▶ [{stage.name}] starting: {stage.description or stage.script}")
+
+    try:
+        proc = subprocess.Popen(
+            command,
+            cwd=str(BACKEND_DIR / stage.cwd),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            encoding="utf-8",
+            errors="replace",
+            env=env,
+        )
+    except Exception as e:
+        log(f"✗ [{stage.name}] failed to start: {e}")
+        result.update(status="failed", finished_at=datetime.now().isoformat(), duration=0.0)
+        return result
+
+    def pump():
+        for line in proc.stdout:
+            log(f"[{stage.name}] {line.rstrip()}")
+
+    reader = threading.Thread(target=pump, daemon=True)
+    reader.start()
+    try:
+        proc.wait(timeout=stage.timeout)
+        result["status"] = "success" if proc.returncode == 0 else "failed"
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+        result["status"] = "timeout"
+    reader.join(timeout=5)
+
+    result["return_code"] = proc.returncode
+    result["finished_at"] = datetime.now().isoformat()
+    result["duration"] = round(time.monotonic() - started, 2)
+
+    if result["status"] == "success":
+        log(f"✓ [{stage.name}] completed in {result['duration']}s")
+    elif result["status"] == "timeout":
+        log(f"✗ [{stage.name}] timed out after {stage.timeout}s")
+    else:
+        log(f"⚠ [{stage.name}] exited with return code {proc.returncode}")
+    return result
+
+
+def _run_stage(stage: Stage, workspace: Path, env: Dict[str, str], log: Callable[[str], None],
+               use_cache: bool) -> Dict:
+    """Restore the stage from the cache if its key matches, else run it and store its outputs."""
+    key = None
+    if use_cache and stage.cacheable:
+        try:
+            key = stage_cache.stage_cache_key(stage, workspace)
+        except Exception as e:
+            log(f"⚠ [{stage.name}] could not compute cache key: {e}")
+        if key and stage_cache.restore(stage, key, workspace):
+            log(f"♻ [{stage.name}] cache hit ({key[:12]}), outputs restored")
+            now = datetime.now().isoformat()
+            return {"name": stage.name, "status": "success", "return_code": 0, "started_at": now,
+                    "finished_at": now, "duration": 0.0, "cached": True, "cache_key": key}
+
+    result = _run_stage_process(stage, workspace, env, log)
+    if key and result["status"] == "success":
+        if stage_cache.store(stage, key, workspace):
+            result["cache_key"] = key
+        else:
+            log(f"⚠ [{stage.name}] outputs missing or empty, not cached")
+    return result
+
+
+def run_pipeline(workspace: Optional[Path] = None,
+                 stages: Optional[List[Stage]] = None,
+                 max_parallel: Optional[int] = None,
+                 env: Optional[Dict[str, str]] = None,
+                 log: Callable[[str], None] = print,
+                 on_update: Optional[Callable[[Dict], None]] = None,
+                 use_cache: Optional[bool] = None,
+                 resume: bool = False) -> Dict[str, Dict]:
+    """Run the stage graph, starting each stage once its producers have finished.
+
+    use_cache defaults to the STAGE_CACHE environment switch (on unless "0").
+    With resume, stages the workspace checkpoint records as completed are kept
+    and only the remaining ones run.
+
+    on_update, if given, receives a stage's result dict whenever it starts,
+    finishes or is skipped. Returns a dict of per-stage results keyed by
+    stage name, in graph order.
+    """
+    workspace = Path(workspace or default_workspace()).resolve()
+    stages = stages or STAGES
+    deps = stage_dependencies(stages)
+    by_name = {s.name: s for s in stages}
+    if max_parallel is None:
+        max_parallel = int(os.environ.get("PIPELINE_MAX_PARALLEL", "4"))
+    max_parallel = max(1, max_parallel)
+    if use_cache is None:
+        use_cache = stage_cache.cache_enabled()
+
+    if env is None:
+        env = os.environ.copy()
+    # Lets stages continue their own saved state (e.g. ADK sessions) on a resumed run
+    env = dict(env, PIPELINE_RESUME="1" if resume else "0")
+    env.setdefault("PYTHONUNBUFFERED", "1")
+    env.setdefault("PYTHONIOENCODING", "utf-8")
+
+    def notify(stage_result: Dict):
+        if on_update:
+            try:
+                on_update(stage_result)
+            except Exception as e:
+                log(f"⚠ stage update callback failed: {e}")
+
+    results: Dict[str, Dict] = {}
+    pending = [s.name for s in stages]
+    running = {}
+
+    progress.emit("run_started", workspace, stage="pipeline", stages=[s.name for s in stages], resume=resume)
+    # Every run (fresh or resumed) gets the full LLM retry budget, shared by its stage processes
+    resilience.reset_retry_budget(workspace)
+    if resume:
+        recorded = checkpoint.load_checkpoint(workspace)["stages"]
+        for name in checkpoint.completed_stages(workspace, stages, deps):
+            pending.remove(name)
+            results[name] = dict(recorded[name], name=name, resumed=True)
+            log(f"⏩ [{name}] already completed, keeping its outputs")
+            progress.emit("stage_finished", workspace, stage=name, status="success", resumed=True)
+            notify(results[name])
+    else:
+        checkpoint.reset_checkpoint(workspace)
+        telemetry.reset_calls(workspace)
+
+    def finish(name: str, stage_result: Dict):
+        results[name] = stage_result
+        try:
+            checkpoint.record_stage(workspace, by_name[name], stage_result)
+        except Exception as e:
+            log(f"⚠ [{name}] could not update checkpoint: {e}")
+        progress.emit("stage_finished", workspace, stage=name, status=stage_result["status"],
+                      duration=stage_result.get("duration"), cached=stage_result.get("cached", False))
+        notify(stage_result)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_parallel) as pool:
+            while pending or running:
+                # Skip stages downstream of a failed critical stage
+                for name in list(pending):
+                    blocked_by = [d for d in deps[name]
+                                  if d in results and results[d]["status"] in ("failed", "timeout", "skipped")
+                                  and (by_name[d].critical or results[d]["status"] == "skipped")]
+                    if blocked_by:
+                        pending.remove(name)
+                        log(f"⏭ [{name}] skipped: upstream {', '.join(blocked_by)} did not complete")
+                        finish(name, {"name": name, "status": "skipped", "return_code": None,
+                                      "started_at": None, "finished_at": None, "duration": None, "cached": False})
+
+                for name in list(pending):
+                    if len(running) >= max_parallel:
+                        break
+                    if all(d in results for d in deps[name]):
+                        pending.remove(name)
+                        notify({"name": name, "status": "running", "started_at": datetime.now().isoformat()})
+                        progress.emit("stage_started", workspace, stage=name, description=by_name[name].description)
+                        running[pool.submit(_run_stage, by_name[name], workspace, env, log, use_cache)] = name
+
+                if not running:
+                    continue
+                finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    name = running.pop(fut)
+                    try:
+                        stage_result = fut.result()
+                    except Exception as e:
+                        log(f"✗ [{name}] crashed: {e}")
+                        stage_result = {"name": name, "status": "failed", "return_code": None,
+                                        "started_at": None, "finished_at": datetime.now().isoformat(), "duration": None,
+                                        "cached": False}
+                    finish(name, stage_result)
+    finally:
+        # Stage processes started outside a pipeline run fall back to per-process retry budgets
+        resilience.clear_retry_budget(workspace)
+
+    ordered = {s.name: results[s.name] for s in stages}
+    progress.emit("run_finished", workspace, stage="pipeline",
+                  statuses={name: res["status"] for name, res in ordered.items()})
+    return ordered
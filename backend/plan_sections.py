@@ -0,0 +1,125 @@
+"""Week/module sections of the planner agent's course plan.
+
+The plan is Markdown with one section per week or module ("## Week 3: ...",
+"### **Module 3 -** ...", "# Unit 3"). A section runs until the next heading
+of the same or a higher level. The planner stage uses this to fan resource
+curation out per module, the deep stage to fan lessons out per week
+(course_weeks() maps module sections onto the weeks the plan schedules).
+"""
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+PLAN_WEEK_RE = re.compile(r"^(#{1,6})\s*(?:\*\*)?\s*(week|module|unit)\s+(\d+)\b", re.IGNORECASE)
+# "Week 3", "Weeks 3-4", "Weeks 3 to 4" inside a module's section
+WEEK_RANGE_RE = re.compile(r"\bweeks?\s+(\d+)(?:\s*(?:-|–|—|to|through)\s*(\d+))?", re.IGNORECASE)
+PLAN_HEADING_RE = re.compile(r"^(#{1,6})\s")
+# Course overview sent with every week (the text before the first week section)
+PLAN_OVERVIEW_CHARS = int(os.getenv("DEEP_PLAN_OVERVIEW_CHARS", "6000"))
+
+
+def _line_weeks(lines: List[str]) -> List[Optional[int]]:
+    """The week whose section each line belongs to (None outside week sections)."""
+    owners: List[Optional[int]] = []
+    level, current = None, None
+    for line in lines:
+        week_match = PLAN_WEEK_RE.match(line)
+        if week_match and (level is None or len(week_match.group(1)) <= level):
+            level = len(week_match.group(1))
+            current = int(week_match.group(3))
+        elif current is not None:
+            heading_match = PLAN_HEADING_RE.match(line)
+            if heading_match and len(heading_match.group(1)) <= level:
+                current = None
+        owners.append(current)
+    return owners
+
+
+def split_plan_weeks(plan: str) -> Tuple[str, List[Tuple[int, str]]]:
+    """Split the course plan into (overview, [(week, week plan), ...]) on its Week/Module headings.
+
+    Sections repeating a week number (e.g. a later schedule section per module) join
+    that week. Returns no weeks when the plan has no recognizable week headings.
+    """
+    lines = plan.splitlines()
+    overview, sections = [], {}
+    for line, week in zip(lines, _line_weeks(lines)):
+        if week is not None:
+            sections.setdefault(week, []).append(line)
+        elif not sections:
+            overview.append(line)
+    weeks = [(week, "\n".join(sections[week]).strip()) for week in sorted(sections)]
+    return "\n".join(overview).strip()[:PLAN_OVERVIEW_CHARS], weeks
+
+
+def add_to_weeks(plan: str, additions: Dict[int, str], fallback_heading: str = "Additional Material") -> str:
+    """Insert additions[week] at the end of that week's (first) section of the plan.
+
+    Additions for weeks without a section are appended under fallback_heading.
+    """
+    lines = plan.splitlines()
+    owners = _line_weeks(lines)
+    pending = dict(additions)
+    merged: List[str] = []
+    for i, (line, week) in enumerate(zip(lines, owners)):
+        merged.append(line)
+        section_ends = i + 1 == len(lines) or owners[i + 1] != week
+        if week is not None and section_ends and week in pending:
+            merged.extend(["", pending.pop(week).strip(), ""])
+    if pending:
+        merged.extend(["", f"## {fallback_heading}", ""])
+        for week in sorted(pending):
+            merged.extend([pending[week].strip(), ""])
+    return "\n".join(merged).rstrip() + "\n"
+
+
+def _section_kind(plan: str) -> Optional[str]:
+    """"week" when the plan's sections are weeks, "module" for module/unit sections."""
+    for line in plan.splitlines():
+        match = PLAN_WEEK_RE.match(line)
+        if match:
+            return "week" if match.group(2).lower() == "week" else "module"
+    return None
+
+
+def _scheduled_weeks(module_plan: str) -> List[int]:
+    """Weeks a module's section mentions ("Week 3", "Weeks 3-4"), in order."""
+    weeks: List[int] = []
+    for match in WEEK_RANGE_RE.finditer(module_plan):
+        first = int(match.group(1))
+        last = int(match.group(2) or first)
+        for week in range(first, max(first, last) + 1):
+            if week not in weeks:
+                weeks.append(week)
+    return weeks
+
+
+def course_weeks(plan: str) -> Tuple[str, List[Tuple[int, str]], Optional[str]]:
+    """(overview, [(week, week plan), ...], kind) for the deep stage's per-week lessons.
+
+    kind is "week" when the plan has week sections (used as they are), "schedule"
+    when its module sections name the weeks they run ("Weeks 3-4") and those tile
+    weeks 1..N with no overlap (each module is split into one plan per week), and
+    "module" otherwise: one lesson per module, numbered 1..K in plan order, so the
+    course is checked against the module count rather than a guessed week count.
+    """
+    overview, sections = split_plan_weeks(plan)
+    kind = _section_kind(plan) if sections else None
+    if kind != "module":
+        return overview, sections, kind
+    owner: Dict[int, int] = {}
+    module_weeks = {}
+    for module, text in sections:
+        module_weeks[module] = [week for week in _scheduled_weeks(text) if week not in owner]
+        owner.update((week, module) for week in module_weeks[module])
+    if owner and all(module_weeks.values()) and sorted(owner) == list(range(1, len(owner) + 1)):
+        texts = dict(sections)
+        weeks = []
+        for week in sorted(owner):
+            module = owner[week]
+            part = module_weeks[module].index(week) + 1
+            title = texts[module].splitlines()[0].strip("# *")
+            weeks.append((week, f"## Week {week}: {title} (part {part} of {len(module_weeks[module])})\n\n"
+                                f"{texts[module]}"))
+        return overview, weeks, "schedule"
+    return overview, [(i, text) for i, (_, text) in enumerate(sections, 1)], "module"
@@ -1,6 +1,6 @@
 import os
 import re
-import json
+import asyncio
 import pathlib
 from typing import List, Dict, Optional
 
@@ -12,21 +12,29 @@ from pptx.dml.color import RGBColor
 
 # Import LLM helpers (optional)
 try:
-    from llm import get_gemini_client, get_google_search_tool, generate_course_content, system_prompt
+    from llm import (PDF_PAGES_PER_QUERY, get_gemini_client, generate_course_content, generate_course_content_async,
+                     get_shared_context, system_prompt)
+    from schemas import SLIDES_SCHEMA, parse_slides
 except Exception:
     get_gemini_client = None
-    get_google_search_tool = None
     generate_course_content = None
+    generate_course_content_async = None
+    get_shared_context = None
     system_prompt = None
+    PDF_PAGES_PER_QUERY = False
+    SLIDES_SCHEMA = None
+    parse_slides = None
 
+from workspace import job_from_args, io_dir, agent_files_dir, curriculum_path, load_config
+import progress
 
-def read_all_text_files() -> Dict[str, str]:
-    """Read all .txt files from "Inputs and Outputs" and "copilot/Inputs and Outputs".
+def read_all_text_files(workspace=None) -> Dict[str, str]:
+    """Read all .txt files from the workspace's "Inputs and Outputs" and "copilot/Inputs and Outputs".
     Keys are filenames (or prefixed with 'copilot/').
     """
     text_files_content: Dict[str, str] = {}
 
-    home_dir_path = pathlib.Path("Inputs and Outputs")
+    home_dir_path = io_dir(workspace)
     if home_dir_path.exists():
         for txt_file in home_dir_path.glob("*.txt"):
             try:
@@ -37,7 +45,7 @@ def read_all_text_files() -> Dict[str, str]:
                 except Exception:
                     pass
 
-    copilot_dir_path = pathlib.Path("copilot/Inputs and Outputs")
+    copilot_dir_path = agent_files_dir(workspace)
     if copilot_dir_path.exists():
         for txt_file in copilot_dir_path.glob("*.txt"):
             key = f"copilot/{txt_file.name}"
@@ -125,10 +133,9 @@ def extract_title_from_planner(text: str) -> Optional[str]:
     return None
 
 
-def get_subject_from_config() -> Optional[str]:
+def get_subject_from_config(workspace=None) -> Optional[str]:
     try:
-        with open('user_config.json', 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        data = load_config(workspace) or {}
         raw = data.get('subject') or data.get('course_subject') or data.get('course_name')
         if raw and isinstance(raw, str):
             cleaned = re.sub(r'[^\w\s-]', '', raw).strip().lower()
@@ -219,68 +226,117 @@ def _text_to_bullets(text: str) -> List[str]:
     return lines
 
 
-def _build_week_slide_outline_llm(course_title: str, week_title: str, week_content: str, planner_text: str) -> Optional[List[Dict[str, List[str]]]]:
+def _slide_outline_shared(planner_text: str, workspace=None) -> Dict:
+    """Inputs every week's outline call shares (system prompt, planner, curriculum PDF).
+
+    Outlines are requested as SLIDES_SCHEMA JSON, which cannot be combined with the
+    search tool, so neither the calls nor their shared context carry it.
+    """
+    return dict(
+        client=get_gemini_client(),
+        teaching_style="",
+        duration="",
+        difficulty_level="",
+        google_search_tool=None,
+        system_prompt=system_prompt,
+        filepath=curriculum_path(workspace),
+        course_content=f"PLANNER INPUT:\n{planner_text}",
+    )
+
+
+def _slide_outline_request(course_title: str, week_title: str, week_content: str, planner_text: str, workspace=None, cached_content=None) -> Dict:
+    """Keyword arguments for the generate call that outlines one week's slides.
+
+    The week-specific text goes in the task so the shared part can be served from a context cache.
+    """
+    task = (
+        "You are creating presentation slides for a course week.\n"
+        "Given the course title, week title, planner guidance, and raw week text, produce a JSON array of slides.\n"
+        "Each slide has a 'title' and 'bullets' (4-8 concise strings).\n"
+        "Constraints: No markdown, no numbering prefixes unless essential; keep bullets crisp, presentable, and non-redundant.\n"
+        "Prefer grouping into logical sections (Concepts, Example, Case Study, Exercise, Tips) if relevant.\n"
+        "Output ONLY the JSON, no prose.\n\n"
+        f"COURSE TITLE: {course_title}\n" 
+        f"WEEK TITLE: {week_title}\n\n"
+        f"WEEK RAW TEXT:\n{week_content}"
+    )
+    return dict(_slide_outline_shared(planner_text, workspace), task=task, cached_content=cached_content,
+                response_schema=SLIDES_SCHEMA, model_task="slide_outline", workspace=workspace,
+                pdf_query=f"{week_title}\n{week_content[:2000]}")
+
+
+def _parse_slide_outline(response) -> Optional[List[Dict[str, List[str]]]]:
+    """Validate the schema-constrained response into [{"title": str, "bullets": [str, ...]}]."""
+    slides = parse_slides(response)
+    cleaned = []
+    for item in slides:
+        title = item.title.strip() or 'Section'
+        bullets = [b.strip() for b in item.bullets if b.strip()]
+        if not bullets:
+            continue
+        cleaned.append({"title": title, "bullets": bullets[:8]})
+    return cleaned or None
+
+
+def _build_week_slide_outline_llm(course_title: str, week_title: str, week_content: str, planner_text: str, workspace=None) -> Optional[List[Dict[str, List[str]]]]:
     """Use LLM to create a clean slide outline for a week.
     Returns a list of dicts: {"title": str, "bullets": [str, ...]} or None on failure.
     """
-    if not (get_gemini_client and get_google_search_tool and generate_course_content and system_prompt):
+    if not (get_gemini_client and generate_course_content and parse_slides and system_prompt):
         return None
     try:
-        client = get_gemini_client()
-        tool = get_google_search_tool()
-        task = (
-            "You are creating presentation slides for a course week.\n"
-            "Given the course title, week title, planner guidance, and raw week text, produce a JSON array named 'slides'.\n"
-            "Each item must be an object with keys: 'title' (string) and 'bullets' (array of 4-8 concise strings).\n"
-            "Constraints: No markdown, no numbering prefixes unless essential; keep bullets crisp, presentable, and non-redundant.\n"
-            "Prefer grouping into logical sections (Concepts, Example, Case Study, Exercise, Tips) if relevant.\n"
-            "Output ONLY the JSON, no prose."
-        )
-        course_content = (
-            f"COURSE TITLE: {course_title}\n" 
-            f"WEEK TITLE: {week_title}\n\n"
-            f"PLANNER INPUT:\n{planner_text}\n\n"
-            f"WEEK RAW TEXT:\n{week_content}"
-        )
-        resp = generate_course_content(
-            client=client,
-            teaching_style="",
-            duration="",
-            difficulty_level="",
-            google_search_tool=tool,
-            system_prompt=system_prompt,
-            filepath=pathlib.Path("Inputs and Outputs/curriculum.pdf"),
-            course_content=course_content,
-            task=task,
-        )
-        text = resp.text or ""
-        # Extract JSON block if wrapped
-        json_str = text.strip()
-        # Try to find first '[' to last ']' for array
-        if '[' in json_str and ']' in json_str:
-            json_str = json_str[json_str.find('['): json_str.rfind(']') + 1]
-        slides = json.loads(json_str)
-        # Validate structure
-        cleaned = []
-        for item in slides:
-            title = str(item.get('title', '')).strip() or 'Section'
-            bullets = [str(b).strip() for b in (item.get('bullets') or []) if str(b).strip()]
-            if not bullets:
-                continue
-            cleaned.append({"title": title, "bullets": bullets[:8]})
-        return cleaned or None
+        resp = generate_course_content(**_slide_outline_request(course_title, week_title, week_content, planner_text, workspace))
+        return _parse_slide_outline(resp)
+    except Exception:
+        return None
+
+
+async def _build_week_slide_outline_llm_async(course_title: str, week_title: str, week_content: str, planner_text: str, workspace=None, cached_content=None) -> Optional[List[Dict[str, List[str]]]]:
+    """Async variant of _build_week_slide_outline_llm."""
+    if not (get_gemini_client and generate_course_content_async and parse_slides and system_prompt):
+        return None
+    try:
+        resp = await generate_course_content_async(**_slide_outline_request(course_title, week_title, week_content, planner_text, workspace, cached_content))
+        return _parse_slide_outline(resp)
     except Exception:
         return None
 
 
-def build_week_ppt(course_title: str, week_title: str, week_content: str, out_path: str, planner_text: str = ""):
+def build_all_slide_outlines(course_title: str, weeks: List[Dict], planner_text: str, workspace=None) -> List[Optional[List[Dict[str, List[str]]]]]:
+    """Outline every week's slides concurrently (bounded by GEMINI_MAX_CONCURRENCY), in week order.
+
+    The shared prefix (system prompt, planner text, curriculum) is cached once for all weeks.
+    When each week sends its own relevant curriculum pages, the cache leaves the PDF out.
+    """
+    cached_content = None
+    if get_shared_context and get_gemini_client and system_prompt:
+        shared = _slide_outline_shared(planner_text, workspace)
+        if PDF_PAGES_PER_QUERY:
+            shared["filepath"] = None
+        cached_content = get_shared_context(**shared, workspace=workspace, model_task="slide_outline")
+
+    async def outline_all():
+        return await asyncio.gather(*[
+            _build_week_slide_outline_llm_async(
+                course_title, w.get('title', f"Week {w.get('number', 1)}"), w.get('content', ''), planner_text, workspace,
+                cached_content
+            )
+            for w in weeks
+        ])
+    return asyncio.run(outline_all())
+
+
+def build_week_ppt(course_title: str, week_title: str, week_content: str, out_path: str, planner_text: str = "", workspace=None,
+                   llm_slides: Optional[List[Dict[str, List[str]]]] = None, fetch_outline: bool = True):
+    """Build one week's deck. Pass llm_slides (and fetch_outline=False) when the outline was prefetched."""
     prs = _new_presentation()
 
     # Title slide
     _add_title_slide(prs, course_title, week_title)
 
     # Try LLM-authored slide outline first
-    llm_slides = _build_week_slide_outline_llm(course_title, week_title, week_content, planner_text)
+    if llm_slides is None and fetch_outline:
+        llm_slides = _build_week_slide_outline_llm(course_title, week_title, week_content, planner_text, workspace)
     if llm_slides:
         for s in llm_slides:
             title = s.get('title', 'Section')
@@ -326,9 +382,9 @@ def build_week_ppt(course_title: str, week_title: str, week_content: str, out_pa
     prs.save(out_path)
 
 
-def main():
+def main(workspace=None):
     # Gather inputs similar to course_material.py
-    text_files = read_all_text_files()
+    text_files = read_all_text_files(workspace)
 
     combined_content = ""
     if 'enhanced_course_content.txt' in text_files:
@@ -361,7 +417,7 @@ def main():
     combined_content = '\n'.join(cleaned_lines)
 
     # Planner title
-    planner_path = pathlib.Path("Inputs and Outputs/planner_agent_instruction.txt")
+    planner_path = io_dir(workspace) / "planner_agent_instruction.txt"
     planner_text = ""
     if planner_path.exists():
         try:
@@ -371,7 +427,7 @@ def main():
 
     course_title = extract_title_from_planner(planner_text) or extract_course_name_from_content(planner_text or combined_content)
     if not course_title or course_title == 'course_material':
-        subject = get_subject_from_config()
+        subject = get_subject_from_config(workspace)
         if subject:
             course_title = subject.replace('_', ' ').title()
         else:
@@ -381,19 +437,24 @@ def main():
     weeks = _parse_weeks_simple(combined_content)
 
     # Output dir
-    out_dir = os.path.join("Inputs and Outputs", "ppts")
+    out_dir = os.path.join(io_dir(workspace), "ppts")
     os.makedirs(out_dir, exist_ok=True)
 
-    # Generate one PPT per week
-    for w in weeks:
+    # Outline all weeks concurrently, then generate one PPT per week
+    outlines = build_all_slide_outlines(course_title, weeks, planner_text, workspace) if weeks else []
+    for index, (w, outline) in enumerate(zip(weeks, outlines), 1):
         week_num = w.get('number', 1)
         week_title = w.get('title', f"Week {week_num}")
         content = w.get('content', '')
         filename = f"{sanitize_filename(course_title)}_Week_{week_num:02}.pptx"
         out_path = os.path.join(out_dir, filename)
-        build_week_ppt(course_title, week_title, content, out_path, planner_text=planner_text)
+        build_week_ppt(course_title, week_title, content, out_path, planner_text=planner_text, workspace=workspace,
+                       llm_slides=outline, fetch_outline=False)
         print(f"Created: {out_path}")
+        progress.emit("artifact_completed", workspace, kind="ppt", index=index, total=len(weeks),
+                      week=week_num, path=out_path)
 
 
 if __name__ == "__main__":
-    main()
+    with job_from_args() as workspace:
+        main(workspace)
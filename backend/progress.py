@@ -0,0 +1,76 @@
+"""Progress events for a workspace's generation run.
+
+Stages (and the pipeline around them) append one JSON object per line to the
+workspace's `events.jsonl`. Lines are short single writes in append mode, so
+concurrent stage processes can share the file. The API tails it to stream
+Server-Sent Events (GET /jobs/{job_id}/events).
+
+Event fields: `ts`, `event` and `stage` (the current job's stage, see
+workspace.job_context, which every stage process enters), plus event-specific data such as
+`week`, `kind`, `index`, `total` and `path`.
+"""
+import json
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from workspace import current_stage, default_workspace
+
+EVENTS_FILE = "events.jsonl"
+
+_lock = threading.Lock()
+
+
+def events_path(workspace: Optional[Path] = None) -> Path:
+    return Path(workspace or default_workspace()) / EVENTS_FILE
+
+
+def emit(event: str, workspace: Optional[Path] = None, stage: Optional[str] = None, **data) -> Dict:
+    """Append one progress event. Never raises: progress is best effort."""
+    record = {
+        "ts": datetime.now().isoformat(),
+        "event": event,
+        "stage": stage or current_stage(),
+    }
+    record.update(data)
+    try:
+        path = events_path(workspace)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        line = json.dumps(record, default=str) + "\n"
+        with _lock, open(path, "a", encoding="utf-8") as f:
+            f.write(line)
+    except Exception as e:
+        print(f"⚠ Could not record progress event '{event}': {e}")
+    return record
+
+
+def events_offset(workspace: Optional[Path] = None) -> int:
+    """Current end of the events file; events written later start at this offset."""
+    path = events_path(workspace)
+    return path.stat().st_size if path.exists() else 0
+
+
+def read_events(workspace: Optional[Path], offset: int = 0) -> Tuple[List[Tuple[int, Dict]], int]:
+    """Return (end offset, event) pairs written after offset, and the offset to continue from.
+
+    Each event's end offset can be handed back as `offset` to resume right after it.
+    """
+    path = events_path(workspace)
+    if not path.exists():
+        return [], offset
+    events = []
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read()
+    # Only consume whole lines; a partially written line is picked up next time
+    position = offset
+    for raw in data.splitlines(keepends=True):
+        if not raw.endswith(b"\n"):
+            break
+        position += len(raw)
+        try:
+            events.append((position, json.loads(raw.decode("utf-8"))))
+        except Exception:
+            continue
+    return events, position
@@ -1,10 +1,12 @@
 import os
-import pathlib
+import asyncio
 import re
 from google import genai
-from google.genai import types
 from dotenv import load_dotenv
-from llm import generate_course_content, load_user_inputs
+from llm import generate_course_content_async, get_gemini_client, load_user_inputs
+from retrieval import build_course_index, format_chunks
+from workspace import job_from_args, io_dir
+import progress
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
@@ -13,7 +15,17 @@ from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_JUSTIFY
 
 load_dotenv()
 
-def generate_single_quiz(client, google_search_tool, system_prompt, combined_content, quiz_number, quiz_theme, user_config):
+# Chunks of each week's text retrieved for every quiz, so quizzes still cover the whole course
+QUIZ_CHUNKS_PER_WEEK = int(os.getenv("QUIZ_CHUNKS_PER_WEEK", "2"))
+
+# Retrieval query per quiz theme (mirrors the themes described in the system prompt)
+QUIZ_THEME_QUERIES = {
+    "Foundation and Analysis": "core concepts fundamental principles definitions key terms analysis",
+    "Application and Synthesis": "practical applications examples real-world problem solving combining concepts case study exercise",
+    "Evaluation and Innovation": "critical evaluation trade-offs advantages limitations advanced applications design creative solutions",
+}
+
+async def generate_single_quiz(client, google_search_tool, system_prompt, course_context, quiz_number, quiz_theme, user_config, workspace=None):
     # Create specific task for this quiz
     task = f"""
 GENERATE ONLY ONE QUIZ PAPER:
@@ -38,15 +50,17 @@ Format the output as a single, complete quiz paper ready for students to take in
     print(f"🔄 Generating Quiz Paper {quiz_number}: {quiz_theme}...")
     
     try:
-        response = generate_course_content(
+        response = await generate_course_content_async(
             client=client,
             teaching_style=user_config.get('teaching_style', 'Project-Based / Hands-On'),
             duration=user_config.get('duration', '6 weeks'),
             difficulty_level=user_config.get('difficulty_level', 'intermediate'),
             google_search_tool=google_search_tool,
             system_prompt=system_prompt,
-            course_content=combined_content,
-            task=task
+            course_content=course_context,
+            task=task,
+            model_task="quizzes",
+            workspace=workspace,
         )
         
         if not response or not hasattr(response, 'text') or not response.text:
@@ -348,12 +362,12 @@ def save_all_quizzes_as_pdfs(quiz_text, output_dir):
     
     return pdf_files
 
-def read_course_content_files():
+def read_course_content_files(workspace=None):
     planner_content = ""
     deep_content = ""
     
-    # Read from home directory "Inputs and Outputs"
-    home_dir_path = pathlib.Path("Inputs and Outputs")
+    # Read from the workspace's "Inputs and Outputs"
+    home_dir_path = io_dir(workspace)
     
     # Try to read planner agent instruction (directly in Inputs and Outputs)
     planner_file = home_dir_path / "planner_agent_instruction.txt"
@@ -575,12 +589,12 @@ Then provide your comprehensive analysis of the course content followed by the t
 
     return system_prompt
 
-def generate_quizzes():
+def generate_quizzes(workspace=None):
     print("🎯 Starting Quiz Generation Process...")
     print("="*60)
     
     # Load user configuration
-    user_config = load_user_inputs()
+    user_config = load_user_inputs(workspace)
     if not user_config:
         print("❌ No user configuration found. Please run the main application first.")
         return
@@ -590,25 +604,22 @@ def generate_quizzes():
     
     # Read course content from both directories
     print("\n📚 Reading course content files...")
-    planner_content, deep_content = read_course_content_files()
+    planner_content, deep_content = read_course_content_files(workspace)
     
     if not planner_content and not deep_content:
         print("❌ No course content found in either directory. Please ensure content files exist.")
         return
     
-    # Create combined content input
-    combined_content = f"""
-=== COURSE PLAN CONTENT ===
-{planner_content}
-
-=== DETAILED COURSE CONTENT ===
-{deep_content}
-"""
-    
-    print(f"✅ Combined content length: {len(combined_content)} characters")
+    # Each quiz gets only the course chunks relevant to its theme, from every week
+    index = build_course_index(("plan", planner_content), ("course", deep_content))
+    quiz_contexts = {}
+    for theme in QUIZ_THEME_QUERIES:
+        chunks = index.search_per_week(f"{theme} {QUIZ_THEME_QUERIES[theme]}", per_week=QUIZ_CHUNKS_PER_WEEK)
+        quiz_contexts[theme] = format_chunks(chunks)
+        print(f"✅ {theme}: {len(chunks)} chunks, {len(quiz_contexts[theme])} characters of course content")
     
     # Initialize LLM client
-    client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+    client = get_gemini_client()
     
     # Configure Google Search tool
     google_search_tool = genai.types.Tool(
@@ -619,39 +630,42 @@ def generate_quizzes():
     system_prompt = create_quiz_system_prompt(difficulty_level)
     
     # Define quiz themes
-    quiz_themes = [
-        "Foundation and Analysis",
-        "Application and Synthesis", 
-        "Evaluation and Innovation"
-    ]
+    quiz_themes = list(QUIZ_THEME_QUERIES)
     
     print("\n🧠 Generating individual quiz papers...")
     
     # Ensure output directory exists under Inputs and Outputs
-    output_dir = os.path.join("Inputs and Outputs", "quizzes")
+    output_dir = os.path.join(io_dir(workspace), "quizzes")
     os.makedirs(output_dir, exist_ok=True)
     print(f"📁 Created quizzes output directory: {output_dir}")
     
     generated_files = []
     
-    # Generate each quiz individually
-    for i, theme in enumerate(quiz_themes, 1):
+    # Request every quiz at once (bounded by GEMINI_MAX_CONCURRENCY), then save them in order
+    async def generate_all():
+        return await asyncio.gather(*[
+            generate_single_quiz(
+                client=client,
+                google_search_tool=google_search_tool,
+                system_prompt=system_prompt,
+                course_context=quiz_contexts[theme],
+                quiz_number=i,
+                quiz_theme=theme,
+                user_config=user_config,
+                workspace=workspace,
+            )
+            for i, theme in enumerate(quiz_themes, 1)
+        ])
+    
+    print(f"🚀 Generating {len(quiz_themes)} quizzes concurrently...")
+    quiz_contents = asyncio.run(generate_all())
+    
+    for i, (theme, quiz_content) in enumerate(zip(quiz_themes, quiz_contents), 1):
         print(f"\n{'='*40}")
-        print(f"🎯 GENERATING QUIZ {i} OF 3")
+        print(f"🎯 SAVING QUIZ {i} OF {len(quiz_themes)}")
         print(f"📋 Theme: {theme}")
         print(f"{'='*40}")
         
-        # Generate single quiz
-        quiz_content = generate_single_quiz(
-            client=client,
-            google_search_tool=google_search_tool,
-            system_prompt=system_prompt,
-            combined_content=combined_content,
-            quiz_number=i,
-            quiz_theme=theme,
-            user_config=user_config
-        )
-        
         if quiz_content:
             # Save as TXT and convert to PDF
             txt_path, pdf_path = save_quiz_as_txt_and_pdf(
@@ -669,6 +683,8 @@ def generate_quizzes():
                     'pdf_path': pdf_path
                 })
                 print(f"✅ Quiz {i} completed successfully!")
+                progress.emit("artifact_completed", workspace, kind="quiz", index=i,
+                              total=len(quiz_themes), path=pdf_path)
             else:
                 print(f"❌ Failed to save Quiz {i}")
         else:
@@ -694,8 +710,8 @@ def generate_quizzes():
         print("❌ No quiz papers were generated successfully.")
         return None
 
-def main():
-    generated_quizzes = generate_quizzes()
+def main(workspace=None):
+    generated_quizzes = generate_quizzes(workspace)
     
     if generated_quizzes:
         print("\n🎉 Quiz generation process completed successfully!")
@@ -710,4 +726,5 @@ def main():
         print("\n❌ Quiz generation failed. Please check the error messages above.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    with job_from_args() as workspace:
+        main(workspace)
\ No newline at end of file
@@ -0,0 +1,324 @@
+"""Host-wide adaptive (AIMD) concurrency limiter for Gemini requests.
+
+Every Gemini request on the host, from any job, stage process or ADK agent,
+takes a lease from this limiter first. Per model, a small JSON state file
+(guarded by flock) holds:
+
+- the current concurrency limit, raised additively (+1 per `limit` successful
+  requests) and cut multiplicatively (x0.5) on a 429, at most once per
+  GEMINI_AIMD_CUT_INTERVAL seconds so one burst of 429s counts as one signal;
+- the in-flight leases, each expiring after GEMINI_LEASE_TTL seconds or when
+  its process is gone, so a crashed stage cannot hold capacity;
+- the tokens used over the last minute, checked against GEMINI_TPM_LIMIT
+  (0 disables the token check).
+
+Without fcntl (Windows) the same logic runs per process.
+"""
+import asyncio
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Optional
+
+import telemetry
+from model_routes import model_for
+from resilience import RATE_LIMITED, classify_error
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+LIMITER_DIR = Path(os.getenv("GEMINI_LIMITER_DIR", Path(tempfile.gettempdir()) / "ai_copilot_gemini_limiter"))
+AIMD_INITIAL = float(os.getenv("GEMINI_AIMD_INITIAL", "4"))
+AIMD_MIN = float(os.getenv("GEMINI_AIMD_MIN", "1"))
+AIMD_MAX = float(os.getenv("GEMINI_AIMD_MAX", "32"))
+AIMD_DECREASE = float(os.getenv("GEMINI_AIMD_DECREASE", "0.5"))
+AIMD_CUT_INTERVAL = float(os.getenv("GEMINI_AIMD_CUT_INTERVAL", "10"))
+LEASE_TTL = float(os.getenv("GEMINI_LEASE_TTL", "600"))
+TPM_LIMIT = int(os.getenv("GEMINI_TPM_LIMIT", "0"))
+ACQUIRE_TIMEOUT = float(os.getenv("GEMINI_ACQUIRE_TIMEOUT", "900"))
+
+_local_states: Dict[str, Dict] = {}
+_local_lock = threading.Lock()
+
+
+def _new_state() -> Dict:
+    return {"limit": AIMD_INITIAL, "leases": {}, "tokens": [], "last_cut": 0.0,
+            "successes": 0, "rate_limited": 0}
+
+
+def _pid_alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except Exception:
+        return True
+    return True
+
+
+def _prune(state: Dict, now: float):
+    state["leases"] = {
+        lease_id: lease for lease_id, lease in state["leases"].items()
+        if lease["expires_at"] > now and _pid_alive(lease["pid"])
+    }
+    state["tokens"] = [entry for entry in state["tokens"] if entry[0] > now - 60]
+
+
+@contextmanager
+def _locked_state(model: str):
+    """Yield the model's mutable state under a host-wide (or process-wide) lock."""
+    if fcntl is None:
+        with _local_lock:
+            state = _local_states.setdefault(model, _new_state())
+            yield state
+        return
+    LIMITER_DIR.mkdir(parents=True, exist_ok=True)
+    path = LIMITER_DIR / f"{model.replace('/', '_')}.json"
+    with open(path, "a+", encoding="utf-8") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            f.seek(0)
+            try:
+                state = json.loads(f.read() or "{}") or _new_state()
+            except ValueError:
+                state = _new_state()
+            yield state
+            f.seek(0)
+            f.truncate()
+            f.write(json.dumps(state))
+            f.flush()
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _try_acquire(model: str) -> Optional[str]:
+    now = time.time()
+    with _locked_state(model) as state:
+        _prune(state, now)
+        if len(state["leases"]) >= max(1, int(state["limit"])):
+            return None
+        if TPM_LIMIT and sum(entry[1] for entry in state["tokens"]) >= TPM_LIMIT:
+            return None
+        lease_id = uuid.uuid4().hex
+        state["leases"][lease_id] = {"pid": os.getpid(), "acquired_at": now, "expires_at": now + LEASE_TTL}
+        return lease_id
+
+
+def _backoff(waited: float, model: str):
+    if waited > ACQUIRE_TIMEOUT:
+        raise TimeoutError(f"No {model} capacity after {ACQUIRE_TIMEOUT:.0f}s")
+    return random.uniform(0.2, 1.0)
+
+
+def acquire(model: str) -> str:
+    """Block until a lease for model is available and return its id."""
+    started = time.monotonic()
+    while True:
+        lease_id = _try_acquire(model)
+        if lease_id:
+            return lease_id
+        time.sleep(_backoff(time.monotonic() - started, model))
+
+
+async def acquire_async(model: str) -> str:
+    """Async acquire; the locked state file is read in a worker thread and waits use
+    asyncio.sleep, so other tasks keep running."""
+    started = time.monotonic()
+    while True:
+        lease_id = await asyncio.to_thread(_try_acquire, model)
+        if lease_id:
+            return lease_id
+        await asyncio.sleep(_backoff(time.monotonic() - started, model))
+
+
+def release(model: str, lease_id: Optional[str], outcome: str = "success", tokens: int = 0):
+    """Return a lease and feed the outcome into the AIMD limit.
+
+    outcome is "success", "rate_limited" or anything else (neutral: the limit is unchanged).
+    """
+    now = time.time()
+    try:
+        with _locked_state(model) as state:
+            state["leases"].pop(lease_id, None)
+            if tokens:
+                state["tokens"].append([now, int(tokens)])
+            if outcome == "success":
+                # Additive increase: +1 after `limit` successes
+                state["successes"] += 1
+                if state["successes"] >= int(state["limit"]):
+                    state["successes"] = 0
+                    state["limit"] = min(AIMD_MAX, state["limit"] + 1)
+            elif outcome == "rate_limited":
+                state["rate_limited"] += 1
+                state["successes"] = 0
+                if now - state["last_cut"] >= AIMD_CUT_INTERVAL:
+                    state["limit"] = max(AIMD_MIN, state["limit"] * AIMD_DECREASE)
+                    state["last_cut"] = now
+                    print(f"🚦 {model}: rate limited, concurrency cut to {int(state['limit'])}")
+            _prune(state, now)
+    except Exception as e:
+        print(f"⚠️ Could not release {model} lease: {e}")
+
+
+async def release_async(model: str, lease_id: Optional[str], outcome: str = "success", tokens: int = 0):
+    """release() in a worker thread, off the event loop."""
+    await asyncio.to_thread(release, model, lease_id, outcome, tokens)
+
+
+def _usage_tokens(response) -> int:
+    usage = getattr(response, "usage_metadata", None)
+    return int(getattr(usage, "total_token_count", 0) or 0)
+
+
+def outcome_for(exc: Optional[BaseException]) -> str:
+    if exc is None:
+        return "success"
+    return "rate_limited" if classify_error(exc) == RATE_LIMITED else "error"
+
+
+class Slot:
+    """Lease held for one request; call record(response) to count its tokens."""
+
+    def __init__(self, model: str, lease_id: str):
+        self.model = model
+        self.lease_id = lease_id
+        self.tokens = 0
+
+    def record(self, response):
+        self.tokens = _usage_tokens(response)
+        return response
+
+
+@contextmanager
+def slot(model: str):
+    """Hold a lease for the duration of one request."""
+    held = Slot(model, acquire(model))
+    try:
+        yield held
+    except BaseException as e:
+        release(model, held.lease_id, outcome_for(e), held.tokens)
+        raise
+    release(model, held.lease_id, "success", held.tokens)
+
+
+class _AsyncSlot:
+    def __init__(self, model: str):
+        self.model = model
+        self.held: Optional[Slot] = None
+
+    async def __aenter__(self) -> Slot:
+        self.held = Slot(self.model, await acquire_async(self.model))
+        return self.held
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await release_async(self.model, self.held.lease_id, outcome_for(exc), self.held.tokens)
+        return False
+
+
+def slot_async(model: str) -> _AsyncSlot:
+    """Async counterpart of slot()."""
+    return _AsyncSlot(model)
+
+
+def snapshot(model: str) -> Dict:
+    """Current limit, in-flight leases and tokens over the last minute for model."""
+    with _locked_state(model) as state:
+        _prune(state, time.time())
+        return {"model": model, "limit": int(state["limit"]), "in_flight": len(state["leases"]),
+                "tokens_last_minute": sum(entry[1] for entry in state["tokens"]),
+                "rate_limited": state["rate_limited"]}
+
+
+# ADK agents: leases are taken in before_model_callback and returned in
+# after_model_callback (on the final response of a streamed call) or
+# on_model_error_callback, keyed by invocation and agent
+_adk_leases: Dict[tuple, list] = {}  # key -> [{"lease_id", "started", "queue", "first_token"}, ...]
+_adk_lock = threading.Lock()
+
+
+def adk_callbacks(model: str, task: Optional[str] = None) -> Dict:
+    """Callbacks that make an ADK LlmAgent acquire from the limiter around each model call.
+
+    With task, each call is also recorded in the job's LLM call telemetry under that routing task.
+    """
+
+    def key(callback_context):
+        return (getattr(callback_context, "invocation_id", None), getattr(callback_context, "agent_name", None))
+
+    def pop(callback_context) -> Optional[Dict]:
+        with _adk_lock:
+            leases = _adk_leases.get(key(callback_context))
+            if not leases:
+                return None
+            held = leases.pop()
+            if not leases:
+                _adk_leases.pop(key(callback_context), None)
+            return held
+
+    def first_token(callback_context):
+        with _adk_lock:
+            leases = _adk_leases.get(key(callback_context))
+            if leases and leases[-1]["first_token"] is None:
+                leases[-1]["first_token"] = time.monotonic()
+
+    async def before_model(callback_context, llm_request):
+        waiting = time.monotonic()
+        lease_id = await acquire_async(model)
+        started = time.monotonic()
+        with _adk_lock:
+            _adk_leases.setdefault(key(callback_context), []).append(
+                {"lease_id": lease_id, "started": started, "queue": started - waiting, "first_token": None})
+        return None
+
+    async def after_model(callback_context, llm_response):
+        # Streaming calls this per chunk: the first marks the first token, and the
+        # lease is held until the final (non-partial) response ends the call
+        first_token(callback_context)
+        if getattr(llm_response, "partial", False):
+            return None
+        held = pop(callback_context)
+        if held:
+            await release_async(model, held["lease_id"], "success", _usage_tokens(llm_response))
+            if task:
+                metadata = getattr(llm_response, "grounding_metadata", None)
+                await asyncio.to_thread(telemetry.record_call, task, model, time.monotonic() - held["started"], llm_response,
+                                      ttft_seconds=held["first_token"] - held["started"], queue_seconds=held["queue"],
+                                      grounding_queries=getattr(metadata, "web_search_queries", None))
+        return None
+
+    async def on_model_error(callback_context, llm_request, error):
+        held = pop(callback_context)
+        if held:
+            await release_async(model, held["lease_id"], outcome_for(error))
+            if task:
+                ttft = held["first_token"] - held["started"] if held["first_token"] is not None else None
+                await asyncio.to_thread(telemetry.record_call, task, model, time.monotonic() - held["started"], ok=False,
+                                      ttft_seconds=ttft, queue_seconds=held["queue"],
+                                      error=f"{type(error).__name__}: {error}"[:300])
+        return None
+
+    return {
+        "before_model_callback": before_model,
+        "after_model_callback": after_model,
+        "on_model_error_callback": on_model_error,
+    }
+
+
+def agent_callbacks(task: str) -> Dict:
+    """adk_callbacks() for an LlmAgent running the routing task on its routed model.
+
+    Pass them as the agent's keyword arguments (**agent_callbacks(task)): every
+    model call of the agent then takes a lease from the same host-wide limit as
+    the generators and is recorded in the job's call telemetry under task.
+    """
+    return adk_callbacks(model_for(task), task=task)
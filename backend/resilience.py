@@ -0,0 +1,307 @@
+"""Retry, backoff and circuit breaking for Gemini calls.
+
+call_with_retries / call_with_retries_async wrap a single request:
+
+- errors are classified as rate limits (429 / RESOURCE_EXHAUSTED), transient
+  server or network failures (5xx, timeouts, dropped connections) or fatal
+  errors (other 4xx, bad requests), and only the first two are retried;
+- retries back off exponentially with full jitter, and honour the server's
+  Retry-After header or RetryInfo delay when it gives one;
+- a per-model circuit breaker opens after consecutive transient failures so a
+  struggling model is probed by one request instead of every caller at once;
+- a per-job retry budget, kept in the job workspace while a pipeline run is
+  going on and shared by all its stage processes, caps the total number of
+  retries a run may spend; outside a pipeline run (standalone scripts, adk web)
+  each process has its own budget.
+"""
+import asyncio
+import json
+import os
+import random
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+from workspace import default_workspace
+
+try:
+    import fcntl
+except ImportError:  # Windows: the budget falls back to per-process counting
+    fcntl = None
+
+LLM_MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", "5"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "2.0"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "60"))
+LLM_RETRY_BUDGET = int(os.getenv("LLM_RETRY_BUDGET", "30"))
+LLM_BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", "5"))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "60"))
+
+RETRY_BUDGET_FILE = "retry_budget.json"
+
+RATE_LIMITED = "rate_limited"
+TRANSIENT = "transient"
+FATAL = "fatal"
+
+_TRANSIENT_CODES = {408, 500, 502, 503, 504}
+_TRANSIENT_EXCEPTIONS = ("Timeout", "ConnectError", "ReadError", "RemoteProtocolError",
+                         "ConnectionError", "ConnectionResetError", "ServerDisconnectedError")
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised when a model's circuit is open and the caller ran out of attempts waiting."""
+
+
+class RetryBudgetExhausted(RuntimeError):
+    """Raised when a transient error arrives after the job's retry budget is spent."""
+
+
+def classify_error(exc: BaseException) -> str:
+    """Return RATE_LIMITED, TRANSIENT or FATAL for an exception raised by a Gemini call."""
+    code = getattr(exc, "code", None)
+    status = str(getattr(exc, "status", "") or "")
+    if code == 429 or status == "RESOURCE_EXHAUSTED":
+        return RATE_LIMITED
+    if isinstance(code, int) and (code in _TRANSIENT_CODES or code >= 500):
+        return TRANSIENT
+    if status in ("UNAVAILABLE", "DEADLINE_EXCEEDED", "INTERNAL"):
+        return TRANSIENT
+    if isinstance(exc, (TimeoutError, ConnectionError, asyncio.TimeoutError)):
+        return TRANSIENT
+    if any(name in type(exc).__name__ for name in _TRANSIENT_EXCEPTIONS):
+        return TRANSIENT
+    return FATAL
+
+
+def retry_after_seconds(exc: BaseException) -> Optional[float]:
+    """Server-requested delay from a Retry-After header or a RetryInfo detail, if any."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers:
+        value = headers.get("retry-after") or headers.get("Retry-After")
+        if value:
+            try:
+                return max(0.0, float(value))
+            except ValueError:
+                pass
+    details = getattr(exc, "details", None)
+    text = json.dumps(details, default=str) if details else str(exc)
+    match = re.search(r'"?retryDelay"?\s*[:=]\s*"?(\d+(?:\.\d+)?)s', text)
+    if match:
+        return float(match.group(1))
+    return None
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """Full-jitter exponential backoff; never shorter than the server's Retry-After."""
+    delay = random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * (2 ** attempt)))
+    if retry_after is not None:
+        # Spread callers released by the same Retry-After over a short window
+        delay = retry_after + random.uniform(0, min(5.0, LLM_BACKOFF_BASE))
+    return delay
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker for one model (closed -> open -> half-open)."""
+
+    def __init__(self, threshold: int = LLM_BREAKER_THRESHOLD, cooldown: float = LLM_BREAKER_COOLDOWN):
+        self.threshold = max(1, threshold)
+        self.cooldown = cooldown
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def wait_time(self) -> float:
+        """Seconds the caller should wait before calling; 0 means go ahead."""
+        return self.acquire()[0]
+
+    def acquire(self):
+        """(seconds to wait, whether the caller is the half-open probe); 0 seconds means go ahead."""
+        with self._lock:
+            if self._opened_at is None:
+                return 0.0, False
+            remaining = self._opened_at + self.cooldown - time.monotonic()
+            if remaining > 0:
+                return remaining, False
+            # Half-open: let a single probe through, everyone else waits for its outcome
+            if self._probing:
+                return min(self.cooldown, 5.0), False
+            self._probing = True
+            return 0.0, True
+
+    def end_probe(self):
+        """Let another caller probe if this probe ended without an outcome (e.g. it was cancelled)."""
+        with self._lock:
+            self._probing = False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.threshold:
+                if self._opened_at is None or self._probing:
+                    print(f"⚡ Circuit opened after {self._failures} consecutive failures; cooling down {self.cooldown:.0f}s")
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            return "half_open" if time.monotonic() >= self._opened_at + self.cooldown else "open"
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(model: str) -> CircuitBreaker:
+    with _breakers_lock:
+        if model not in _breakers:
+            _breakers[model] = CircuitBreaker()
+        return _breakers[model]
+
+
+# Retries used outside a pipeline run, per workspace: the API process lives across jobs
+_local_budget_used: Dict[str, int] = {}
+_local_budget_lock = threading.Lock()
+
+
+def _budget_path(workspace: Optional[Path] = None) -> Path:
+    return Path(workspace or default_workspace()) / RETRY_BUDGET_FILE
+
+
+def reset_retry_budget(workspace: Optional[Path] = None, budget: int = LLM_RETRY_BUDGET):
+    """Start a run with a fresh retry budget (called by the pipeline)."""
+    path = _budget_path(workspace)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({"budget": budget, "used": 0}), encoding="utf-8")
+    with _local_budget_lock:
+        _local_budget_used.pop(str(path.parent), None)
+
+
+def clear_retry_budget(workspace: Optional[Path] = None):
+    """End the run's shared budget (called by the pipeline when the run is over)."""
+    _budget_path(workspace).unlink(missing_ok=True)
+
+
+def take_retry(workspace: Optional[Path] = None) -> bool:
+    """Consume one retry from the job's budget; False once it is spent.
+
+    Without a budget file (no pipeline run in progress) the budget is kept in this
+    process, per workspace, and starts over when the workspace's next run starts.
+    """
+    path = _budget_path(workspace)
+    if fcntl is None or not path.exists():
+        key = str(path.parent)
+        with _local_budget_lock:
+            used = _local_budget_used.get(key, 0)
+            if used >= LLM_RETRY_BUDGET:
+                return False
+            _local_budget_used[key] = used + 1
+            return True
+    with open(path, "a+", encoding="utf-8") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            f.seek(0)
+            try:
+                state = json.loads(f.read() or "{}")
+            except ValueError:
+                state = {}
+            budget = int(state.get("budget", LLM_RETRY_BUDGET))
+            used = int(state.get("used", 0))
+            if used >= budget:
+                return False
+            state.update(budget=budget, used=used + 1)
+            f.seek(0)
+            f.truncate()
+            f.write(json.dumps(state))
+            f.flush()
+            return True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _next_delay(exc: BaseException, attempt: int, max_attempts: int, breaker: CircuitBreaker,
+                description: str, workspace: Optional[Path] = None) -> float:
+    """Record a failed attempt and return how long to wait, or re-raise if it should not be retried."""
+    kind = classify_error(exc)
+    if kind == FATAL:
+        # The service answered, so this says nothing about the model's health
+        breaker.record_success()
+        raise exc
+    if kind == TRANSIENT:
+        # 429s are quota, not an outage: backoff and the rate limiter handle them
+        breaker.record_failure()
+    if attempt + 1 >= max_attempts:
+        print(f"❌ {description}: giving up after {max_attempts} attempts ({kind}): {exc}")
+        raise exc
+    if not take_retry(workspace):
+        print(f"❌ {description}: retry budget for this job is spent ({kind}): {exc}")
+        raise RetryBudgetExhausted(str(exc)) from exc
+    delay = backoff_delay(attempt, retry_after_seconds(exc))
+    print(f"⏳ {description}: {kind} error, retrying in {delay:.1f}s (attempt {attempt + 2}/{max_attempts}): {exc}")
+    return delay
+
+
+def call_with_retries(fn: Callable, model: str = "gemini", description: str = "LLM call",
+                      max_attempts: int = LLM_MAX_ATTEMPTS, workspace: Optional[Path] = None):
+    """Call fn() with classified retries, backoff and the model's circuit breaker.
+
+    Retries are taken from the retry budget of workspace (the job's workspace).
+    """
+    breaker = get_breaker(model)
+    for attempt in range(max(1, max_attempts)):
+        wait, probe = breaker.acquire()
+        if wait > 0:
+            if attempt + 1 >= max_attempts:
+                raise CircuitOpenError(f"{description}: circuit for {model} is open")
+            time.sleep(wait + random.uniform(0, 1))
+            continue
+        try:
+            result = fn()
+            breaker.record_success()
+        except Exception as e:
+            delay = _next_delay(e, attempt, max_attempts, breaker, description, workspace)
+            time.sleep(delay)
+            continue
+        finally:
+            # A probe cancelled mid-call recorded no outcome; don't block the model for good
+            if probe:
+                breaker.end_probe()
+        return result
+    raise CircuitOpenError(f"{description}: circuit for {model} stayed open")
+
+
+async def call_with_retries_async(fn: Callable, model: str = "gemini", description: str = "LLM call",
+                                  max_attempts: int = LLM_MAX_ATTEMPTS, workspace: Optional[Path] = None):
+    """Async counterpart of call_with_retries; fn() must return a fresh awaitable per attempt."""
+    breaker = get_breaker(model)
+    for attempt in range(max(1, max_attempts)):
+        wait, probe = breaker.acquire()
+        if wait > 0:
+            if attempt + 1 >= max_attempts:
+                raise CircuitOpenError(f"{description}: circuit for {model} is open")
+            await asyncio.sleep(wait + random.uniform(0, 1))
+            continue
+        try:
+            result = await fn()
+            breaker.record_success()
+        except Exception as e:
+            delay = _next_delay(e, attempt, max_attempts, breaker, description, workspace)
+            await asyncio.sleep(delay)
+            continue
+        finally:
+            # A probe cancelled mid-call recorded no outcome; don't block the model for good
+            if probe:
+                breaker.end_probe()
+        return result
+    raise CircuitOpenError(f"{description}: circuit for {model} stayed open")
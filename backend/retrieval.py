@@ -0,0 +1,201 @@
+"""Local BM25 index over the generated course text.
+
+Quizzes and flashcards used to send the whole planner text and deep agent
+output with every request. This module splits that text into chunks per week
+and section, indexes them with BM25 (NumPy postings, no external service), and
+returns only the top-k chunks relevant to a quiz theme or flashcard batch.
+"""
+import math
+import os
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "12"))
+RETRIEVAL_CHUNK_CHARS = int(os.getenv("RETRIEVAL_CHUNK_CHARS", "1500"))
+RETRIEVAL_MAX_CHARS = int(os.getenv("RETRIEVAL_MAX_CHARS", "60000"))
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# "# Week 3: ...", "Week 3 -", "=== PROCESSING WEEK 3 ===", "**Week 3**"
+WEEK_RE = re.compile(r"^\s*(?:#+\s*|=+\s*PROCESSING\s+|\*\*)?WEEK\s+(\d+)\b", re.IGNORECASE)
+HEADING_RE = re.compile(r"^\s*(#{1,6})\s+(.+?)\s*#*\s*$")
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-'][a-z0-9]+)*")
+
+STOPWORDS = frozenset("""
+a an and are as at be but by can do does for from has have how i if in into is it its
+of on or so such that the their then there these they this to was we what when where
+which while who why will with you your each about over under more most other than
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS and len(t) > 1]
+
+
+def _split_long(text: str, limit: int) -> List[str]:
+    """Split text into pieces of at most ~limit characters on paragraph boundaries."""
+    if len(text) <= limit:
+        return [text]
+    pieces, current = [], ""
+    for paragraph in re.split(r"\n\s*\n", text):
+        if current and len(current) + len(paragraph) + 2 > limit:
+            pieces.append(current)
+            current = ""
+        while len(paragraph) > limit:
+            # A single very long paragraph: cut on a line break (or hard) near the limit
+            cut = paragraph.rfind("\n", 0, limit)
+            cut = cut if cut > limit // 2 else limit
+            pieces.append(paragraph[:cut])
+            paragraph = paragraph[cut:].lstrip()
+        current = f"{current}\n\n{paragraph}" if current else paragraph
+    if current.strip():
+        pieces.append(current)
+    return pieces
+
+
+def chunk_course_text(text: str, source: str = "course", chunk_chars: int = RETRIEVAL_CHUNK_CHARS) -> List[Dict]:
+    """Split course text into chunks that each belong to one week (or None) and one section heading."""
+    chunks: List[Dict] = []
+    week: Optional[int] = None
+    heading = ""
+    lines: List[str] = []
+    has_body = False
+
+    def flush():
+        body = "\n".join(lines).strip()
+        if body:
+            for piece in _split_long(body, chunk_chars):
+                chunks.append({"source": source, "week": week, "heading": heading, "text": piece.strip()})
+        lines.clear()
+
+    for line in text.splitlines():
+        week_match = WEEK_RE.match(line)
+        heading_match = HEADING_RE.match(line)
+        if week_match or heading_match:
+            # Consecutive heading lines (e.g. a week marker then its title) stay in one chunk
+            if has_body:
+                flush()
+                has_body = False
+            if week_match:
+                week = int(week_match.group(1))
+            heading = (heading_match.group(2) if heading_match else line).strip(" =*#")
+        elif line.strip():
+            has_body = True
+        lines.append(line)
+    flush()
+    return chunks
+
+
+class CourseIndex:
+    """BM25 over course chunks. Postings per term are NumPy arrays of (chunk index, term frequency)."""
+
+    def __init__(self, chunks: List[Dict]):
+        self.chunks = chunks
+        for i, chunk in enumerate(chunks):
+            chunk["id"] = i
+        tokenized = [tokenize(f"{c['heading']} {c['text']}") for c in chunks]
+        self.doc_len = np.array([len(tokens) for tokens in tokenized], dtype=np.float32)
+        self.avg_len = float(self.doc_len.mean()) if len(chunks) else 0.0
+        postings: Dict[str, tuple] = {}
+        for i, tokens in enumerate(tokenized):
+            for term, tf in Counter(tokens).items():
+                docs, tfs = postings.setdefault(term, ([], []))
+                docs.append(i)
+                tfs.append(tf)
+        n = len(chunks)
+        self.postings = {
+            term: (np.array(docs, dtype=np.int32), np.array(tfs, dtype=np.float32),
+                   math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5)))
+            for term, (docs, tfs) in postings.items()
+        }
+        self.weeks = sorted({c["week"] for c in chunks if c["week"] is not None})
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of every chunk for query."""
+        scores = np.zeros(len(self.chunks), dtype=np.float32)
+        if not self.chunks:
+            return scores
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_len / max(self.avg_len, 1.0))
+        for term, qtf in Counter(tokenize(query)).items():
+            entry = self.postings.get(term)
+            if entry is None:
+                continue
+            docs, tfs, idf = entry
+            scores[docs] += qtf * idf * tfs * (BM25_K1 + 1) / (tfs + norm[docs])
+        return scores
+
+    def search(self, query: str, k: int = RETRIEVAL_TOP_K, weeks: Optional[Sequence[int]] = None) -> List[Dict]:
+        """Top-k chunks for query (optionally only from the given weeks), best first."""
+        scores = self.scores(query)
+        candidates = np.arange(len(self.chunks))
+        if weeks is not None:
+            wanted = set(weeks)
+            candidates = np.array([i for i in candidates if self.chunks[i]["week"] in wanted], dtype=np.int64)
+        if not len(candidates):
+            return []
+        # Stable sort keeps document order among equal scores, so weak queries still get each week's opening chunks
+        order = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [dict(self.chunks[i], score=float(scores[i])) for i in order[:k]]
+
+    def search_per_week(self, query: str, per_week: int = 2, weeks: Optional[Sequence[int]] = None) -> List[Dict]:
+        """The best per_week chunks of every week, so coverage stays balanced across the course.
+
+        Without weeks, text outside any week (course overview) counts as one more week.
+        """
+        if not self.weeks:
+            return self.search(query, per_week * 6)
+        selected: List[Dict] = []
+        for week in (weeks if weeks is not None else [None] + self.weeks):
+            selected.extend(self.search(query, per_week, weeks=[week]))
+        return selected
+
+
+def _chunk_part(chunk: Dict) -> str:
+    label = f"Week {chunk['week']}" if chunk["week"] is not None else chunk["source"].title()
+    if chunk["heading"] and chunk["heading"].lower().startswith("week"):
+        label = chunk["heading"]
+    elif chunk["heading"]:
+        label += f" - {chunk['heading']}"
+    return f"[{label}]\n{chunk['text']}"
+
+
+def format_chunks(chunks: List[Dict], max_chars: int = RETRIEVAL_MAX_CHARS) -> str:
+    """Render chunks in course order (week, then position) as prompt text, capped at max_chars.
+
+    chunks are taken best first (their given order) one per week per round, so every
+    week keeps its top chunk before any week gets a second; a chunk that does not fit
+    is skipped, not the rest of the course.
+    """
+    by_week: Dict[Optional[int], List[Dict]] = {}
+    for chunk in chunks:
+        by_week.setdefault(chunk["week"], []).append(chunk)
+    kept, used = [], 0
+    for rank in range(max((len(week_chunks) for week_chunks in by_week.values()), default=0)):
+        for week_chunks in by_week.values():
+            if rank >= len(week_chunks):
+                continue
+            part = _chunk_part(week_chunks[rank])
+            if used + len(part) > max_chars:
+                continue
+            kept.append((week_chunks[rank], part))
+            used += len(part)
+    kept.sort(key=lambda item: (item[0]["week"] if item[0]["week"] is not None else -1, item[0]["id"]))
+    return "\n\n".join(part for _, part in kept)
+
+
+def build_course_index(*sources) -> CourseIndex:
+    """Index course texts given as (source name, text) pairs, e.g. ("plan", planner_text)."""
+    chunks: List[Dict] = []
+    for source, text in sources:
+        if text:
+            chunks.extend(chunk_course_text(text, source))
+    index = CourseIndex(chunks)
+    print(f"🔍 Indexed {len(index)} course chunks across {len(index.weeks)} weeks")
+    return index
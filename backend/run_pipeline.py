@@ -1,135 +1,68 @@
-import subprocess
 import sys
-import os
-from pathlib import Path
 
-def run_command(command, cwd=None, description=""):
-    """Run a command and handle errors - SEQUENTIAL EXECUTION"""
-    print(f"\n{'='*50}")
-    print(f"Running: {command}")
-    if description:
-        print(f"Description: {description}")
-    print(f"{'='*50}")
-    
-    try:
-        # Run command and WAIT for completion (sequential execution)
-        result = subprocess.run(
-            command.split() if isinstance(command, str) else command,
-            cwd=cwd,
-            text=True,
-            encoding='utf-8',
-            errors='replace',
-            timeout=1200  # 20 minutes timeout per command
-        )
-        
-        if result.returncode == 0:
-            print(f"✓ SUCCESS: {command} completed successfully")
-        else:
-            print(f"⚠ WARNING: {command} completed with return code {result.returncode}")
-            print(f"This is normal for some steps - continuing...")
-        
-        print(f"{'='*50}")
-        return True  # Continue to next step regardless
-        
-    except subprocess.TimeoutExpired:
-        print(f"✗ TIMEOUT: {command} timed out after 20 minutes")
-        print(f"{'='*50}")
-        return False  # Stop on timeout
-    except Exception as e:
-        print(f"✗ ERROR: {command} failed with exception: {str(e)}")
-        print(f"{'='*50}")
-        return False  # Stop on critical error
+from pipeline import STAGES, stage_dependencies, run_pipeline
+from telemetry import summarize
+from workspace import workspace_from_args, io_dir
+
 
-def main():
+def main(workspace=None, use_cache=None, resume=False):
     """
-    Execute the exact sequence from start.sh - SEQUENTIAL EXECUTION:
-    
-    echo "Starting AI Copilot for Instructors..."
-    python llm.py
-    echo "Master instructions generated."
-    echo "Starting agents"
-    cd copilot
-    python main.py
-    python deep_main.py
-    cd ..
-    python course_material.py
-    python quizzes.py
-    python flash_cards.py
-    python ppt.py
-    cd ..
+    Execute the course generation stage graph:
+
+        llm.py -> copilot/main.py -> copilot/deep_main.py -> course_material.py
+                                                          -> quizzes.py
+                                                          -> flash_cards.py
+                                                          -> ppt.py
+
+    Each stage starts as soon as the stages producing its inputs have finished,
+    so the four generators run concurrently once the deep content exists.
+    Pass `--workspace <dir>` to run against a specific job workspace, and
+    `--no-cache` to rerun every stage even if its cached outputs are current.
+    `--resume` keeps the stages the workspace checkpoint records as completed
+    and continues from the first incomplete ones.
     """
-    
-    # Get the current working directory (should be the backend directory)
-    backend_dir = Path.cwd()
-    copilot_dir = backend_dir / "copilot"
-    
+    workspace = workspace or workspace_from_args()
     print("\n" + "="*60)
     print("🚀 STARTING AI COPILOT FOR INSTRUCTORS...")
     print("="*60)
-    
-    # Step 1: python llm.py - WAIT FOR COMPLETION
-    print("\n📋 STEP 1: Generate Master Instructions")
-    success = run_command("python llm.py", cwd=backend_dir, 
-                         description="Generating master instructions with LLM")
-    if not success:
-        print("❌ CRITICAL: llm.py failed - stopping pipeline")
-        return False
-    
-    print("\n✅ Master instructions generated.")
-    
-    # Step 2: Starting agents
-    print("\n🤖 STEP 2: Starting AI Agents")
-    print("Starting agents")
-    
-    # Step 3: cd copilot && python main.py - WAIT FOR COMPLETION
-    print("\n📊 STEP 3: Run Main Copilot Agent")
-    success = run_command("python main.py", cwd=copilot_dir,
-                         description="Running main copilot agent in copilot directory")
-    if not success:
-        print("⚠️ WARNING: main.py had issues, but continuing pipeline...")
-    
-    # Step 4: python deep_main.py (still in copilot directory) - WAIT FOR COMPLETION
-    print("\n🔍 STEP 4: Run Deep Copilot Agent")
-    success = run_command("python deep_main.py", cwd=copilot_dir,
-                         description="Running deep copilot agent in copilot directory")
-    if not success:
-        print("⚠️ WARNING: deep_main.py had issues, but continuing pipeline...")
-    
-    # Step 5: cd .. && python course_material.py - WAIT FOR COMPLETION
-    print("\n📚 STEP 5: Generate Course Materials")
-    success = run_command("python course_material.py", cwd=backend_dir,
-                         description="Generating course materials and documents")
-    if not success:
-        print("⚠️ WARNING: course_material.py had issues, but continuing pipeline...")
-    
-    # Step 6: python quizzes.py - WAIT FOR COMPLETION
-    print("\n❓ STEP 6: Generate Quizzes")
-    success = run_command("python quizzes.py", cwd=backend_dir,
-                         description="Generating quiz questions and assessments")
-    if not success:
-        print("⚠️ WARNING: quizzes.py had issues, but continuing pipeline...")
-    
-    # Step 7: python flash_cards.py - WAIT FOR COMPLETION
-    print("\n🗂️ STEP 7: Generate Flash Cards")
-    success = run_command("python flash_cards.py", cwd=backend_dir,
-                         description="Generating flash cards for study")
-    if not success:
-        print("⚠️ WARNING: flash_cards.py had issues, but continuing pipeline...")
-    
-    # Step 8: python ppt.py - WAIT FOR COMPLETION
-    print("\n📊 STEP 8: Generate PowerPoint Presentations")
-    success = run_command("python ppt.py", cwd=backend_dir,
-                         description="Generating PowerPoint presentations")
-    if not success:
-        print("⚠️ WARNING: ppt.py had issues, but continuing pipeline...")
-    
-    # Step 9: cd .. (final step - we're already in the right directory)
+    print(f"📂 Workspace: {workspace}")
+    if resume:
+        print("⏩ Resuming from checkpoint")
+
+    deps = stage_dependencies(STAGES)
+    print("\n📋 Stage graph:")
+    for stage in STAGES:
+        after = ", ".join(deps[stage.name]) or "(inputs only)"
+        print(f"  • {stage.name:<16} after: {after}")
+
+    results = run_pipeline(workspace, STAGES, use_cache=use_cache, resume=resume)
+
     print("\n" + "="*60)
     print("🎉 AI COPILOT FOR INSTRUCTORS PIPELINE COMPLETED!")
     print("="*60)
-    
+
+    print("\n⏱️ STAGE SUMMARY:")
+    print("-" * 40)
+    for name, res in results.items():
+        duration = f"{res['duration']:.1f}s" if res.get("duration") is not None else "-"
+        note = " ⏩ resumed" if res.get("resumed") else " ♻ cached" if res.get("cached") else ""
+        print(f"  {name:<16} {res['status']:<8} {duration}{note}")
+    print("-" * 40)
+    hits = [name for name, res in results.items() if res.get("cached")]
+    if hits:
+        print(f"♻ {len(hits)} stage(s) restored from cache: {', '.join(hits)}")
+
+    llm_stages = summarize(workspace)["stages"]
+    if llm_stages:
+        print("\n🧮 LLM CALLS BY STAGE:")
+        print("-" * 40)
+        for t in llm_stages:
+            print(f"  {t['stage']:<16} {t['calls']:>3} calls {t['wall_seconds']:>8.1f}s  "
+                  f"{t['retries']} retries  tokens in/cached/out {t['prompt_tokens']}/{t['cached_tokens']}/{t['output_tokens']}")
+        print("-" * 40)
+
     # List generated files
-    output_dir = backend_dir / "Inputs and Outputs"
+    output_dir = io_dir(workspace)
     if output_dir.exists():
         generated_files = [f for f in output_dir.glob("*.*") if f.is_file()]
         if generated_files:
@@ -143,10 +76,18 @@ def main():
             print("\n📁 No files found in output directory")
     else:
         print("\n📁 Output directory not found")
-    
-    print(f"\n✅ PIPELINE EXECUTION COMPLETE - ALL STEPS FINISHED SEQUENTIALLY")
+
+    # Only a failed critical stage (master instructions) fails the whole run,
+    # matching the previous sequential behaviour
+    critical_failed = [s.name for s in STAGES if s.critical and results[s.name]["status"] != "success"]
+    if critical_failed:
+        print(f"\n❌ CRITICAL: {', '.join(critical_failed)} failed - downstream stages were skipped")
+        return False
+
+    print(f"\n✅ PIPELINE EXECUTION COMPLETE")
     return True
 
 if __name__ == "__main__":
-    success = main()
+    success = main(use_cache=False if "--no-cache" in sys.argv else None,
+                   resume="--resume" in sys.argv)
     sys.exit(0 if success else 1)
@@ -0,0 +1,47 @@
+"""Response schemas for generators that need structured JSON from Gemini.
+
+Passed as `response_schema` to generate_course_content, so the model returns
+JSON matching these types and the reply is validated into them instead of
+being regex-scanned out of free text.
+"""
+from typing import List
+
+from pydantic import BaseModel, Field, TypeAdapter
+
+
+class Flashcard(BaseModel):
+    id: int
+    week: str = Field(description='Course week the card belongs to, e.g. "Week 1"')
+    topic: str
+    question: str
+    answer: str
+    difficulty: str = Field(description="easy, medium or hard")
+    tags: List[str] = Field(default_factory=list)
+
+
+class Slide(BaseModel):
+    title: str
+    bullets: List[str] = Field(description="4-8 concise bullet points")
+
+
+FLASHCARDS_SCHEMA = List[Flashcard]
+SLIDES_SCHEMA = List[Slide]
+
+_flashcards_adapter = TypeAdapter(FLASHCARDS_SCHEMA)
+_slides_adapter = TypeAdapter(SLIDES_SCHEMA)
+
+
+def parse_flashcards(response) -> List[Flashcard]:
+    """Typed flashcards from a schema-constrained response (raises ValidationError if malformed)."""
+    parsed = getattr(response, "parsed", None)
+    if parsed is not None:
+        return _flashcards_adapter.validate_python(parsed)
+    return _flashcards_adapter.validate_json(response.text or "[]")
+
+
+def parse_slides(response) -> List[Slide]:
+    """Typed slides from a schema-constrained response (raises ValidationError if malformed)."""
+    parsed = getattr(response, "parsed", None)
+    if parsed is not None:
+        return _slides_adapter.validate_python(parsed)
+    return _slides_adapter.validate_json(response.text or "[]")
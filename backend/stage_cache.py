@@ -0,0 +1,142 @@
+"""Content-addressed cache for pipeline stage outputs.
+
+A stage's cache key is a SHA-256 over everything that determines its output:
+the bytes of its input artifacts, the user_config fields it reads, the source
+files holding its prompt text, and the model it calls. On a hit the stored
+artifacts are copied into the workspace and the stage is not run at all, so
+re-running a course with the same curriculum and settings (or resuming after
+a late-stage failure) skips the expensive LLM stages.
+"""
+import hashlib
+import json
+import os
+import shutil
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional
+
+from workspace import BACKEND_DIR, io_dir, load_config
+
+CACHE_DIR = Path(os.environ.get("STAGE_CACHE_DIR", BACKEND_DIR / ".stage_cache"))
+MANIFEST = "manifest.json"
+
+
+def cache_enabled() -> bool:
+    return os.environ.get("STAGE_CACHE", "1").lower() not in ("0", "false", "no", "off")
+
+
+def _hash_path(h, path: Path):
+    """Feed a file's bytes (or every file under a directory, in order) into h."""
+    if path.is_dir():
+        for child in sorted(p for p in path.rglob("*") if p.is_file()):
+            h.update(str(child.relative_to(path)).encode("utf-8"))
+            _hash_path(h, child)
+        return
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+
+
+def stage_cache_key(stage, workspace: Path) -> Optional[str]:
+    """Hash the stage's inputs, config fields, prompt sources and model.
+
+    Returns None if a declared input is missing, since the output would then
+    depend on whatever fallback the stage takes.
+    """
+    h = hashlib.sha256()
+    h.update(f"stage:{stage.name}\nmodel:{stage.model}\n".encode("utf-8"))
+
+    output_root = io_dir(workspace)
+    for artifact in sorted(stage.inputs):
+        path = output_root / artifact
+        if not path.exists():
+            return None
+        h.update(f"input:{artifact}\n".encode("utf-8"))
+        _hash_path(h, path)
+
+    config = load_config(workspace) or {}
+    fields = {k: config.get(k) for k in sorted(stage.config_fields)}
+    h.update(("config:" + json.dumps(fields, sort_keys=True, default=str) + "\n").encode("utf-8"))
+
+    for source in sorted(stage.prompt_sources):
+        h.update(f"prompt:{source}\n".encode("utf-8"))
+        _hash_path(h, BACKEND_DIR / source)
+
+    return h.hexdigest()
+
+
+def _has_content(path: Path) -> bool:
+    if path.is_dir():
+        return any(p.is_file() and p.stat().st_size > 0 for p in path.rglob("*"))
+    return path.is_file() and path.stat().st_size > 0
+
+
+def _copy(src: Path, dst: Path):
+    if src.is_dir():
+        shutil.copytree(src, dst, dirs_exist_ok=True)
+    else:
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy2(src, dst)
+
+
+def restore(stage, key: str, workspace: Path) -> bool:
+    """Copy a cached entry's outputs into the workspace. Returns True on a hit."""
+    entry = CACHE_DIR / stage.name / key
+    if not (entry / MANIFEST).exists():
+        return False
+    output_root = io_dir(workspace)
+    try:
+        for artifact in stage.outputs:
+            _copy(entry / "outputs" / artifact, output_root / artifact)
+    except Exception:
+        return False
+    return True
+
+
+def store(stage, key: str, workspace: Path) -> bool:
+    """Save the stage's outputs under key. Skips stages that produced nothing."""
+    output_root = io_dir(workspace)
+    if not all(_has_content(output_root / artifact) for artifact in stage.outputs):
+        return False
+
+    entry = CACHE_DIR / stage.name / key
+    if (entry / MANIFEST).exists():
+        return True
+
+    # Build the entry in a scratch directory and rename it into place so a
+    # concurrent job never sees a half-written entry
+    tmp = CACHE_DIR / stage.name / f".tmp-{uuid.uuid4().hex}"
+    try:
+        for artifact in stage.outputs:
+            _copy(output_root / artifact, tmp / "outputs" / artifact)
+        with open(tmp / MANIFEST, "w", encoding="utf-8") as f:
+            json.dump({
+                "stage": stage.name,
+                "key": key,
+                "model": stage.model,
+                "outputs": stage.outputs,
+                "stored_at": datetime.now().isoformat(),
+                "workspace": str(workspace),
+            }, f, indent=2)
+        try:
+            os.replace(tmp, entry)
+        except OSError:
+            # Another job stored the same key first
+            pass
+        return True
+    except Exception:
+        return False
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def cache_info() -> Dict[str, int]:
+    """Number of cached entries per stage."""
+    info: Dict[str, int] = {}
+    if not CACHE_DIR.exists():
+        return info
+    for stage_dir in CACHE_DIR.iterdir():
+        if stage_dir.is_dir():
+            info[stage_dir.name] = sum(1 for e in stage_dir.iterdir() if (e / MANIFEST).exists())
+    return info
@@ -0,0 +1,59 @@
+"""Buffered, append-only file sink for an agent's streamed text events.
+
+The stage keeps one open handle for the whole run instead of reopening the
+output file per event, and holds nothing but counters in memory, so a long
+run neither grows with its output nor turns every event into a small write.
+The file on disk is the final artifact; it is never rewritten at the end.
+
+STREAM_FLUSH_POLICY decides how soon written events reach the file:
+
+- "event": flush after every event (tail -f sees each event at once);
+- "interval" (default): flush at most every STREAM_FLUSH_SECONDS;
+- "fsync": like "interval", and also fsync so progress survives a host crash.
+"""
+import os
+import time
+from pathlib import Path
+
+STREAM_FLUSH_POLICY = os.getenv("STREAM_FLUSH_POLICY", "interval").lower()
+STREAM_FLUSH_SECONDS = float(os.getenv("STREAM_FLUSH_SECONDS", "2"))
+STREAM_BUFFER_BYTES = int(os.getenv("STREAM_BUFFER_BYTES", str(64 * 1024)))
+
+
+class StreamSink:
+    """Append text chunks to path through one buffered handle (use as a context manager)."""
+
+    def __init__(self, path: Path, append: bool = False, policy: str = STREAM_FLUSH_POLICY,
+                 flush_seconds: float = STREAM_FLUSH_SECONDS):
+        self.path = Path(path)
+        self.policy = policy
+        self.flush_seconds = flush_seconds
+        self.chunks = 0
+        self.chars = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "a" if append else "w", encoding="utf-8", buffering=STREAM_BUFFER_BYTES)
+        self._last_flush = time.monotonic()
+
+    def write(self, text: str):
+        self._file.write(text)
+        self.chunks += 1
+        self.chars += len(text)
+        if self.policy == "event" or time.monotonic() - self._last_flush >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        self._file.flush()
+        if self.policy == "fsync":
+            os.fsync(self._file.fileno())
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,260 @@
+"""Per-call telemetry for Gemini requests.
+
+Every call made through llm.generate_course_content[_async] and every model
+call of the ADK agents (via rate_limiter.agent_callbacks) produces one record:
+
+    ts, stage, task, model, ok, error, wall_seconds, ttft_seconds,
+    queue_seconds, retries, prompt_tokens, cached_tokens, output_tokens,
+    total_tokens, context_cache, grounding_queries, grounding_reused
+
+Records are appended to the job workspace's llm_calls.jsonl (shared by all of
+the job's stage processes, like events.jsonl) and added to an in-memory
+aggregate for the current process. summarize() rolls the file up per stage,
+task and model, to see which stage spends the time and the tokens;
+task_stats() rolls it up per task and model, with latency percentiles, to tune
+the model routing table (model_routes) with.
+"""
+import json
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from grounding import extract as extract_grounding
+from model_routes import usage_counts
+from workspace import current_stage, default_workspace, list_workspaces
+
+LLM_CALLS_FILE = "llm_calls.jsonl"
+
+_lock = threading.Lock()
+_aggregate: Dict[tuple, Dict] = {}
+
+
+def calls_path(workspace: Optional[Path] = None) -> Path:
+    return Path(workspace or default_workspace()) / LLM_CALLS_FILE
+
+
+def reset_calls(workspace: Optional[Path] = None):
+    """Start a fresh run's call log (resumed runs keep adding to theirs)."""
+    path = calls_path(workspace)
+    if path.exists():
+        path.unlink()
+
+
+def _new_totals(stage, task, model) -> Dict:
+    return {"stage": stage, "task": task, "model": model, "calls": 0, "errors": 0, "retries": 0,
+            "wall_seconds": 0.0, "ttft_seconds": 0.0, "ttft_calls": 0, "queue_seconds": 0.0,
+            "prompt_tokens": 0, "cached_tokens": 0, "output_tokens": 0, "total_tokens": 0,
+            "context_cache_hits": 0, "grounded_calls": 0}
+
+
+def _add(totals: Dict, record: Dict):
+    totals["calls"] += 1
+    totals["errors"] += 0 if record.get("ok", True) else 1
+    totals["retries"] += record.get("retries") or 0
+    totals["wall_seconds"] += record.get("wall_seconds") or 0.0
+    if record.get("ttft_seconds") is not None:
+        totals["ttft_seconds"] += record["ttft_seconds"]
+        totals["ttft_calls"] += 1
+    totals["queue_seconds"] += record.get("queue_seconds") or 0.0
+    for name in ("prompt_tokens", "cached_tokens", "output_tokens", "total_tokens"):
+        totals[name] += record.get(name) or 0
+    totals["context_cache_hits"] += 1 if record.get("context_cache") else 0
+    totals["grounded_calls"] += 1 if record.get("grounding_queries") else 0
+
+
+def record_call(task: Optional[str], model: str, wall_seconds: float, response=None, ok: bool = True,
+                error: Optional[str] = None, ttft_seconds: Optional[float] = None, queue_seconds: float = 0.0,
+                retries: int = 0, context_cache: bool = False, grounding_queries: Optional[List[str]] = None,
+                grounding_reused: bool = False, workspace: Optional[Path] = None) -> Dict:
+    """Record one Gemini call. Never raises: telemetry is best effort."""
+    record = {
+        "ts": datetime.now().isoformat(),
+        "stage": current_stage(),
+        "task": task or "default",
+        "model": model,
+        "ok": ok,
+        "error": error,
+        "wall_seconds": round(wall_seconds, 3),
+        "ttft_seconds": round(ttft_seconds, 3) if ttft_seconds is not None else None,
+        "queue_seconds": round(queue_seconds, 3),
+        "retries": retries,
+        "context_cache": context_cache,
+        "grounding_queries": grounding_queries or [],
+        "grounding_reused": grounding_reused,
+    }
+    record.update(usage_counts(response))
+    with _lock:
+        key = (record["stage"], record["task"], model)
+        _add(_aggregate.setdefault(key, _new_totals(*key)), record)
+    try:
+        path = calls_path(workspace)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        line = json.dumps(record, default=str) + "\n"
+        with _lock, open(path, "a", encoding="utf-8") as f:
+            f.write(line)
+    except Exception as e:
+        print(f"⚠ Could not record LLM call telemetry: {e}")
+    return record
+
+
+class TrackedCall:
+    """Measurements for one logical call, filled in while it runs (across retries)."""
+
+    def __init__(self):
+        self.response = None
+        self.attempts = 0
+        self.queue_seconds = 0.0
+        self.ttft_seconds: Optional[float] = None
+        self.context_cache = False
+        self.grounding_reused = False
+        self._attempt_started = time.monotonic()
+
+    def start_attempt(self):
+        self.attempts += 1
+        self._attempt_started = time.monotonic()
+        self.ttft_seconds = None
+
+    def queued(self, seconds: float):
+        self.queue_seconds += seconds
+
+    def first_token(self):
+        """Mark the first streamed chunk of the current attempt."""
+        if self.ttft_seconds is None:
+            self.ttft_seconds = time.monotonic() - self._attempt_started
+
+    def record(self, response):
+        self.response = response
+        return response
+
+
+@contextmanager
+def track_call(task: Optional[str], model: str, workspace: Optional[Path] = None):
+    """Time the enclosed call (retries included) and record it, as an error if it raises."""
+    call = TrackedCall()
+    started = time.monotonic()
+
+    def finish(ok, error=None):
+        found = extract_grounding(call.response) if call.response is not None else None
+        record_call(task, model, time.monotonic() - started, call.response, ok=ok, error=error,
+                    ttft_seconds=call.ttft_seconds, queue_seconds=call.queue_seconds,
+                    retries=max(0, call.attempts - 1), context_cache=call.context_cache,
+                    grounding_queries=found["queries"] if found else None,
+                    grounding_reused=call.grounding_reused, workspace=workspace)
+
+    try:
+        yield call
+    except BaseException as e:
+        finish(False, f"{type(e).__name__}: {e}"[:300])
+        raise
+    finish(True)
+
+
+def timed_chunks(chunks, call: TrackedCall):
+    """Pass a response stream through, marking time-to-first-token on its first chunk."""
+    for chunk in chunks:
+        call.first_token()
+        yield chunk
+
+
+def aggregate() -> List[Dict]:
+    """This process's calls so far, totalled per stage, task and model."""
+    with _lock:
+        return [dict(totals) for totals in _aggregate.values()]
+
+
+def read_calls(workspace: Optional[Path] = None) -> List[Dict]:
+    path = calls_path(workspace)
+    if not path.exists():
+        return []
+    calls = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                calls.append(json.loads(line))
+            except ValueError:
+                continue
+    return calls
+
+
+def summarize(workspace: Optional[Path] = None) -> Dict:
+    """Totals per stage/task/model and per stage for a job's llm_calls.jsonl."""
+    by_key: Dict[tuple, Dict] = {}
+    by_stage: Dict[str, Dict] = {}
+    for record in read_calls(workspace):
+        key = (record.get("stage"), record.get("task"), record.get("model"))
+        _add(by_key.setdefault(key, _new_totals(*key)), record)
+        stage = record.get("stage") or "unknown"
+        _add(by_stage.setdefault(stage, _new_totals(stage, None, None)), record)
+    for totals in list(by_key.values()) + list(by_stage.values()):
+        totals["wall_seconds"] = round(totals["wall_seconds"], 3)
+        totals["queue_seconds"] = round(totals["queue_seconds"], 3)
+        totals["ttft_avg"] = round(totals["ttft_seconds"] / totals["ttft_calls"], 3) if totals["ttft_calls"] else None
+    stages = sorted(by_stage.values(), key=lambda t: t["wall_seconds"], reverse=True)
+    for totals in stages:
+        totals.pop("task"), totals.pop("model")
+    return {"stages": stages, "calls": sorted(by_key.values(), key=lambda t: t["wall_seconds"], reverse=True)}
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def _add_task_calls(entries: Dict[tuple, Dict], records: List[Dict]):
+    for record in records:
+        key = (record.get("task") or "default", record.get("model"))
+        entry = entries.setdefault(key, {"task": key[0], "model": key[1], "calls": 0, "errors": 0, "latencies": [],
+                                         "prompt_tokens": 0, "cached_tokens": 0, "output_tokens": 0, "total_tokens": 0})
+        entry["calls"] += 1
+        entry["errors"] += 0 if record.get("ok", True) else 1
+        entry["latencies"].append(record.get("wall_seconds") or 0.0)
+        for name in ("prompt_tokens", "cached_tokens", "output_tokens", "total_tokens"):
+            entry[name] += record.get(name) or 0
+
+
+def _task_summary(entries: Dict[tuple, Dict]) -> List[Dict]:
+    summary = []
+    for entry in entries.values():
+        latencies = entry.pop("latencies")
+        calls = entry["calls"] or 1
+        summary.append(dict(
+            entry,
+            latency_avg=round(sum(latencies) / calls, 3),
+            latency_p50=_percentile(latencies, 0.5),
+            latency_p95=_percentile(latencies, 0.95),
+            latency_max=round(max(latencies, default=0.0), 3),
+            output_tokens_avg=round(entry["output_tokens"] / calls, 1),
+        ))
+    summary.sort(key=lambda s: (s["task"], s["model"]))
+    return summary
+
+
+def task_stats(workspace: Optional[Path] = None) -> List[Dict]:
+    """Per task and model: calls, errors, latency (avg/p50/p95/max) and token totals for a job's llm_calls.jsonl."""
+    entries: Dict[tuple, Dict] = {}
+    _add_task_calls(entries, read_calls(workspace))
+    return _task_summary(entries)
+
+
+def all_task_stats() -> List[Dict]:
+    """task_stats over every job workspace on this host."""
+    entries: Dict[tuple, Dict] = {}
+    for workspace in list_workspaces():
+        _add_task_calls(entries, read_calls(workspace))
+    return _task_summary(entries)
+
+
+def print_summary(title: str = "LLM calls"):
+    """Print this process's aggregate (used by the stage scripts when they finish)."""
+    totals = aggregate()
+    if not totals:
+        return
+    print(f"\n📊 {title}:")
+    for t in sorted(totals, key=lambda t: t["wall_seconds"], reverse=True):
+        print(f"   {t['task']} on {t['model']}: {t['calls']} calls, {t['wall_seconds']:.1f}s, "
+              f"{t['retries']} retries, tokens in/cached/out {t['prompt_tokens']}/{t['cached_tokens']}/{t['output_tokens']}")
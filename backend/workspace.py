@@ -0,0 +1,166 @@
+"""Per-job workspaces.
+
+A workspace is a directory holding one course's `user_config.json` and its
+"Inputs and Outputs" folder (curriculum.pdf, agent outputs and the generated
+category subfolders). Every stage receives its workspace explicitly, either as
+a `workspace` argument or via `--workspace <dir>` on the command line, so
+several courses can be generated side by side on one host.
+
+The backend directory itself is the default workspace, which keeps the
+original single-user layout working for standalone script runs.
+
+Code deep in the LLM call path (telemetry, retry budget, grounding, ADK
+callbacks) finds the job it works for through job_context(): a stage script
+enters it once with the `--workspace` / `--stage` it was started with, and the
+job then follows every call, asyncio task and callback made inside it.
+"""
+import argparse
+import contextvars
+import json
+import os
+import re
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+BACKEND_DIR = Path(__file__).resolve().parent
+WORKSPACES_DIR = Path(os.environ.get("COPILOT_WORKSPACES_DIR", BACKEND_DIR / "workspaces"))
+IO_DIR_NAME = "Inputs and Outputs"
+CONFIG_FILE = "user_config.json"
+OUTPUT_CATEGORIES = ["course material", "quizzes", "ppts", "flashcards"]
+
+_WORKSPACE_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+_job_workspace: contextvars.ContextVar[Optional[Path]] = contextvars.ContextVar("job_workspace", default=None)
+_job_stage: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("job_stage", default=None)
+
+
+def default_workspace() -> Path:
+    """Workspace used when none is given: the current job's, else the legacy layout under the backend directory."""
+    return _job_workspace.get() or BACKEND_DIR
+
+
+def current_stage() -> Optional[str]:
+    """Pipeline stage of the current job, or None outside a pipeline stage."""
+    return _job_stage.get()
+
+
+@contextmanager
+def job_context(workspace: Path, stage: Optional[str] = None):
+    """Run the enclosed code (and the tasks and callbacks it starts) as workspace's job."""
+    workspace_token = _job_workspace.set(Path(workspace).resolve())
+    stage_token = _job_stage.set(stage)
+    try:
+        yield
+    finally:
+        _job_stage.reset(stage_token)
+        _job_workspace.reset(workspace_token)
+
+
+def _parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("--workspace", default=None)
+    parser.add_argument("--stage", default=None)
+    args, _ = parser.parse_known_args(argv)
+    return args
+
+
+def workspace_from_args(argv: Optional[List[str]] = None) -> Path:
+    """Return the workspace passed as `--workspace <dir>`, else the default workspace."""
+    args = _parse_args(argv)
+    return Path(args.workspace).resolve() if args.workspace else default_workspace()
+
+
+def lazy_root_agent(module: str, build: Callable[[Path], object]) -> Callable:
+    """Module-level __getattr__ for an agent package that `adk web` loads.
+
+    root_agent is built with build(workspace) for the workspace on the command
+    line only when it is asked for, so importing the module reads no job inputs.
+    """
+    def __getattr__(name):
+        if name == "root_agent":
+            return build(workspace_from_args())
+        raise AttributeError(f"module {module!r} has no attribute {name!r}")
+    return __getattr__
+
+
+@contextmanager
+def job_from_args(argv: Optional[List[str]] = None):
+    """job_context() for the `--workspace` / `--stage` a stage script was started with; yields the workspace."""
+    workspace = workspace_from_args(argv)
+    with job_context(workspace, _parse_args(argv).stage):
+        yield workspace
+
+
+def create_workspace(workspace_id: Optional[str] = None) -> Path:
+    """Create a fresh workspace (with its output subfolders) and return its path."""
+    workspace_id = workspace_id or uuid.uuid4().hex
+    if not _WORKSPACE_ID_RE.match(workspace_id):
+        raise ValueError(f"Invalid workspace id: {workspace_id}")
+    workspace = WORKSPACES_DIR / workspace_id
+    for sub in OUTPUT_CATEGORIES:
+        (workspace / IO_DIR_NAME / sub).mkdir(parents=True, exist_ok=True)
+    return workspace
+
+
+def get_workspace(workspace_id: str) -> Optional[Path]:
+    """Resolve an existing workspace by id, or None if it is unknown or malformed."""
+    if not workspace_id or not _WORKSPACE_ID_RE.match(workspace_id):
+        return None
+    workspace = WORKSPACES_DIR / workspace_id
+    return workspace if workspace.is_dir() else None
+
+
+def list_workspaces() -> List[Path]:
+    """All workspaces, most recently modified first."""
+    if not WORKSPACES_DIR.exists():
+        return []
+    workspaces = [p for p in WORKSPACES_DIR.iterdir() if p.is_dir() and _WORKSPACE_ID_RE.match(p.name)]
+    workspaces.sort(key=lambda p: p.stat().st_mtime, reverse=True)
+    return workspaces
+
+
+def io_dir(workspace: Optional[Path] = None) -> Path:
+    """The workspace's "Inputs and Outputs" directory (created if missing)."""
+    path = Path(workspace or default_workspace()) / IO_DIR_NAME
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def agent_files_dir(workspace: Optional[Path] = None) -> Path:
+    """Folder where the deep content agent's write_to_file tool keeps its own copy.
+
+    Mirrors the old `copilot/Inputs and Outputs` location, relative to the workspace.
+    """
+    path = Path(workspace or default_workspace()) / "copilot" / IO_DIR_NAME
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def config_path(workspace: Optional[Path] = None) -> Path:
+    return Path(workspace or default_workspace()) / CONFIG_FILE
+
+
+def curriculum_path(workspace: Optional[Path] = None) -> Path:
+    return io_dir(workspace) / "curriculum.pdf"
+
+
+def load_config(workspace: Optional[Path] = None) -> Optional[Dict]:
+    """Load the workspace's user_config.json, or None if missing/unreadable."""
+    path = config_path(workspace)
+    if not path.exists():
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception:
+        return None
+
+
+def save_config(config_data: Dict, workspace: Optional[Path] = None) -> Path:
+    path = config_path(workspace)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(config_data, f, indent=2)
+    return path
@@ -14,6 +14,11 @@ import { UploadBoxSmall } from "../ui/upload-box-small";
 import { useAuth } from "@/contexts/AuthContext";
 import { API_BASE } from "@/lib/config";
 
+// Progress stream errors tolerated before falling back to polling the job status
+const MAX_EVENT_RECONNECTS = 5;
+const JOB_POLL_INTERVAL_MS = 5000;
+const MAX_POLL_FAILURES = 5;
+
 interface ContentRequest {
   topic: string;
   contentType: 'lesson' | 'explanation' | 'practice' | 'summary';
@@ -41,6 +46,7 @@ export function PersonalizedGenerator() {
 
   const [generatedContent, setGeneratedContent] = useState<string>('');
   const [isGenerating, setIsGenerating] = useState(false);
+  const [progressMessage, setProgressMessage] = useState<string>('');
   const [uploadedFile, setUploadedFile] = useState<File | null>(null);
 
   // Derived state to check if all mandatory fields are filled
@@ -168,7 +174,8 @@ export function PersonalizedGenerator() {
       });
 
       // Step 2: Generate content
-      const generateResponse = await fetch(`${API_BASE}/generate-content/`, {
+      const workspaceQuery = `workspace_id=${encodeURIComponent(uploadResult.workspace_id)}`;
+      const generateResponse = await fetch(`${API_BASE}/generate-content/?${workspaceQuery}`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
@@ -180,12 +187,24 @@ export function PersonalizedGenerator() {
         throw new Error(errorData.detail || "Content generation failed.");
       }
 
-      const generateResult = await generateResponse.json();
+      const queuedJob = await generateResponse.json();
+      console.log('Generation job queued:', queuedJob);
+
+      // The backend runs generation in the background; follow its progress events until it finishes
+      await followJobEvents(queuedJob.job_id);
+      const jobResponse = await fetch(`${API_BASE}/jobs/${queuedJob.job_id}`);
+      if (!jobResponse.ok) {
+        throw new Error("Could not load generation results.");
+      }
+      const generateResult = await jobResponse.json();
+      if (generateResult.status === 'failed') {
+        throw new Error(generateResult.error || "Content generation failed.");
+      }
       console.log('Generation successful:', generateResult);
 
       // Step 3: Fetch real preview text
       try {
-        const previewResp = await fetch(`${API_BASE}/course-material/preview`);
+        const previewResp = await fetch(`${API_BASE}/course-material/preview?${workspaceQuery}`);
         if (previewResp.ok) {
           const previewData = await previewResp.json();
           setGeneratedContent(previewData.preview || '');
@@ -213,9 +232,86 @@ export function PersonalizedGenerator() {
       });
     } finally {
       setIsGenerating(false);
+      setProgressMessage('');
     }
   };
 
+  // Wait for a finished job by polling its status; rejects after repeated failed requests
+  const pollJob = async (jobId: string) => {
+    let failures = 0;
+    while (failures < MAX_POLL_FAILURES) {
+      await new Promise((wait) => setTimeout(wait, JOB_POLL_INTERVAL_MS));
+      let response: Response;
+      try {
+        response = await fetch(`${API_BASE}/jobs/${jobId}`);
+      } catch (e) {
+        failures += 1;
+        continue;
+      }
+      if (response.status === 404) {
+        throw new Error("Generation job not found.");
+      }
+      if (!response.ok) {
+        failures += 1;
+        continue;
+      }
+      failures = 0;
+      const job = await response.json();
+      if (job.status === 'completed' || job.status === 'failed') {
+        return;
+      }
+    }
+    throw new Error("Lost contact with the generation job.");
+  };
+
+  // Resolve once the job's SSE stream reports job_finished. EventSource reconnects on its own;
+  // after MAX_EVENT_RECONNECTS errors in a row (or a stream the browser gave up on) fall back to polling
+  const followJobEvents = (jobId: string) =>
+    new Promise<void>((resolve, reject) => {
+      const source = new EventSource(`${API_BASE}/jobs/${jobId}/events`);
+      let errors = 0;
+      let settled = false;
+      const finish = (error?: Error) => {
+        if (settled) return;
+        settled = true;
+        source.close();
+        if (error) {
+          reject(error);
+        } else {
+          resolve();
+        }
+      };
+      const describe = (event: MessageEvent, format: (data: any) => string) => {
+        try {
+          setProgressMessage(format(JSON.parse(event.data)));
+        } catch (e) {
+          console.warn('Unreadable progress event', e);
+        }
+      };
+      source.addEventListener('stage_started', (e) =>
+        describe(e as MessageEvent, (d) => d.description || `Running ${d.stage}`));
+      source.addEventListener('stage_finished', (e) =>
+        describe(e as MessageEvent, (d) => `${d.stage}: ${d.cached ? 'restored from cache' : d.status}`));
+      source.addEventListener('week_started', (e) =>
+        describe(e as MessageEvent, (d) => `Writing week ${d.week}...`));
+      source.addEventListener('week_completed', (e) =>
+        describe(e as MessageEvent, (d) => `Week ${d.week} written`));
+      source.addEventListener('artifact_completed', (e) =>
+        describe(e as MessageEvent, (d) => `Created ${d.kind.replace('_', ' ')} ${d.index} of ${d.total}`));
+      source.addEventListener('open', () => {
+        errors = 0;
+      });
+      source.addEventListener('job_finished', () => finish());
+      source.onerror = () => {
+        errors += 1;
+        if (settled || (source.readyState !== EventSource.CLOSED && errors < MAX_EVENT_RECONNECTS)) return;
+        source.close();
+        console.warn('Progress stream lost; polling the job status instead');
+        setProgressMessage('Waiting for generation to finish...');
+        pollJob(jobId).then(() => finish(), (e) => finish(e));
+      };
+    });
+
   const getDifficultyLabel = (difficulty: number | null): string => {
     switch (difficulty) {
       case 1: return "Foundational";
@@ -364,7 +460,7 @@ export function PersonalizedGenerator() {
             {isGenerating ? (
               <>
                 <Brain className="mr-2 h-4 w-4 animate-spin text-foreground" />
-                Generating...
+                {progressMessage || 'Generating...'}
               </>
             ) : (
               <>
@@ -12,6 +12,7 @@ interface ListedFile {
   size: number;
   modified: string;
   ext?: string;
+  workspace_id?: string;
 }
 
 // Using centralized API base from config
@@ -125,13 +126,13 @@ export default function Dashboard() {
               ) : (
                 <ul className="divide-y">
                   {files[active].map((f) => (
-                    <li key={`${active}-${f.name}`} className="flex items-center justify-between py-3">
+                    <li key={`${active}-${f.workspace_id ?? ""}-${f.name}`} className="flex items-center justify-between py-3">
                       <div>
                         <p className="font-medium">{f.name}</p>
                         <p className="text-xs text-muted-foreground">{new Date(f.modified).toLocaleString()} • {(f.size/1024).toFixed(1)} KB</p>
                       </div>
                       <div className="flex items-center gap-2">
-                        <a href={`${API_BASE}/download/${active}/${encodeURIComponent(f.name)}`} target="_blank" rel="noreferrer">
+                        <a href={`${API_BASE}/download/${active}/${encodeURIComponent(f.name)}${f.workspace_id ? `?workspace_id=${encodeURIComponent(f.workspace_id)}` : ""}`} target="_blank" rel="noreferrer">
                           <Button variant="outline" size="sm"><Download className="mr-2 h-4 w-4"/>Download</Button>
                         </a>
                       </div>